@@ -0,0 +1,233 @@
+from collections import deque
+from datetime import datetime, timedelta
+import asyncio
+import heapq
+import itertools
+import threading
+
+from shiny import reactive
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+# Permanência a partir da qual um veículo gera alerta (horas)
+PERMANENCIA_MAXIMA_HORAS = 24
+# Alertas recentes guardados para a API
+ALERTAS_RECENTES = 100
+# O timer acorda pelo menos a cada tanto, mesmo sem prazo (ajustes de relógio)
+ESPERA_MAXIMA = 60
+
+# Tipo do alerta -> tipo da notificação no painel
+NOTIFICACOES = {"permanencia": "warning", "carencia": "message", "reserva": "warning"}
+
+
+class Alert:
+    # `seq` cresce a cada alerta do pátio: as sessões mostram só os mais novos que já viram
+    __slots__ = ("seq", "tipo", "chave", "prazo", "mensagem")
+
+    def __init__(self, seq, tipo, chave, prazo, mensagem):
+        self.seq = seq
+        self.tipo = tipo
+        self.chave = chave
+        self.prazo = prazo
+        self.mensagem = mensagem
+
+    def as_json(self):
+        return {"tipo": self.tipo, "chave": self.chave, "prazo": self.prazo.isoformat(), "mensagem": self.mensagem}
+
+
+class DeadlineHeap:
+    """Min-heap de prazos por chave, com remoção preguiçosa.
+
+    `cancel` só apaga a chave do dicionário de prazos válidos (O(1)); a entrada
+    antiga fica no heap e é descartada quando chega ao topo. Reagendar uma
+    chave também invalida a entrada anterior. Quando as entradas mortas passam
+    das vivas, o heap é reconstruído só com as vivas.
+    """
+
+    def __init__(self):
+        self._heap = []
+        # chave -> ficha da entrada válida no heap
+        self._validas = {}
+        self._fichas = itertools.count()
+
+    def __len__(self):
+        return len(self._validas)
+
+    def schedule(self, chave, prazo, dados=None):
+        ficha = next(self._fichas)
+        self._validas[chave] = ficha
+        heapq.heappush(self._heap, (prazo, ficha, chave, dados))
+        self._compactar()
+
+    def load(self, prazos):
+        # Carga inicial: [(chave, prazo, dados)] de uma vez, O(n)
+        for chave, prazo, dados in prazos:
+            ficha = next(self._fichas)
+            self._validas[chave] = ficha
+            self._heap.append((prazo, ficha, chave, dados))
+        heapq.heapify(self._heap)
+
+    def cancel(self, chave):
+        self._validas.pop(chave, None)
+
+    def _valida(self, entrada):
+        return self._validas.get(entrada[2]) == entrada[1]
+
+    def _compactar(self):
+        if len(self._heap) > 2 * len(self._validas) + 64:
+            self._heap = [entrada for entrada in self._heap if self._valida(entrada)]
+            heapq.heapify(self._heap)
+
+    def next_deadline(self):
+        # Prazo válido mais próximo (None se não há nenhum); limpa o topo morto
+        while self._heap and not self._valida(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, agora):
+        # [(chave, prazo, dados)] vencidos até `agora`: O(k log n) para k vencidos
+        vencidos = []
+        while self._heap and self._heap[0][0] <= agora:
+            entrada = heapq.heappop(self._heap)
+            if self._valida(entrada):
+                del self._validas[entrada[2]]
+                vencidos.append((entrada[2], entrada[0], entrada[3]))
+        return vencidos
+
+
+class AlertScheduler:
+    """Alertas de prazo de um pátio: permanência máxima, fim da carência e reservas expiradas.
+
+    Os prazos entram num `DeadlineHeap` pelos eventos do pátio (entrada,
+    saída, reserva, cancelamento), sem varrer os veículos. Um único timer
+    dorme até o prazo mais próximo; ao acordar só os k alertas vencidos saem
+    do heap. Os assinantes recebem cada lote de alertas (as sessões mostram
+    como notificação).
+    """
+
+    def __init__(self, lot, permanencia_maxima_horas=PERMANENCIA_MAXIMA_HORAS):
+        self.lot = lot
+        self.permanencia_maxima = timedelta(hours=permanencia_maxima_horas)
+        self.prazos = DeadlineHeap()
+        self.recentes = deque(maxlen=ALERTAS_RECENTES)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._assinantes = []
+        self._loop = None
+        self._acordar = None
+        self._tarefa = None
+        # Veículos e reservas que já estavam no pátio na partida
+        prazos = []
+        for registro in lot.vagas:
+            prazos.extend(self._prazos_veiculo(registro))
+        for reserva in lot.reservas:
+            prazos.append((("reserva", reserva.codigo), reserva.prazo, reserva))
+        self.prazos.load(prazos)
+        lot.subscribe(self._on_event)
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def subscribe(self, callback):
+        self._assinantes.append(callback)
+
+    def _prazos_veiculo(self, registro):
+        prazos = [(("permanencia", registro.placa), registro.entrada + self.permanencia_maxima, registro)]
+        carencia = self.lot.tarifa.rule(registro.tipo).carencia_minutos
+        if carencia:
+            prazos.append((("carencia", registro.placa), registro.entrada + timedelta(minutes=carencia), registro))
+        return prazos
+
+    def _on_event(self, evento):
+        with self._lock:
+            topo = self.prazos.next_deadline()
+            if evento.tipo == "entrada":
+                for chave, prazo, registro in self._prazos_veiculo(evento.registro):
+                    self.prazos.schedule(chave, prazo, registro)
+            elif evento.tipo == "saida":
+                self.prazos.cancel(("permanencia", evento.registro.placa))
+                self.prazos.cancel(("carencia", evento.registro.placa))
+            elif evento.tipo == "reserva":
+                self.prazos.schedule(("reserva", evento.registro.codigo), evento.registro.prazo, evento.registro)
+            elif evento.tipo == "cancelamento":
+                self.prazos.cancel(("reserva", evento.registro.codigo))
+            novo_topo = self.prazos.next_deadline()
+        # Um prazo mais próximo que o do timer precisa acordá-lo
+        if novo_topo is not None and (topo is None or novo_topo < topo):
+            self._wake()
+
+    def _wake(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._acordar.set)
+
+    def _mensagem(self, tipo, chave, dados, agora):
+        # Texto do alerta, ou None se ele não vale mais (veículo saiu e voltou,
+        # reserva usada ou cancelada)
+        if tipo == "reserva":
+            if dados.situacao == "ativa":
+                self.lot.expire_reservations(agora)
+            if dados.situacao != "expirada":
+                return None
+            return f"Reserva {dados.codigo} ({dados.placa}, {dados.zona}) expirou sem chegada; a vaga foi liberada"
+        registro = self.lot.vagas.get(chave)
+        if registro is None or registro.entrada != dados.entrada:
+            return None
+        if tipo == "permanencia":
+            horas = self.permanencia_maxima.total_seconds() / 3600
+            return f"Veículo {registro.placa} (vaga {registro.vaga}) passou de {horas:g} h no pátio"
+        carencia = self.lot.tarifa.rule(registro.tipo).carencia_minutos
+        return f"Veículo {registro.placa} (vaga {registro.vaga}) passou da carência de {carencia} min e já paga estadia"
+
+    def due(self, agora=None):
+        # Tira do heap os prazos vencidos e devolve os alertas que ainda valem
+        agora = agora or datetime.now()
+        with self._lock:
+            vencidos = self.prazos.pop_due(agora)
+        alertas = []
+        for (tipo, chave), prazo, dados in vencidos:
+            mensagem = self._mensagem(tipo, chave, dados, agora)
+            if mensagem is not None:
+                self._seq += 1
+                alertas.append(Alert(self._seq, tipo, chave, prazo, mensagem))
+        self.recentes.extend(alertas)
+        return alertas
+
+    def start(self):
+        # Chamado na partida e pelas sessões; só a primeira chamada cria o timer
+        if self._tarefa is None:
+            self._loop = asyncio.get_running_loop()
+            self._acordar = asyncio.Event()
+            self._tarefa = self._loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            self._acordar.clear()
+            with self._lock:
+                proximo = self.prazos.next_deadline()
+            espera = ESPERA_MAXIMA
+            if proximo is not None:
+                espera = min(max((proximo - datetime.now()).total_seconds(), 0), ESPERA_MAXIMA)
+            try:
+                await asyncio.wait_for(self._acordar.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
+            alertas = self.due()
+            if alertas:
+                with reactive.isolate():
+                    for callback in list(self._assinantes):
+                        callback(alertas)
+                await reactive.flush()
+
+    def routes(self):
+        return [Route("/alertas", self._get_alertas, methods=["GET"])]
+
+    async def _get_alertas(self, request):
+        with self._lock:
+            proximo = self.prazos.next_deadline()
+            pendentes = len(self.prazos)
+        return JSONResponse({
+            "pendentes": pendentes,
+            "proximo_prazo": proximo.isoformat() if proximo is not None else None,
+            "recentes": [alerta.as_json() for alerta in reversed(self.recentes)],
+        })
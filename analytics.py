@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta
+
+from lazy import LazyModule
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+_EPOCA = datetime(1970, 1, 1)
+
+# Granularidades das séries: nome -> (segundos por intervalo, intervalos mantidos; None = todos)
+GRANULARIDADES = {
+    "5min": (300, 2 * 288),
+    "hora": (3600, 90 * 24),
+    "dia": (86400, None),
+}
+
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+
+
+class _Rollup:
+    # Totais por intervalo fixo de `segundos`. Intervalos que saem da retenção
+    # deixam só o saldo (chegadas - saídas) para a curva de ocupação continuar certa
+    __slots__ = ("segundos", "retencao", "intervalos", "receita_tipo", "base", "limite", "ultima")
+
+    def __init__(self, segundos, retencao):
+        self.segundos = segundos
+        self.retencao = retencao
+        # chave -> [chegadas, saídas, receita, pico de ocupação]
+        self.intervalos = {}
+        # chave -> {tipo: receita}
+        self.receita_tipo = {}
+        self.base = 0
+        self.limite = None
+        self.ultima = None
+
+    def key(self, momento):
+        return (momento - _EPOCA) // timedelta(seconds=self.segundos)
+
+    def start(self, chave):
+        return _EPOCA + timedelta(seconds=chave * self.segundos)
+
+    def first_key(self, agora):
+        # Primeira chave mantida quando o intervalo atual é o de `agora`
+        if self.retencao is None:
+            return None
+        return self.key(agora) - self.retencao + 1
+
+    def advance(self, chave):
+        if self.ultima is not None and chave <= self.ultima:
+            return
+        self.ultima = chave
+        if self.retencao is None:
+            return
+        self.limite = chave - self.retencao + 1
+        for antiga in [k for k in self.intervalos if k < self.limite]:
+            chegadas, saidas, _, _ = self.intervalos.pop(antiga)
+            self.receita_tipo.pop(antiga, None)
+            self.base += chegadas - saidas
+
+    def add(self, chave, chegadas=0, saidas=0, receita=0.0, tipo=None, ocupacao=None):
+        self.advance(chave)
+        if self.limite is not None and chave < self.limite:
+            self.base += chegadas - saidas
+            return
+        intervalo = self.intervalos.get(chave)
+        if intervalo is None:
+            intervalo = self.intervalos[chave] = [0, 0, 0.0, 0]
+        intervalo[0] += chegadas
+        intervalo[1] += saidas
+        intervalo[2] += receita
+        if receita:
+            por_tipo = self.receita_tipo.setdefault(chave, {})
+            por_tipo[tipo] = por_tipo.get(tipo, 0.0) + receita
+        if ocupacao is not None and ocupacao > intervalo[3]:
+            intervalo[3] = ocupacao
+
+    def frame(self, inicio, fim):
+        # Um registro por intervalo em [inicio, fim], inclusive os sem movimento.
+        # A primeira chave é uma sentinela com o saldo dos intervalos descartados
+        chaves = np.array([np.iinfo(np.int64).min] + sorted(self.intervalos), dtype=np.int64)
+        valores = np.zeros((len(chaves), 4))
+        if self.intervalos:
+            valores[1:] = [self.intervalos[k] for k in chaves[1:]]
+        # Ocupação no fim de cada intervalo = saldo acumulado desde o início
+        ocupacao = self.base + np.cumsum(valores[:, 0] - valores[:, 1])
+
+        kf = self.key(fim)
+        if inicio is not None:
+            ki = self.key(inicio)
+        else:
+            ki = int(chaves[1]) if len(chaves) > 1 else kf
+        todas = np.arange(ki, kf + 1, dtype=np.int64)
+        pos = np.searchsorted(chaves, todas, side="right") - 1
+        movimento = np.where((chaves[pos] == todas)[:, None], valores[pos], 0.0)
+        final = ocupacao[pos]
+        anterior = final - movimento[:, 0] + movimento[:, 1]
+        # O pico registrado ao vivo não existe para dados importados: usa no
+        # mínimo a ocupação no começo e no fim do intervalo
+        pico = np.maximum.reduce([movimento[:, 3], final, anterior])
+        return pd.DataFrame({
+            "Inicio": pd.to_datetime(todas * self.segundos, unit="s"),
+            "Chegadas": movimento[:, 0].astype(np.int64),
+            "Saidas": movimento[:, 1].astype(np.int64),
+            "Receita": movimento[:, 2],
+            "Ocupacao": final.astype(np.int64),
+            "Pico": pico.astype(np.int64),
+        })
+
+
+class TimeSeriesRollups:
+    """Séries de ocupação, chegadas/saídas e receita pré-agregadas.
+
+    Cada entrada/saída atualiza os intervalos de 5 minutos, da hora e do dia
+    em O(1). Os gráficos leem esses totais, nunca o histórico bruto.
+    """
+
+    def __init__(self, granularidades=GRANULARIDADES):
+        self.rollups = {nome: _Rollup(segundos, retencao) for nome, (segundos, retencao) in granularidades.items()}
+
+    def seed(self, totais, agora=None):
+        # totais: nome -> [(chave, tipo, chegadas, saídas, receita)] vindos do storage
+        agora = agora or datetime.now()
+        for nome, linhas in totais.items():
+            rollup = self.rollups[nome]
+            rollup.advance(rollup.key(agora))
+            for chave, tipo, chegadas, saidas, receita in linhas:
+                rollup.add(chave, chegadas, saidas, receita or 0.0, tipo)
+
+    def on_check_in(self, registro, ocupacao):
+        for rollup in self.rollups.values():
+            rollup.add(rollup.key(registro.entrada), chegadas=1, ocupacao=ocupacao)
+
+    def on_check_out(self, registro, saida, valor, ocupacao):
+        for rollup in self.rollups.values():
+            chave = rollup.key(saida)
+            rollup.add(chave, saidas=1, receita=valor, tipo=registro.tipo)
+            # O pico do intervalo inclui a ocupação logo antes da saída
+            rollup.add(chave, ocupacao=ocupacao + 1)
+
+    def history_totals(self, df):
+        # Totais de um bloco importado no formato do seed: nome -> [(chave,
+        # tipo, chegadas, saídas, receita)]. Não mexe nas séries, então pode
+        # rodar fora do lock do pátio
+        entradas = pd.to_datetime(df["Entrada"]).to_numpy(dtype="datetime64[s]").astype(np.int64)
+        saidas = pd.to_datetime(df["Saida"]).to_numpy(dtype="datetime64[s]").astype(np.int64)
+        totais = {}
+        for nome, rollup in self.rollups.items():
+            chaves, chegadas = np.unique(entradas // rollup.segundos, return_counts=True)
+            linhas = [(chave, None, n, 0, 0.0) for chave, n in zip(chaves.tolist(), chegadas.tolist())]
+            por_tipo = pd.DataFrame({"Chave": saidas // rollup.segundos, "Tipo": df["Tipo"].to_numpy(), "Valor": df["Valor"].to_numpy()})
+            agregado = por_tipo.groupby(["Chave", "Tipo"])["Valor"].agg(["sum", "count"])
+            linhas.extend(
+                (int(chave), tipo, 0, n, receita)
+                for (chave, tipo), receita, n in zip(
+                    agregado.index.tolist(), agregado["sum"].tolist(), agregado["count"].tolist())
+            )
+            totais[nome] = linhas
+        return totais
+
+    def on_history_import(self, totais):
+        # totais: saída de history_totals
+        for nome, linhas in totais.items():
+            rollup = self.rollups[nome]
+            for chave, tipo, chegadas, saidas, receita in linhas:
+                rollup.add(chave, chegadas, saidas, receita, tipo)
+
+    def series(self, granularidade, inicio=None, fim=None):
+        return self.rollups[granularidade].frame(inicio, fim or datetime.now())
+
+    def revenue_by_type(self, granularidade, inicio=None, fim=None):
+        # Receita por intervalo (linhas) e tipo de veículo (colunas)
+        rollup = self.rollups[granularidade]
+        fim = fim or datetime.now()
+        ki = -np.inf if inicio is None else rollup.key(inicio)
+        kf = rollup.key(fim)
+        linhas = {
+            rollup.start(chave): por_tipo
+            for chave, por_tipo in rollup.receita_tipo.items()
+            if ki <= chave <= kf
+        }
+        return pd.DataFrame.from_dict(linhas, orient="index").fillna(0.0).sort_index()
+
+    def peak_hours(self, dias=28, agora=None):
+        # Média de chegadas e do pico de ocupação por dia da semana x hora,
+        # calculada sobre os intervalos horários (no máximo dias * 24 linhas)
+        agora = agora or datetime.now()
+        df = self.series("hora", agora - timedelta(days=dias), agora)
+        df["Dia"] = df["Inicio"].dt.dayofweek
+        df["Hora"] = df["Inicio"].dt.hour
+        medias = df.groupby(["Dia", "Hora"])[["Chegadas", "Pico"]].mean()
+        completo = pd.MultiIndex.from_product([range(7), range(24)], names=["Dia", "Hora"])
+        return medias.reindex(completo, fill_value=0.0)
@@ -1,15 +1,98 @@
 from shiny import App, render, ui, reactive
-from datetime import datetime
-import pandas as pd
-from shinywidgets import output_widget, render_widget
-import plotly.express as px
-import plotly.graph_objects as go
+from starlette.applications import Starlette
+from datetime import datetime, timedelta
+import asyncio
+import atexit
+import contextlib
+import os
+import tempfile
+import time
+from lazy import LazyModule, preload
+from occupancy import LotError
+from clock import ClockBroadcaster
+from alerts import NOTIFICACOES
+from analytics import DIAS_SEMANA
+from reservations import MINUTOS_POR_INTERVALO
+from reports import PERIODOS, POOL, TURNOS, report_period
+from metrics import MetricsRegistry, WebSocketMeter
+from offload import OffloadedOutput
+from history_io import (
+    iter_history_csv, iter_history_file, parquet_available, validate_history_file, write_history_parquet,
+)
+from shards import ShardRegistry, load_lots_config
+from tariff import TariffRule, TariffTable
+
+# Módulos pesados importados só no primeiro uso (a primeira página ou sessão),
+# para o worker ficar pronto mais rápido
+pd = LazyModule("pandas")
+go = LazyModule("plotly.graph_objects")
+shinywidgets = LazyModule("shinywidgets")
 
 # Taxa por hora do estacionamento
 TAXA_POR_HORA = 5.00
+
+# Tabela de tarifas: regra padrão e regras específicas por tipo de veículo,
+# ex.: {"Moto": TariffRule(primeira_hora=3.00, hora=2.00, fracao_minutos=15)}
+TARIFAS_POR_TIPO = {}
+TARIFA = TariffTable(TariffRule(primeira_hora=TAXA_POR_HORA, hora=TAXA_POR_HORA), TARIFAS_POR_TIPO)
 VAGAS_TOTAIS = 50
 
-# Cores personalizadas
+# Pisos/setores do estacionamento: (nome, quantidade de vagas), numerados em sequência
+ZONAS = [("Térreo", VAGAS_TOTAIS)]
+
+# Permanência (horas) a partir da qual o painel avisa do veículo
+PERMANENCIA_MAXIMA_HORAS = 24
+# Alertas de prazo mostrados um a um por lote; o excedente vira um aviso só
+NOTIFICACOES_POR_LOTE = 5
+
+CORES_VEICULO = ["Branco", "Preto", "Prata", "Vermelho", "Azul", "Verde", "Amarelo", "Outro"]
+TIPOS_VEICULO = ["Carro", "Moto", "SUV", "Caminhonete", "Van", "Outro"]
+
+# Resoluções (segundos) do relógio compartilhado para cada saída dependente do tempo
+INTERVALO_COTACAO = 5
+INTERVALO_RELOGIO = 60
+
+# Opções de tamanho de página da tabela de histórico
+HISTORICO_POR_PAGINA = [25, 50, 100]
+
+# Intervalo mínimo (segundos) entre atualizações dos gráficos de uma sessão
+INTERVALO_GRAFICOS = 0.5
+
+# Granularidades do gráfico de tendência: nome -> (rótulo, dias exibidos)
+TENDENCIAS = {
+    "5min": ("5 minutos (últimas 24 horas)", 1),
+    "hora": ("Hora (últimos 7 dias)", 7),
+    "dia": ("Dia (últimos 90 dias)", 90),
+}
+# Quantos dias entram na média dos horários de pico
+DIAS_PICO = 28
+
+# Formulário de reservas: horários de início (na granularidade das reservas),
+# durações em horas e quantas reservas a tabela mostra
+HORARIOS_RESERVA = [f"{h:02d}:{m:02d}" for h in range(24) for m in range(0, 60, MINUTOS_POR_INTERVALO)]
+DURACOES_RESERVA = [1, 2, 3, 4, 6, 8, 12, 24]
+RESERVAS_NA_TABELA = 50
+# Janela (horas) do pico reservado mostrado no cartão de reservas
+HORAS_PICO_RESERVADO = 24
+
+# Painel de métricas no dashboard (as métricas em /metrics ficam sempre disponíveis)
+PAINEL_ADMIN = os.environ.get("PARKING_ADMIN", "") == "1"
+
+# Importa pandas/plotly/shinywidgets em segundo plano assim que o worker sobe,
+# em vez de no primeiro acesso
+PREAQUECER = os.environ.get("PARKING_PREAQUECER", "") == "1"
+
+# Banco SQLite com os veículos ativos e o histórico (vazio desativa a persistência)
+BANCO_DADOS = os.environ.get("PARKING_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "parking.db"))
+
+# Várias unidades num processo: arquivo JSON com a lista de unidades (ver
+# README). Sem ele, uma única unidade com as constantes acima
+ARQUIVO_LOTES = os.environ.get("PARKING_LOTS", "")
+# Só estas unidades neste processo (ids separados por vírgula), para dividir
+# as unidades entre vários workers
+LOTES_DESTE_PROCESSO = [l for l in os.environ.get("PARKING_LOTS_ONLY", "").split(",") if l]
+
+# Cores personalizadas (as mesmas de :root em www/parking.css)
 COLORS = {
     "dark": "#1a1a2e",
     "primary": "#4e54c8",
@@ -21,457 +104,651 @@ COLORS = {
     "warning": "#f39c12"
 }
 
-# Criar DataFrames vazios com estrutura correta
-def create_empty_df():
-    return pd.DataFrame(columns=["Nome", "Modelo", "Placa", "Cor", "Tipo", "Entrada"])
-
-def create_empty_history_df():
-    return pd.DataFrame(columns=["Nome", "Modelo", "Placa", "Cor", "Tipo", "Entrada", "Saida", "Valor", "Tempo"])
-
-app_ui = ui.page_fluid(
-    ui.tags.head(
-        ui.tags.link(rel="stylesheet", href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css"),
-        ui.tags.style(f"""
-            :root {{
-                --dark: {COLORS["dark"]};
-                --primary: {COLORS["primary"]};
-                --secondary: {COLORS["secondary"]};
-                --accent: {COLORS["accent"]};
-                --light: {COLORS["light"]};
-                --success: {COLORS["success"]};
-                --danger: {COLORS["danger"]};
-                --warning: {COLORS["warning"]};
-            }}
-            
-            body {{
-                background-color: var(--dark);
-                color: var(--light);
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            }}
-            
-            .navbar {{
-                background: linear-gradient(135deg, var(--primary), var(--secondary));
-                padding: 15px 0;
-                box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-                margin-bottom: 30px;
-            }}
-            
-            .card {{
-                background-color: rgba(255, 255, 255, 0.05);
-                border: none;
-                border-radius: 10px;
-                padding: 25px;
-                margin-bottom: 25px;
-                transition: all 0.3s ease;
-                box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-            }}
-            
-            .card:hover {{
-                transform: translateY(-5px);
-                box-shadow: 0 10px 20px rgba(0, 0, 0, 0.2);
-                background-color: rgba(255, 255, 255, 0.08);
-            }}
-            
-            .card-title {{
-                color: var(--secondary);
-                font-weight: 600;
-                margin-bottom: 20px;
-                display: flex;
-                align-items: center;
-                gap: 10px;
-            }}
-            
-            .btn {{
-                border: none;
-                border-radius: 50px;
-                padding: 10px 20px;
-                font-weight: 600;
-                transition: all 0.3s ease;
-                display: inline-flex;
-                align-items: center;
-                gap: 8px;
-            }}
-            
-            .btn-primary {{
-                background: linear-gradient(135deg, var(--primary), var(--secondary));
-                color: white;
-            }}
-            
-            .btn-primary:hover {{
-                transform: translateY(-2px);
-                box-shadow: 0 5px 15px rgba(78, 84, 200, 0.4);
-            }}
-            
-            .btn-danger {{
-                background: linear-gradient(135deg, var(--danger), #c0392b);
-                color: white;
-            }}
-            
-            .btn-danger:hover {{
-                transform: translateY(-2px);
-                box-shadow: 0 5px 15px rgba(231, 76, 60, 0.4);
-            }}
-            
-            .form-control {{
-                background-color: rgba(255, 255, 255, 0.1);
-                border: 1px solid rgba(255, 255, 255, 0.2);
-                color: white;
-                border-radius: 5px;
-                padding: 10px 15px;
-            }}
-            
-            .form-control:focus {{
-                background-color: rgba(255, 255, 255, 0.15);
-                color: white;
-                border-color: var(--secondary);
-                box-shadow: 0 0 0 0.25rem rgba(78, 84, 200, 0.25);
-            }}
-            
-            .selectize-input {{
-                background-color: rgba(255, 255, 255, 0.1) !important;
-                border: 1px solid rgba(255, 255, 255, 0.2) !important;
-                color: white !important;
-                border-radius: 5px !important;
-            }}
-            
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin-top: 20px;
-            }}
-            
-            th {{
-                background-color: var(--primary);
-                color: white;
-                padding: 12px;
-                text-align: left;
-            }}
-            
-            td {{
-                padding: 12px;
-                border-bottom: 1px solid rgba(255, 255, 255, 0.1);
-            }}
-            
-            tr:hover {{
-                background-color: rgba(255, 255, 255, 0.05);
-            }}
-            
-            .value-card {{
-                background: linear-gradient(135deg, var(--primary), var(--secondary));
-                padding: 20px;
-                border-radius: 10px;
-                color: white;
-                margin-top: 20px;
-                font-family: monospace;
-                white-space: pre-wrap;
-            }}
-            
-            .stats-container {{
-                display: flex;
-                gap: 15px;
-                margin-bottom: 30px;
-                flex-wrap: wrap;
-            }}
-            
-            .stat-card {{
-                flex: 1;
-                min-width: 200px;
-                background-color: rgba(255, 255, 255, 0.05);
-                border-radius: 10px;
-                padding: 15px;
-                text-align: center;
-            }}
-            
-            .stat-value {{
-                font-size: 2rem;
-                font-weight: bold;
-                color: var(--secondary);
-                margin: 10px 0;
-            }}
-            
-            .stat-label {{
-                color: rgba(255, 255, 255, 0.7);
-                font-size: 0.9rem;
-            }}
-            
-            .icon {{
-                margin-right: 10px;
-            }}
-            
-            .control-label {{
-                color: var(--light) !important;
-                margin-bottom: 8px;
-                font-weight: 500;
-            }}
-            
-            ::placeholder {{
-                color: rgba(255, 255, 255, 0.5) !important;
-            }}
-            
-            .parking-slot {{
-                width: 30px;
-                height: 50px;
-                border-radius: 5px;
-                display: inline-flex;
-                align-items: center;
-                justify-content: center;
-                margin: 3px;
-                font-size: 10px;
-                transition: all 0.3s ease;
-            }}
-            
-            .parking-grid {{
-                display: grid;
-                grid-template-columns: repeat(10, 1fr);
-                gap: 10px;
-                margin-top: 20px;
-            }}
-            
-            .notification {{
-                position: fixed;
-                bottom: 20px;
-                right: 20px;
-                padding: 15px 25px;
-                border-radius: 5px;
-                background-color: var(--success);
-                color: white;
-                box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-                opacity: 0;
-                transition: opacity 0.5s ease;
-                z-index: 1000;
-            }}
-            
-            .notification.show {{
-                opacity: 1;
-            }}
-            
-            @media (max-width: 768px) {{
-                .stats-container {{
-                    flex-direction: column;
-                }}
-                .parking-grid {{
-                    grid-template-columns: repeat(5, 1fr);
-                }}
-            }}
-        """)
-    ),
-    
-    # Notificação
-    ui.div(id="notification", class_="notification", style="display: none;"),
-    
-    # Navbar
-    ui.div(
-        {"class": "navbar"},
+def create_occupancy_figure(capacidade):
+    fig = go.FigureWidget(go.Pie(
+        labels=["Ocupado", "Vago"],
+        values=[0, capacidade],
+        marker_colors=[COLORS["primary"], COLORS["dark"]],
+        hole=0.4
+    ))
+    
+    fig.update_layout(
+        title="Ocupação do Estacionamento",
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font_color=COLORS["light"],
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        )
+    )
+    
+    return fig
+
+def create_types_figure():
+    cores = [COLORS["primary"], COLORS["secondary"], COLORS["accent"], COLORS["success"]]
+    fig = go.FigureWidget(go.Bar(
+        x=TIPOS_VEICULO,
+        y=[0] * len(TIPOS_VEICULO),
+        marker_color=[cores[i % len(cores)] for i in range(len(TIPOS_VEICULO))]
+    ))
+    fig.add_annotation(text="Nenhum veículo no estacionamento",
+                       xref="paper", yref="paper",
+                       x=0.5, y=0.5, showarrow=False)
+    
+    fig.update_layout(
+        title="Distribuição por Tipo de Veículo",
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font_color=COLORS["light"],
+        xaxis_title="",
+        yaxis_title="Quantidade",
+        showlegend=False
+    )
+    
+    return fig
+
+# Tabelas pesadas: montadas (até o HTML) numa thread do pool de renders
+def table_html(df):
+    # Mesmo HTML que o render.table gera
+    return df.to_html(index=False, classes="table shiny-table w-auto", border=0)
+
+def vehicles_table_html(lot):
+    # Só a cópia do pátio segura o lock; ordenar e formatar ficam fora dele
+    with lot.locked():
+        df = lot.vagas.to_frame()
+    if not df.empty:
+        # Ordena pelo datetime antes de formatar (a string não ordena cronologicamente)
+        df = df.sort_values("Entrada", ascending=False)
+        df["Entrada"] = df["Entrada"].dt.strftime("%d/%m/%Y %H:%M:%S")
+    return table_html(df)
+
+def history_page_html(lot, dias, por_pagina, pagina):
+    # (página, páginas, registros, HTML) da página pedida, da mais recente para a mais antiga
+    # Sem o lock do pátio: o histórico tem o seu, e lê os dias antigos do
+    # disco fora dele
+    data_limite = datetime.now() - timedelta(days=dias)
+    total = lot.historico.count(data_limite)
+    paginas = max(1, -(-total // por_pagina))
+    pagina = min(pagina, paginas - 1)
+    df = lot.historico.page(data_limite, None, pagina * por_pagina, por_pagina)
+    if not df.empty:
+        df["Entrada"] = df["Entrada"].dt.strftime("%d/%m/%Y %H:%M:%S")
+        df["Saida"] = df["Saida"].dt.strftime("%d/%m/%Y %H:%M:%S")
+        df["Valor"] = [f"R$ {x:.2f}" for x in df["Valor"]]
+        df["Tempo"] = [f"{x:.1f} horas" for x in df["Tempo"]]
+    return pagina, paginas, total, table_html(df)
+
+def _layout_escuro(fig, **kwargs):
+    fig.update_layout(
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font_color=COLORS["light"],
+        **kwargs
+    )
+    return fig
+
+def create_trend_figure(capacidade):
+    fig = go.FigureWidget()
+    fig.add_bar(name="Chegadas", x=[], y=[], marker_color=COLORS["success"])
+    fig.add_bar(name="Saídas", x=[], y=[], marker_color=COLORS["accent"])
+    fig.add_scatter(name="Ocupação", x=[], y=[], mode="lines", yaxis="y2",
+                    line=dict(color=COLORS["secondary"], width=3, shape="hv"))
+    return _layout_escuro(
+        fig,
+        title="Ocupação e Movimento",
+        yaxis=dict(title="Veículos por intervalo"),
+        yaxis2=dict(title="Ocupação", overlaying="y", side="right", range=[0, capacidade]),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        barmode="group"
+    )
+
+def create_revenue_figure():
+    cores = [COLORS["primary"], COLORS["secondary"], COLORS["accent"], COLORS["success"], COLORS["warning"], COLORS["danger"]]
+    fig = go.FigureWidget()
+    for i, tipo in enumerate(TIPOS_VEICULO):
+        fig.add_bar(name=tipo, x=[], y=[], marker_color=cores[i % len(cores)])
+    return _layout_escuro(
+        fig,
+        title="Receita por Tipo de Veículo",
+        yaxis=dict(title="R$"),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        barmode="stack"
+    )
+
+def create_peak_figure():
+    fig = go.FigureWidget(go.Heatmap(
+        x=list(range(24)),
+        y=DIAS_SEMANA,
+        z=[[0] * 24 for _ in DIAS_SEMANA],
+        colorscale=[[0, COLORS["dark"]], [0.5, COLORS["primary"]], [1, COLORS["accent"]]],
+        colorbar=dict(title="Chegadas")
+    ))
+    return _layout_escuro(
+        fig,
+        title=f"Chegadas Médias por Hora (últimos {DIAS_PICO} dias)",
+        xaxis=dict(title="Hora", dtick=2),
+        yaxis=dict(autorange="reversed")
+    )
+
+def create_parking_map(zonas):
+    blocos = []
+    for i, zona in enumerate(zonas):
+        blocos.append(ui.div(
+            {"class": "parking-zone-title"},
+            f"{zona.nome} - ",
+            ui.tags.span(str(zona.vagas), id=f"zona-livres-{i}"),
+            f" de {zona.vagas} vagas livres"
+        ))
+        blocos.append(ui.div(
+            {"class": "parking-grid"},
+            *[
+                ui.div(str(vaga), id=f"vaga-{vaga}", class_="parking-slot livre", data_zona=str(i))
+                for vaga in range(zona.primeira, zona.ultima + 1)
+            ]
+        ))
+    return ui.div(*blocos)
+
+# Aplica no cliente as mudanças de vaga enviadas pelo servidor
+MAPA_JS = """
+function ajustarLivres(zona, delta) {
+    var el = document.getElementById("zona-livres-" + zona);
+    if (el) el.textContent = parseInt(el.textContent, 10) + delta;
+}
+Shiny.addCustomMessageHandler("vagas", function(msg) {
+    if (msg.completo) {
+        document.querySelectorAll(".parking-slot.ocupada").forEach(function(el) {
+            el.classList.replace("ocupada", "livre");
+            el.removeAttribute("title");
+            ajustarLivres(el.dataset.zona, 1);
+        });
+    }
+    msg.mudancas.forEach(function(mudanca) {
+        var el = document.getElementById("vaga-" + mudanca[0]);
+        if (!el) return;
+        var ocupada = mudanca[1] !== null;
+        if (el.classList.contains("ocupada") !== ocupada) {
+            ajustarLivres(el.dataset.zona, ocupada ? -1 : 1);
+        }
+        el.classList.toggle("ocupada", ocupada);
+        el.classList.toggle("livre", !ocupada);
+        if (ocupada) el.title = mudanca[1]; else el.removeAttribute("title");
+    });
+});
+"""
+
+def app_ui(request):
+    # A página depende da unidade (mapa, capacidade, nome)
+    shard = SHARDS.for_request(request)
+    if shard is None:
+        return ui.page_fluid(ui.h2("Unidade não encontrada"))
+    
+    return ui.page_fluid(
+        ui.tags.head(
+            ui.tags.link(rel="stylesheet", href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css"),
+            ui.tags.link(rel="stylesheet", href="parking.css"),
+        ),
+    
+        # Notificação
+        ui.div(id="notification", class_="notification", style="display: none;"),
+    
+        # Navbar
         ui.div(
-            {"class": "container-fluid"},
-            ui.h2(
-                {"style": "color: white; margin: 0;"},
-                ui.tags.i({"class": "fas fa-parking icon"}), 
-                "Parking Manager Pro"
-            ),
+            {"class": "navbar"},
             ui.div(
-                {"style": "color: white; font-size: 1rem;"},
-                ui.output_text("current_time")
+                {"class": "container-fluid"},
+                ui.h2(
+                    {"style": "color: white; margin: 0;"},
+                    ui.tags.i({"class": "fas fa-parking icon"}), 
+                    "Parking Manager Pro",
+                    ui.tags.small({"style": "margin-left: 10px; opacity: 0.8;"}, shard.nome) if len(SHARDS) > 1 else None
+                ),
+                ui.div(
+                    {"style": "color: white; font-size: 1rem;"},
+                    ui.output_text("current_time")
+                )
             )
-        )
-    ),
+        ),
     
-    ui.div(
-        {"class": "container-fluid"},
-        
-        # Estatísticas
         ui.div(
-            {"class": "stats-container"},
+            {"class": "container-fluid"},
+        
+            # Estatísticas
             ui.div(
-                {"class": "stat-card"},
-                ui.div({"class": "stat-label"}, "Veículos Ativos"),
-                ui.div({"class": "stat-value"}, ui.output_text("contador_ativos")),
-                ui.tags.i({"class": "fas fa-car", "style": "font-size: 1.5rem; color: var(--secondary);"})
+                {"class": "stats-container"},
+                ui.div(
+                    {"class": "stat-card"},
+                    ui.div({"class": "stat-label"}, "Veículos Ativos"),
+                    ui.div({"class": "stat-value"}, ui.output_text("contador_ativos")),
+                    ui.tags.i({"class": "fas fa-car", "style": "font-size: 1.5rem; color: var(--secondary);"})
+                ),
+                ui.div(
+                    {"class": "stat-card"},
+                    ui.div({"class": "stat-label"}, "Faturamento Hoje"),
+                    ui.div({"class": "stat-value"}, ui.output_text("faturamento_hoje")),
+                    ui.tags.i({"class": "fas fa-money-bill-wave", "style": "font-size: 1.5rem; color: var(--secondary);"})
+                ),
+                ui.div(
+                    {"class": "stat-card"},
+                    ui.div({"class": "stat-label"}, "Média por Veículo"),
+                    ui.div({"class": "stat-value"}, ui.output_text("media_veiculo")),
+                    ui.tags.i({"class": "fas fa-chart-line", "style": "font-size: 1.5rem; color: var(--secondary);"})
+                ),
+                ui.div(
+                    {"class": "stat-card"},
+                    ui.div({"class": "stat-label"}, "Vagas Disponíveis"),
+                    ui.div({"class": "stat-value"}, ui.output_text("vagas_disponiveis")),
+                    ui.tags.i({"class": "fas fa-parking", "style": "font-size: 1.5rem; color: var(--secondary);"})
+                )
             ),
+        
+            # Gráficos
             ui.div(
-                {"class": "stat-card"},
-                ui.div({"class": "stat-label"}, "Faturamento Hoje"),
-                ui.div({"class": "stat-value"}, ui.output_text("faturamento_hoje")),
-                ui.tags.i({"class": "fas fa-money-bill-wave", "style": "font-size: 1.5rem; color: var(--secondary);"})
+                {"class": "row"},
+                ui.div(
+                    {"class": "col-md-6"},
+                    ui.div(
+                        {"class": "card"},
+                        ui.h3({"class": "card-title"}, ui.tags.i({"class": "fas fa-chart-pie icon"}), "Ocupação do Estacionamento"),
+                        shinywidgets.output_widget("grafico_ocupacao")
+                    )
+                ),
+                ui.div(
+                    {"class": "col-md-6"},
+                    ui.div(
+                        {"class": "card"},
+                        ui.h3({"class": "card-title"}, ui.tags.i({"class": "fas fa-chart-bar icon"}), "Tipos de Veículos"),
+                        shinywidgets.output_widget("grafico_tipos")
+                    )
+                )
             ),
+        
+            # Tendências (séries pré-agregadas)
             ui.div(
-                {"class": "stat-card"},
-                ui.div({"class": "stat-label"}, "Média por Veículo"),
-                ui.div({"class": "stat-value"}, ui.output_text("media_veiculo")),
-                ui.tags.i({"class": "fas fa-chart-line", "style": "font-size: 1.5rem; color: var(--secondary);"})
+                {"class": "card"},
+                ui.h3({"class": "card-title"}, ui.tags.i({"class": "fas fa-chart-line icon"}), "Tendências"),
+                ui.input_select("tendencia_granularidade", "Agrupar por:",
+                                {nome: rotulo for nome, (rotulo, _) in TENDENCIAS.items()}, selected="hora"),
+                shinywidgets.output_widget("grafico_tendencia")
             ),
             ui.div(
-                {"class": "stat-card"},
-                ui.div({"class": "stat-label"}, "Vagas Disponíveis"),
-                ui.div({"class": "stat-value"}, ui.output_text("vagas_disponiveis")),
-                ui.tags.i({"class": "fas fa-parking", "style": "font-size: 1.5rem; color: var(--secondary);"})
-            )
-        ),
+                {"class": "row"},
+                ui.div(
+                    {"class": "col-md-6"},
+                    ui.div(
+                        {"class": "card"},
+                        ui.h3({"class": "card-title"}, ui.tags.i({"class": "fas fa-coins icon"}), "Receita"),
+                        shinywidgets.output_widget("grafico_receita")
+                    )
+                ),
+                ui.div(
+                    {"class": "col-md-6"},
+                    ui.div(
+                        {"class": "card"},
+                        ui.h3({"class": "card-title"}, ui.tags.i({"class": "fas fa-clock icon"}), "Horários de Pico"),
+                        shinywidgets.output_widget("grafico_pico")
+                    )
+                )
+            ),
         
-        # Gráficos
-        ui.div(
-            {"class": "row"},
+            # Visualização do Estacionamento
+            ui.div(
+                {"class": "card"},
+                ui.h3({"class": "card-title"}, ui.tags.i({"class": "fas fa-map-marked-alt icon"}), "Mapa do Estacionamento"),
+                ui.p("Vagas ocupadas estão em vermelho, vagas disponíveis em verde"),
+                # O mapa é HTML estático; o servidor só envia as vagas que mudaram
+                create_parking_map(shard.lot.zonas)
+            ),
+        
+            # Card para adicionar veículos
             ui.div(
-                {"class": "col-md-6"},
+                {"class": "row"},
                 ui.div(
-                    {"class": "card"},
-                    ui.h3({"class": "card-title"}, ui.tags.i({"class": "fas fa-chart-pie icon"}), "Ocupação do Estacionamento"),
-                    output_widget("grafico_ocupacao")
+                    {"class": "col-md-6"},
+                    ui.div(
+                        {"class": "card"},
+                        ui.h3(
+                            {"class": "card-title"},
+                            ui.tags.i({"class": "fas fa-car-side icon"}),
+                            "Adicionar Veículo"
+                        ),
+                        ui.input_text("nome", "Nome do Proprietário", placeholder="Digite o nome"),
+                        ui.input_text("modelo", "Modelo do Veículo", placeholder="Digite o modelo"),
+                        ui.input_text("placa", "Placa do Veículo", placeholder="Digite a placa"),
+                        ui.input_select("cor", "Cor do Veículo", 
+                                       choices=CORES_VEICULO),
+                        ui.input_select("tipo", "Tipo de Veículo", 
+                                       choices=TIPOS_VEICULO),
+                        ui.input_action_button(
+                            "adicionar", 
+                            ui.tags.span(ui.tags.i({"class": "fas fa-plus-circle me-2"}), "Adicionar Veículo"), 
+                            class_="btn-primary"
+                        )
+                    )
+                ),
+            
+                # Card para remover veículos
+                ui.div(
+                    {"class": "col-md-6"},
+                    ui.div(
+                        {"class": "body"},
+                        ui.h3(
+                            {"class": "card-title"},
+                            ui.tags.i({"class": "fas fa-sign-out-alt icon"}),
+                            "Remover Veículo"
+                        ),
+                        ui.input_text("busca_placa", "Buscar Placa", placeholder="ABC1234 ou ABC1D23"),
+                        ui.input_select(
+                            "veiculo_selecionado", 
+                            "Selecione o Veículo (Placa)", 
+                            choices=[]
+                        ),
+                        ui.output_ui("veiculo_info"),
+                        ui.input_text("operador", "Operador", placeholder="Quem registra a saída"),
+                        ui.input_action_button(
+                            "remover", 
+                            ui.tags.span(ui.tags.i({"class": "fas fa-minus-circle me-2"}), "Remover Veículo"), 
+                            class_="btn-danger"
+                        ),
+                        ui.div(
+                            {"class": "value-card"},
+                            ui.output_text_verbatim("valor_pagar")
+                        )
+                    )
                 )
             ),
+        
+            # Reservas: vagas prometidas por zona e período
             ui.div(
-                {"class": "col-md-6"},
+                {"class": "card"},
+                ui.h3(
+                    {"class": "card-title"},
+                    ui.tags.i({"class": "fas fa-calendar-check icon"}),
+                    "Reservas"
+                ),
                 ui.div(
-                    {"class": "card"},
-                    ui.h3({"class": "card-title"}, ui.tags.i({"class": "fas fa-chart-bar icon"}), "Tipos de Veículos"),
-                    output_widget("grafico_tipos")
-                )
-            )
-        ),
+                    {"class": "row"},
+                    ui.div(
+                        {"class": "col-md-6"},
+                        ui.input_text("reserva_nome", "Nome do Cliente", placeholder="Digite o nome"),
+                        ui.input_text("reserva_placa", "Placa do Veículo", placeholder="Digite a placa"),
+                        ui.input_select("reserva_zona", "Zona", choices=[z.nome for z in shard.lot.zonas]),
+                        ui.input_date("reserva_data", "Data", format="dd/mm/yyyy", language="pt-BR"),
+                        ui.input_select("reserva_hora", "Início", choices=HORARIOS_RESERVA),
+                        ui.input_select("reserva_duracao", "Duração",
+                                        choices={str(h): f"{h} h" for h in DURACOES_RESERVA}),
+                        ui.input_action_button(
+                            "reservar",
+                            ui.tags.span(ui.tags.i({"class": "fas fa-calendar-plus me-2"}), "Reservar"),
+                            class_="btn-primary"
+                        )
+                    ),
+                    ui.div(
+                        {"class": "col-md-6"},
+                        ui.div({"class": "value-card"}, ui.output_text("reserva_disponibilidade")),
+                        ui.input_text("reserva_codigo", "Código da Reserva", placeholder="Código para cancelar"),
+                        ui.input_action_button(
+                            "cancelar_reserva",
+                            ui.tags.span(ui.tags.i({"class": "fas fa-calendar-times me-2"}), "Cancelar Reserva"),
+                            class_="btn-danger"
+                        )
+                    )
+                ),
+                ui.output_table("tabela_reservas")
+            ),
         
-        # Visualização do Estacionamento
-        ui.div(
-            {"class": "card"},
-            ui.h3({"class": "card-title"}, ui.tags.i({"class": "fas fa-map-marked-alt icon"}), "Mapa do Estacionamento"),
-            ui.p("Vagas ocupadas estão em vermelho, vagas disponíveis em verde"),
-            ui.output_ui("parking_slots_ui")  # Alterado para output_ui
-        ),
+            # Tabela de veículos no estacionamento
+            ui.div(
+                {"class": "card"},
+                ui.h3(
+                    {"class": "card-title"},
+                    ui.tags.i({"class": "fas fa-clipboard-list icon"}),
+                    "Veículos no Estacionamento"
+                ),
+                ui.output_ui("tabela_veiculos")
+            ),
         
-        # Card para adicionar veículos
-        ui.div(
-            {"class": "row"},
+            # Tabela de histórico
             ui.div(
-                {"class": "col-md-6"},
+                {"class": "card"},
+                ui.h3(
+                    {"class": "card-title"},
+                    ui.tags.i({"class": "fas fa-history icon"}),
+                    "Histórico de Veículos"
+                ),
+                ui.input_slider("historico_dias", "Mostrar últimos dias:", min=1, max=30, value=7),
+                ui.input_select("historico_por_pagina", "Registros por página:",
+                                choices=[str(n) for n in HISTORICO_POR_PAGINA], selected=str(HISTORICO_POR_PAGINA[0])),
+                ui.output_ui("tabela_historico"),
                 ui.div(
-                    {"class": "card"},
-                    ui.h3(
-                        {"class": "card-title"},
-                        ui.tags.i({"class": "fas fa-car-side icon"}),
-                        "Adicionar Veículo"
+                    {"style": "display: flex; align-items: center; gap: 15px; margin-top: 15px;"},
+                    ui.input_action_button(
+                        "historico_anterior",
+                        ui.tags.span(ui.tags.i({"class": "fas fa-chevron-left"}), "Anterior"),
+                        class_="btn-primary"
                     ),
-                    ui.input_text("nome", "Nome do Proprietário", placeholder="Digite o nome"),
-                    ui.input_text("modelo", "Modelo do Veículo", placeholder="Digite o modelo"),
-                    ui.input_text("placa", "Placa do Veículo", placeholder="Digite a placa"),
-                    ui.input_select("cor", "Cor do Veículo", 
-                                   choices=["Branco", "Preto", "Prata", "Vermelho", "Azul", "Verde", "Amarelo", "Outro"]),
-                    ui.input_select("tipo", "Tipo de Veículo", 
-                                   choices=["Carro", "Moto", "SUV", "Caminhonete", "Van", "Outro"]),
+                    ui.output_text("historico_pagina_info"),
                     ui.input_action_button(
-                        "adicionar", 
-                        ui.tags.span(ui.tags.i({"class": "fas fa-plus-circle me-2"}), "Adicionar Veículo"), 
+                        "historico_proxima",
+                        ui.tags.span("Próxima", ui.tags.i({"class": "fas fa-chevron-right"})),
                         class_="btn-primary"
                     )
                 )
             ),
-            
-            # Card para remover veículos
+        
+            # Ocupação num momento passado (diário de eventos)
             ui.div(
-                {"class": "col-md-6"},
+                {"class": "card"},
+                ui.h3(
+                    {"class": "card-title"},
+                    ui.tags.i({"class": "fas fa-search-location icon"}),
+                    "Ocupação em um Momento"
+                ),
+                ui.p("Veículos que estavam no pátio na data e hora informadas"),
                 ui.div(
-                    {"class": "body"},
-                    ui.h3(
-                        {"class": "card-title"},
-                        ui.tags.i({"class": "fas fa-sign-out-alt icon"}),
-                        "Remover Veículo"
-                    ),
-                    ui.input_select(
-                        "veiculo_selecionado", 
-                        "Selecione o Veículo (Placa)", 
-                        choices=[]
-                    ),
-                    ui.output_ui("veiculo_info"),
+                    {"style": "display: flex; align-items: flex-end; gap: 15px;"},
+                    ui.input_date("momento_data", "Data", format="dd/mm/yyyy", language="pt-BR"),
+                    ui.input_text("momento_hora", "Hora (HH:MM:SS)", value="12:00:00"),
                     ui.input_action_button(
-                        "remover", 
-                        ui.tags.span(ui.tags.i({"class": "fas fa-minus-circle me-2"}), "Remover Veículo"), 
-                        class_="btn-danger"
+                        "consultar_momento",
+                        ui.tags.span(ui.tags.i({"class": "fas fa-search me-2"}), "Consultar"),
+                        class_="btn-primary"
+                    )
+                ),
+                ui.output_text("momento_info"),
+                ui.output_table("tabela_momento")
+            ),
+        
+            # Relatórios do histórico, calculados fora do loop de eventos
+            ui.div(
+                {"class": "card"},
+                ui.h3(
+                    {"class": "card-title"},
+                    ui.tags.i({"class": "fas fa-file-invoice-dollar icon"}),
+                    "Relatórios"
+                ),
+                ui.div(
+                    {"style": "display: flex; align-items: flex-end; gap: 15px;"},
+                    ui.input_select("relatorio_tipo", "Período", choices=PERIODOS),
+                    ui.input_date("relatorio_data", "Data", format="dd/mm/yyyy", language="pt-BR"),
+                    ui.panel_conditional(
+                        "input.relatorio_tipo === 'turno'",
+                        ui.input_select("relatorio_turno", "Turno",
+                                        choices={nome: f"{nome} ({hora:02d}h)" for nome, hora in TURNOS})
                     ),
-                    ui.div(
-                        {"class": "value-card"},
-                        ui.output_text_verbatim("valor_pagar")
+                    ui.input_task_button(
+                        "gerar_relatorio",
+                        ui.tags.span(ui.tags.i({"class": "fas fa-cogs me-2"}), "Gerar Relatório"),
+                        label_busy="Gerando...",
+                        class_="btn-primary"
                     )
+                ),
+                ui.output_ui("relatorio_resumo"),
+                ui.div(
+                    {"class": "row"},
+                    ui.div({"class": "col-md-4"}, ui.h5("Receita por tipo"), ui.output_table("relatorio_tipos")),
+                    ui.div({"class": "col-md-4"}, ui.h5("Permanência"), ui.output_table("relatorio_permanencia")),
+                    ui.div({"class": "col-md-4"}, ui.h5("Por operador"), ui.output_table("relatorio_operadores"))
                 )
-            )
-        ),
-        
-        # Tabela de veículos no estacionamento
-        ui.div(
-            {"class": "card"},
-            ui.h3(
-                {"class": "card-title"},
-                ui.tags.i({"class": "fas fa-clipboard-list icon"}),
-                "Veículos no Estacionamento"
             ),
-            ui.output_table("tabela_veiculos")
-        ),
         
-        # Tabela de histórico
-        ui.div(
-            {"class": "card"},
-            ui.h3(
-                {"class": "card-title"},
-                ui.tags.i({"class": "fas fa-history icon"}),
-                "Histórico de Veículos"
+            # Exportação e importação do histórico
+            ui.div(
+                {"class": "card"},
+                ui.h3(
+                    {"class": "card-title"},
+                    ui.tags.i({"class": "fas fa-file-export icon"}),
+                    "Exportar / Importar Histórico"
+                ),
+                ui.input_date_range("exportar_periodo", "Período da exportação:", format="dd/mm/yyyy", language="pt-BR"),
+                ui.div(
+                    {"style": "display: flex; gap: 15px; margin-bottom: 20px;"},
+                    ui.download_button("exportar_csv", "Exportar CSV", class_="btn-primary"),
+                    # Sem o pyarrow o botão fica desabilitado em vez de baixar um arquivo vazio
+                    ui.download_button("exportar_parquet", "Exportar Parquet", class_="btn-primary")
+                    if parquet_available() else
+                    ui.tags.button(
+                        "Exportar Parquet", class_="btn btn-primary", disabled=True,
+                        title="A exportação em Parquet precisa do pacote pyarrow (pip install pyarrow)",
+                    )
+                ),
+                ui.input_file("importar_historico", "Importar histórico (CSV ou Parquet)", accept=[".csv", ".parquet"])
             ),
-            ui.input_slider("historico_dias", "Mostrar últimos dias:", min=1, max=30, value=7),
-            ui.output_table("tabela_historico")
-        )
+        
+            # Painel de métricas para administradores
+            *([ui.div(
+                {"class": "card"},
+                ui.h3({"class": "card-title"}, ui.tags.i({"class": "fas fa-tachometer-alt icon"}), "Métricas"),
+                ui.p("Tempo gasto por efeito/render neste processo (Prometheus em /metrics)"),
+                ui.output_table("tabela_metricas")
+            )] if PAINEL_ADMIN else [])
+        ),
+    
+        # Handler do mapa no fim da página: registrado antes de o Shiny conectar
+        ui.tags.script(MAPA_JS)
     )
-)
+
+
+# Estado de cada unidade, compartilhado por todas as sessões dela. O estado é
+# mutado no lugar; um único valor reativo por unidade avisa todas as sessões
+# de uma vez, em vez de cada sessão guardar sua própria cópia
+if ARQUIVO_LOTES:
+    SHARDS = ShardRegistry(load_lots_config(ARQUIVO_LOTES, LOTES_DESTE_PROCESSO))
+else:
+    SHARDS = ShardRegistry([{
+        "id": "principal", "nome": "Principal", "zonas": ZONAS, "tarifa": TARIFA, "banco": BANCO_DADOS,
+        "permanencia_maxima_horas": PERMANENCIA_MAXIMA_HORAS,
+    }])
+for _shard in SHARDS:
+    # Grava o que ainda estiver na fila antes do processo terminar
+    atexit.register(_shard.close)
+
+# Um único relógio por processo: cada saída assina a resolução de que precisa
+RELOGIO = ClockBroadcaster()
+tick_cotacao = RELOGIO.every(INTERVALO_COTACAO)
+tick_relogio = RELOGIO.every(INTERVALO_RELOGIO)
+
+# Métricas do processo: duração de cada efeito/render, eventos e sessões
+METRICAS = MetricsRegistry()
+SESSOES = set()
+METRICAS.gauge("sessoes_ativas", "Sessões conectadas", lambda: len(SESSOES))
+for _shard in SHARDS:
+    _shard.lot.subscribe(
+        lambda evento, lote=_shard.id: METRICAS.inc("eventos_total", "Eventos aplicados ao pátio", tipo=evento.tipo, lote=lote)
+    )
+    METRICAS.gauge("veiculos_ativos", "Veículos no pátio", lambda lot=_shard.lot: lot.kpis.ativos, lote=_shard.id)
+    METRICAS.gauge("fila_eventos", "Eventos das cancelas aguardando na fila", _shard.gates.pending, lote=_shard.id)
 
 def server(input, output, session):
-    # Dados reativos
-    veiculos = reactive.Value(create_empty_df())
-    historico = reactive.Value(create_empty_history_df())
-    faturamento_dia = reactive.Value(0.0)
+    # Unidade da sessão, pelo caminho (/lotes/<id>/) ou por ?lote=<id>
+    with reactive.isolate():
+        shard = SHARDS.resolve(session.clientdata.url_pathname(), session.clientdata.url_search())
+    if shard is None:
+        return
     
-    # Atualizar hora atual (com invalidação controlada)
-    @reactive.Effect
-    def update_time():
-        reactive.invalidate_later(1)
-        ui.update_text("current_time", value=datetime.now().strftime("%d/%m/%Y %H:%M:%S"))
+    # Dados compartilhados
+    LOT = shard.lot
+    versao_lote = shard.versao
+    vagas = LOT.vagas
+    RELOGIO.start()
+    shard.alerts.start()
+    
+    SESSOES.add(session.id)
+    METRICAS.inc("sessoes_total", "Sessões abertas desde a partida")
+    session.on_ended(lambda: SESSOES.discard(session.id))
+    
+    # Atualizar as escolhas do select input: só as melhores placas da busca
+    # vão para o cliente, e só quando a lista muda
+    escolhas_atuais = [None]
     
-    # Atualizar as escolhas do select input
     @reactive.Effect
+    @METRICAS.timed
     def update_select():
-        df = veiculos.get()
-        choices = df["Placa"].tolist() if not df.empty else []
-        ui.update_select("veiculo_selecionado", choices=choices)
+        versao_lote.get()
+        choices = {}
+        consulta = input.busca_placa()
+        with LOT.locked():
+            resultados = LOT.placas.search(consulta)
+        for placa, saida in resultados:
+            choices[placa] = placa if saida is None else f"{placa} (saiu em {saida:%d/%m/%Y %H:%M})"
+        if choices == escolhas_atuais[0]:
+            return
+        escolhas_atuais[0] = choices
+        with reactive.isolate():
+            selecionado = input.veiculo_selecionado()
+        ui.update_select(
+            "veiculo_selecionado",
+            choices=choices,
+            selected=selecionado if selecionado in choices else None
+        )
     
-    # Renderizar slots de estacionamento (substitui o update_html)
-    @output
-    @render.ui
-    def parking_slots_ui():
-        df = veiculos.get()
-        ocupadas = df["Placa"].tolist() if not df.empty else []
-        
-        slots = []
-        for i in range(VAGAS_TOTAIS):
-            slot_style = f"background-color: {COLORS['danger']}; color: white;" if i < len(ocupadas) else f"background-color: {COLORS['success']}; color: white;"
-            slots.append(ui.div(str(i+1), {"class": "parking-slot", "style": slot_style}))
-        
-        return ui.div({"class": "parking-grid"}, *slots)
+    # Sincroniza o mapa de vagas: mapa inteiro na primeira vez (ou se o
+    # cliente ficou para trás demais) e depois só as vagas que mudaram
+    versao_mapa = [None]
+    
+    @reactive.Effect
+    @METRICAS.timed
+    async def sync_parking_map():
+        versao_lote.get()
+        versao, mudancas = LOT.slot_changes_since(versao_mapa[0])
+        if mudancas is None:
+            mensagem = {"completo": True, "mudancas": [[r.vaga, r.placa] for r in vagas]}
+        elif mudancas:
+            mensagem = {"completo": False, "mudancas": mudancas}
+        else:
+            return
+        versao_mapa[0] = versao
+        await session.send_custom_message("vagas", mensagem)
     
     # Info do veículo selecionado
     @output
     @render.ui
+    @METRICAS.timed
     def veiculo_info():
         placa = input.veiculo_selecionado()
-        if placa:
-            df = veiculos.get()
-            veiculo = df[df["Placa"] == placa].iloc[0]
+        versao_lote.get()
+        veiculo = vagas.get(placa) if placa else None
+        if veiculo:
             return ui.div(
-                ui.p(f"Proprietário: {veiculo['Nome']}"),
-                ui.p(f"Modelo: {veiculo['Modelo']}"),
-                ui.p(f"Cor: {veiculo['Cor']}"),
-                ui.p(f"Tipo: {veiculo['Tipo']}"),
-                ui.p(f"Entrada: {veiculo['Entrada'].strftime('%d/%m/%Y %H:%M:%S')}"),
+                ui.p(f"Vaga: {veiculo.vaga}"),
+                ui.p(f"Proprietário: {veiculo.nome}"),
+                ui.p(f"Modelo: {veiculo.modelo}"),
+                ui.p(f"Cor: {veiculo.cor}"),
+                ui.p(f"Tipo: {veiculo.tipo}"),
+                ui.p(f"Entrada: {veiculo.entrada.strftime('%d/%m/%Y %H:%M:%S')}"),
                 class_="mb-3"
             )
+        if placa:
+            return ui.p("Veículo fora do estacionamento", class_="mb-3")
         return ""
     
     # Adicionar veículo
     @reactive.Effect
     @reactive.event(input.adicionar)
+    @METRICAS.timed
     def add_vehicle():
         nome = input.nome()
         modelo = input.modelo()
@@ -480,212 +757,549 @@ def server(input, output, session):
         tipo = input.tipo()
         
         if nome and modelo and placa:
-            # Verifica se já existe um veículo com a mesma placa
-            df = veiculos.get()
-            if not df.empty and placa in df["Placa"].values:
-                ui.notification_show("Já existe um veículo com esta placa!", duration=3, type="error")
-                return
-            
-            if len(df) >= VAGAS_TOTAIS:
-                ui.notification_show("Estacionamento lotado!", duration=3, type="warning")
+            # O estado recusa placas duplicadas e entradas com o pátio lotado
+            try:
+                registro = LOT.check_in(nome, modelo, placa, cor, tipo)
+            except LotError as e:
+                ui.notification_show(str(e), duration=3, type="error")
                 return
             
-            novo_veiculo = pd.DataFrame({
-                "Nome": [nome],
-                "Modelo": [modelo],
-                "Placa": [placa],
-                "Cor": [cor],
-                "Tipo": [tipo],
-                "Entrada": [datetime.now()]
-            })
-            
-            # Atualiza o DataFrame de veículos
-            if df.empty:
-                df = create_empty_df()
-            df = pd.concat([df, novo_veiculo], ignore_index=True)
-            veiculos.set(df)
-            
             # Limpa os inputs
             ui.update_text("nome", value="")
             ui.update_text("modelo", value="")
             ui.update_text("placa", value="")
             
-            ui.notification_show("Veículo adicionado com sucesso!", duration=3, type="message")
+            ui.notification_show(f"Veículo adicionado na vaga {registro.vaga}!", duration=3, type="message")
     
     # Remover veículo
     @reactive.Effect
     @reactive.event(input.remover)
+    @METRICAS.timed
     def remove_vehicle():
         placa = input.veiculo_selecionado()
         if placa:
-            df_veiculos = veiculos.get()
-            df_historico = historico.get()
-            
-            # Encontra o veículo a ser removido
-            veiculo = df_veiculos[df_veiculos["Placa"] == placa].iloc[0]
-            
-            # Calcula o valor a pagar
-            entrada = veiculo["Entrada"]
-            saida = datetime.now()
-            horas = (saida - entrada).total_seconds() / 3600
-            valor = round(horas * TAXA_POR_HORA, 2)
-            
-            # Adiciona ao histórico
-            novo_registro = pd.DataFrame({
-                "Nome": [veiculo["Nome"]],
-                "Modelo": [veiculo["Modelo"]],
-                "Placa": [veiculo["Placa"]],
-                "Cor": [veiculo["Cor"]],
-                "Tipo": [veiculo["Tipo"]],
-                "Entrada": [entrada],
-                "Saida": [saida],
-                "Valor": [valor],
-                "Tempo": [horas]
-            })
+            # Libera a vaga, calcula o valor e registra no histórico
+            try:
+                saida = LOT.check_out(placa, operador=input.operador().strip() or None)
+            except LotError as e:
+                ui.notification_show(str(e), duration=3, type="error")
+                return
             
-            if df_historico.empty:
-                df_historico = create_empty_history_df()
-            df_historico = pd.concat([df_historico, novo_registro], ignore_index=True)
-            historico.set(df_historico)
+            ui.notification_show(f"Veículo removido. Valor: R$ {saida.valor:.2f}", duration=5, type="message")
+    
+    # Reservas
+    def periodo_reserva():
+        # (início, fim) escolhidos no formulário; None sem data
+        data = input.reserva_data()
+        if data is None:
+            return None
+        inicio = datetime.combine(data, datetime.strptime(input.reserva_hora(), "%H:%M").time())
+        return inicio, inicio + timedelta(hours=int(input.reserva_duracao()))
+    
+    @reactive.Effect
+    @reactive.event(input.reservar)
+    @METRICAS.timed
+    def make_reservation():
+        nome = input.reserva_nome()
+        placa = input.reserva_placa()
+        periodo = periodo_reserva()
+        
+        if nome and placa and periodo:
+            # O estado recusa períodos sem vaga e placas com outra reserva no período
+            try:
+                reserva = LOT.reserve(nome, placa, input.reserva_zona(), *periodo)
+            except LotError as e:
+                ui.notification_show(str(e), duration=3, type="error")
+                return
             
-            # Atualiza o faturamento do dia
-            faturamento_dia.set(faturamento_dia.get() + valor)
+            ui.update_text("reserva_nome", value="")
+            ui.update_text("reserva_placa", value="")
+            ui.notification_show(
+                f"Reserva {reserva.codigo} confirmada: {reserva.inicio:%d/%m %H:%M} a {reserva.fim:%d/%m %H:%M}",
+                duration=5, type="message"
+            )
+    
+    @reactive.Effect
+    @reactive.event(input.cancelar_reserva)
+    @METRICAS.timed
+    def cancel_reservation():
+        codigo = input.reserva_codigo().strip().upper()
+        if codigo:
+            try:
+                LOT.cancel_reservation(codigo)
+            except LotError as e:
+                ui.notification_show(str(e), duration=3, type="error")
+                return
+            ui.update_text("reserva_codigo", value="")
+            ui.notification_show(f"Reserva {codigo} cancelada", duration=3, type="message")
+    
+    @output
+    @render.text
+    @METRICAS.timed
+    def reserva_disponibilidade():
+        versao_lote.get()
+        tick_relogio.get()
+        agora = datetime.now()
+        pico = LOT.reserved_peak(agora, agora + timedelta(hours=HORAS_PICO_RESERVADO))
+        linhas = [f"Pico reservado nas próximas {HORAS_PICO_RESERVADO} h: {pico} de {LOT.capacidade} vagas"]
+        periodo = periodo_reserva()
+        if periodo:
+            livres = LOT.reservation_capacity(input.reserva_zona(), *periodo, agora)
+            linhas.insert(0, f"Reservas disponíveis no período: {livres}")
+        return "\n".join(linhas)
+    
+    @output
+    @render.table
+    @METRICAS.timed
+    def tabela_reservas():
+        versao_lote.get()
+        # O relógio tira da lista as reservas que expiraram sem chegada
+        tick_relogio.get()
+        reservas = LOT.reservations(limite=RESERVAS_NA_TABELA)
+        return pd.DataFrame(
+            [(r.codigo, r.placa, r.nome, r.zona, f"{r.inicio:%d/%m/%Y %H:%M}", f"{r.fim:%d/%m/%Y %H:%M}")
+             for r in reservas],
+            columns=["Código", "Placa", "Nome", "Zona", "Início", "Fim"],
+        )
+    
+    # Ocupação num momento: snapshot mais próximo + eventos até o momento
+    @reactive.Calc
+    @reactive.event(input.consultar_momento)
+    @METRICAS.timed
+    def ocupacao_momento():
+        data, hora = input.momento_data(), input.momento_hora().strip()
+        if data is None:
+            return None, "Escolha uma data"
+        try:
+            momento = datetime.combine(data, datetime.strptime(hora, "%H:%M:%S" if hora.count(":") == 2 else "%H:%M").time())
+        except ValueError:
+            return None, "Hora inválida: use HH:MM ou HH:MM:SS"
+        try:
+            base, registros = LOT.state_at(momento)
+        except LotError as e:
+            return None, str(e)
+        return registros, f"{len(registros)} veículo(s) em {momento:%d/%m/%Y %H:%M:%S} (snapshot de {base:%d/%m/%Y %H:%M:%S})"
+    
+    @output
+    @render.text
+    @METRICAS.timed
+    def momento_info():
+        return ocupacao_momento()[1]
+    
+    @output
+    @render.table
+    @METRICAS.timed
+    def tabela_momento():
+        registros, _ = ocupacao_momento()
+        if not registros:
+            return None
+        return pd.DataFrame(
+            [(r.vaga, r.placa, r.nome, r.modelo, r.cor, r.tipo, f"{r.entrada:%d/%m/%Y %H:%M:%S}") for r in registros],
+            columns=["Vaga", "Placa", "Nome", "Modelo", "Cor", "Tipo", "Entrada"],
+        )
+    
+    # Alertas de prazo da unidade: só os que vencerem depois que a sessão abriu
+    alerta_visto = [shard.alerts.seq]
+    
+    @reactive.Effect
+    @METRICAS.timed
+    def notificar_alertas():
+        novos = [a for a in shard.alertas.get() if a.seq > alerta_visto[0]]
+        if not novos:
+            return
+        alerta_visto[0] = novos[-1].seq
+        for alerta in novos[:NOTIFICACOES_POR_LOTE]:
+            ui.notification_show(alerta.mensagem, duration=10, type=NOTIFICACOES[alerta.tipo])
+        if len(novos) > NOTIFICACOES_POR_LOTE:
+            ui.notification_show(f"Mais {len(novos) - NOTIFICACOES_POR_LOTE} alerta(s) de prazo", duration=10, type="warning")
+    
+    # Relatórios: os trechos do período são agregados no pool de processos;
+    # esta sessão e as outras continuam respondendo enquanto isso
+    @ui.bind_task_button(button_id="gerar_relatorio")
+    @reactive.extended_task
+    @METRICAS.timed
+    async def tarefa_relatorio(tipo, inicio, fim):
+        with ui.Progress(min=0, max=1, session=session) as barra:
+            barra.set(0, message="Gerando relatório...")
             
-            # Remove do DataFrame de veículos ativos
-            df_veiculos = df_veiculos[df_veiculos["Placa"] != placa]
-            veiculos.set(df_veiculos)
+            def progresso(feitos, total):
+                barra.set(feitos / total, message="Gerando relatório...", detail=f"{feitos} de {total} dia(s)")
             
-            ui.notification_show(f"Veículo removido. Valor: R$ {valor:.2f}", duration=5, type="message")
+            return await shard.reports.build(tipo, inicio, fim, progresso)
+    
+    @reactive.Effect
+    @reactive.event(input.gerar_relatorio)
+    @METRICAS.timed
+    def gerar_relatorio():
+        data = input.relatorio_data()
+        if data is None:
+            ui.notification_show("Escolha uma data", duration=3, type="error")
+            return
+        try:
+            inicio, fim = report_period(input.relatorio_tipo(), data, input.relatorio_turno())
+        except LotError as e:
+            ui.notification_show(str(e), duration=3, type="error")
+            return
+        tarefa_relatorio(input.relatorio_tipo(), inicio, fim)
+    
+    @output
+    @render.ui
+    @METRICAS.timed
+    def relatorio_resumo():
+        relatorio = tarefa_relatorio.result()
+        fim = relatorio.fim - timedelta(seconds=1)
+        linhas = [
+            f"{PERIODOS[relatorio.tipo]}: {relatorio.inicio:%d/%m/%Y %H:%M} a {fim:%d/%m/%Y %H:%M}",
+            f"Saídas: {relatorio.totais['saidas']} | Receita: R$ {relatorio.totais['receita']:.2f} | "
+            f"Ticket médio: R$ {relatorio.ticket_medio:.2f} | Permanência média: {relatorio.permanencia_media:.1f} h",
+        ]
+        if relatorio.pico_em is not None:
+            linhas.append(f"Pico de ocupação: {relatorio.pico} vagas ({relatorio.pico_em:%d/%m/%Y %H:%M})")
+        linhas.append(f"{relatorio.em_cache} de {relatorio.trechos} dia(s) vieram do cache")
+        return ui.div({"class": "value-card"}, *[ui.p(linha) for linha in linhas])
+    
+    @output
+    @render.table
+    @METRICAS.timed
+    def relatorio_tipos():
+        df = tarefa_relatorio.result().revenue_by_type()
+        df["Receita"] = [f"R$ {x:.2f}" for x in df["Receita"]]
+        return df
+    
+    @output
+    @render.table
+    @METRICAS.timed
+    def relatorio_permanencia():
+        df = tarefa_relatorio.result().dwell_times()
+        df["%"] = [f"{x:.1f}%" for x in df["%"]]
+        return df
+    
+    @output
+    @render.table
+    @METRICAS.timed
+    def relatorio_operadores():
+        df = tarefa_relatorio.result().operators()
+        df["Receita"] = [f"R$ {x:.2f}" for x in df["Receita"]]
+        return df
     
     # Outputs
+    # Snapshot O(1) dos contadores; reavaliado a cada evento e na virada do dia
+    @reactive.Calc
+    @METRICAS.timed
+    def kpis():
+        versao_lote.get()
+        agora = datetime.now()
+        amanha = (agora + pd.Timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        reactive.invalidate_later((amanha - agora).total_seconds())
+        with LOT.locked():
+            return LOT.kpis.snapshot(agora)
+    
     @output
     @render.text
+    @METRICAS.timed
     def contador_ativos():
-        return str(len(veiculos.get()))
+        return str(kpis().ativos)
     
     @output
     @render.text
+    @METRICAS.timed
     def faturamento_hoje():
-        return f"R$ {faturamento_dia.get():.2f}"
+        return f"R$ {kpis().receita_dia:.2f}"
     
     @output
     @render.text
+    @METRICAS.timed
     def media_veiculo():
-        total = faturamento_dia.get()
-        count = len(historico.get())
-        if count > 0:
-            return f"R$ {total/count:.2f}"
-        return "R$ 0.00"
+        # Ticket médio do dia: receita de hoje dividida pelas saídas de hoje
+        return f"R$ {kpis().ticket_medio:.2f}"
     
     @output
     @render.text
+    @METRICAS.timed
     def vagas_disponiveis():
-        return f"{VAGAS_TOTAIS - len(veiculos.get())}/{VAGAS_TOTAIS}"
+        snapshot = kpis()
+        return f"{snapshot.livres}/{snapshot.capacidade}"
     
     @output
     @render.text
+    @METRICAS.timed
     def current_time():
-        return datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        tick_relogio.get()
+        return datetime.now().strftime("%d/%m/%Y %H:%M")
     
     @output
     @render.text
+    @METRICAS.timed
     def valor_pagar():
         placa = input.veiculo_selecionado()
-        if placa:
-            df = veiculos.get()
-            veiculo = df[df["Placa"] == placa].iloc[0]
-            entrada = veiculo["Entrada"]
-            saida = datetime.now()
-            horas = (saida - entrada).total_seconds() / 3600
-            valor = round(horas * TAXA_POR_HORA, 2)
-            return f"Valor a pagar para {veiculo['Nome']}:\nR$ {valor:.2f}\nTempo: {horas:.1f} horas\nModelo: {veiculo['Modelo']}\nCor: {veiculo['Cor']}"
+        versao_lote.get()
+        tick_cotacao.get()
+        veiculo = vagas.get(placa) if placa else None
+        if veiculo:
+            valor, horas = LOT.quote(veiculo, datetime.now())
+            return f"Valor a pagar para {veiculo.nome}:\nR$ {valor:.2f}\nTempo: {horas:.1f} horas\nModelo: {veiculo.modelo}\nCor: {veiculo.cor}"
         return "Selecione um veículo para calcular o valor"
     
+    # Tabelas pesadas fora do loop de eventos: o efeito pede o cálculo ao
+    # pool de threads e o cliente mantém a tabela anterior até a nova chegar
+    veiculos_tabela = OffloadedOutput("tabela_veiculos")
+    session.on_ended(veiculos_tabela.close)
+    
+    @reactive.Effect
+    @METRICAS.timed
+    def pedir_tabela_veiculos():
+        versao_lote.get()
+        veiculos_tabela.request(None, vehicles_table_html, LOT)
+    
     @output
-    @render.table
+    @render.ui
+    @METRICAS.timed
     def tabela_veiculos():
-        df = veiculos.get().copy()
-        if not df.empty:
-            df["Entrada"] = df["Entrada"].dt.strftime("%d/%m/%Y %H:%M:%S")
-            df = df.sort_values("Entrada", ascending=False)
-        return df
+        return ui.HTML(veiculos_tabela.result())
+    
+    # Paginação do histórico: só as linhas da página são lidas e formatadas;
+    # dias fora da janela recente vêm do disco só se a página chegar neles
+    pagina_historico = reactive.Value(0, name="pagina_historico")
+    historico_tabela = OffloadedOutput("tabela_historico")
+    session.on_ended(historico_tabela.close)
+    
+    @reactive.Effect
+    @METRICAS.timed
+    def pedir_tabela_historico():
+        versao_lote.get()
+        # Mudou o filtro ou a página: o resultado de um pedido anterior é descartado
+        chave = (input.historico_dias(), int(input.historico_por_pagina()), pagina_historico.get())
+        historico_tabela.request(chave, history_page_html, LOT, *chave)
+    
+    @reactive.Effect
+    @reactive.event(input.historico_dias, input.historico_por_pagina)
+    @METRICAS.timed
+    def reset_pagina_historico():
+        pagina_historico.set(0)
+    
+    @reactive.Effect
+    @reactive.event(input.historico_anterior)
+    @METRICAS.timed
+    def pagina_historico_anterior():
+        pagina_historico.set(max(0, pagina_historico.get() - 1))
+    
+    @reactive.Effect
+    @reactive.event(input.historico_proxima)
+    @METRICAS.timed
+    def pagina_historico_proxima():
+        _, paginas, _, _ = historico_tabela.result()
+        pagina_historico.set(min(paginas - 1, pagina_historico.get() + 1))
     
     @output
-    @render.table
+    @render.text
+    @METRICAS.timed
+    def historico_pagina_info():
+        pagina, paginas, total, _ = historico_tabela.result()
+        return f"Página {pagina + 1} de {paginas} ({total} registros)"
+    
+    @output
+    @render.ui
+    @METRICAS.timed
     def tabela_historico():
-        df = historico.get().copy()
-        if not df.empty:
-            # Filtrar pelos últimos dias selecionados
-            dias = input.historico_dias()
-            data_limite = datetime.now() - pd.Timedelta(days=dias)
-            df = df[df["Saida"] >= data_limite]
-            
-            df["Entrada"] = df["Entrada"].dt.strftime("%d/%m/%Y %H:%M:%S")
-            df["Saida"] = df["Saida"].dt.strftime("%d/%m/%Y %H:%M:%S")
-            df["Valor"] = df["Valor"].apply(lambda x: f"R$ {x:.2f}")
-            df["Tempo"] = df["Tempo"].apply(lambda x: f"{x:.1f} horas")
-            df = df.sort_values("Saida", ascending=False)
-        return df
+        return ui.HTML(historico_tabela.result()[3])
+    
+    # Exportação do histórico em blocos: nunca monta o período inteiro na memória
+    @reactive.Effect
+    @METRICAS.timed
+    def init_exportar_periodo():
+        hoje = datetime.now().date()
+        with reactive.isolate():
+            ui.update_date_range("exportar_periodo", start=hoje.replace(day=1), end=hoje)
+    
+    def periodo_exportacao():
+        inicio, fim = input.exportar_periodo()
+        return pd.Timestamp(inicio), pd.Timestamp(fim) + pd.Timedelta(days=1)
+    
+    @render.download(filename=lambda: "historico_{0:%Y%m%d}_{1:%Y%m%d}.csv".format(*input.exportar_periodo()))
+    def exportar_csv():
+        inicio, fim = periodo_exportacao()
+        yield from iter_history_csv(LOT.historico, inicio, fim)
     
+    @render.download(filename=lambda: "historico_{0:%Y%m%d}_{1:%Y%m%d}.parquet".format(*input.exportar_periodo()))
+    def exportar_parquet():
+        inicio, fim = periodo_exportacao()
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, "historico.parquet")
+            try:
+                write_history_parquet(LOT.historico, caminho, inicio, fim)
+            except RuntimeError as e:
+                # Sem pyarrow: o erro aborta o download, nunca um .parquet vazio
+                ui.notification_show(str(e), duration=5, type="error")
+                raise
+            with open(caminho, "rb") as arquivo:
+                while bloco := arquivo.read(1 << 20):
+                    yield bloco
+    
+    @reactive.Effect
+    @reactive.event(input.importar_historico)
+    @METRICAS.timed
+    async def importar_historico():
+        arquivos = input.importar_historico()
+        if not arquivos:
+            return
+        caminho = arquivos[0]["datapath"]
+        try:
+            # Primeira passada numa thread: o arquivo inteiro é validado, bloco
+            # a bloco, antes de qualquer gravação
+            total = await asyncio.to_thread(validate_history_file, caminho)
+        except (ValueError, RuntimeError) as e:
+            ui.notification_show(f"Erro na importação (nenhum registro importado): {e}", duration=8, type="error")
+            return
+        if total:
+            def aplicar():
+                # Segunda passada, também fora do loop: cada bloco é gravado e
+                # somado aos índices e depois descartado
+                for bloco in iter_history_file(caminho):
+                    LOT.import_history(bloco)
+            try:
+                await asyncio.to_thread(aplicar)
+            finally:
+                LOT.history_imported()
+        ui.notification_show(f"{total} registros importados para o histórico", duration=5, type="message")
+    
+    # Os gráficos são criados uma vez por sessão e depois só têm os dados
+    # trocados no lugar; o cliente recebe apenas o patch dos arrays
     @output
-    @render_widget
+    @shinywidgets.render_widget
+    @METRICAS.timed
     def grafico_ocupacao():
-        count = len(veiculos.get())
+        return create_occupancy_figure(LOT.capacidade)
+    
+    @output
+    @shinywidgets.render_widget
+    @METRICAS.timed
+    def grafico_tipos():
+        return create_types_figure()
+    
+    ultima_atualizacao = [0.0]
+    
+    @reactive.Effect
+    @METRICAS.timed
+    def atualizar_graficos():
+        versao_lote.get()
+        fig_ocupacao = grafico_ocupacao.widget
+        fig_tipos = grafico_tipos.widget
+        if fig_ocupacao is None or fig_tipos is None:
+            return
         
-        fig = px.pie(
-            names=["Ocupado", "Vago"],
-            values=[count, max(0, VAGAS_TOTAIS - count)],
-            title="Ocupação do Estacionamento",
-            color_discrete_sequence=[COLORS["primary"], COLORS["dark"]],
-            hole=0.4
-        )
+        # Junta rajadas de eventos em no máximo uma atualização por intervalo
+        espera = ultima_atualizacao[0] + INTERVALO_GRAFICOS - time.monotonic()
+        if espera > 0:
+            reactive.invalidate_later(espera)
+            return
+        ultima_atualizacao[0] = time.monotonic()
         
-        fig.update_layout(
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="rgba(0,0,0,0)",
-            font_color=COLORS["light"],
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1
-            )
-        )
+        with LOT.locked():
+            snapshot = LOT.kpis.snapshot()
+        with fig_ocupacao.batch_update():
+            fig_ocupacao.data[0].values = [snapshot.ativos, snapshot.livres]
         
-        return fig
+        tipos = TIPOS_VEICULO + [t for t in snapshot.por_tipo if t not in TIPOS_VEICULO]
+        with fig_tipos.batch_update():
+            fig_tipos.data[0].x = tipos
+            fig_tipos.data[0].y = [snapshot.por_tipo.get(t, 0) for t in tipos]
+            fig_tipos.layout.annotations[0].visible = snapshot.ativos == 0
     
+    # Tendências: leem só os totais pré-agregados por intervalo (LOT.series)
     @output
-    @render_widget
-    def grafico_tipos():
-        df = veiculos.get()
-        if not df.empty:
-            tipos = df["Tipo"].value_counts().reset_index()
-            tipos.columns = ["Tipo", "Quantidade"]
-            
-            fig = px.bar(
-                tipos,
-                x="Tipo",
-                y="Quantidade",
-                title="Distribuição por Tipo de Veículo",
-                color="Tipo",
-                color_discrete_sequence=[COLORS["primary"], COLORS["secondary"], COLORS["accent"], COLORS["success"]]
-            )
-        else:
-            fig = go.Figure()
-            fig.add_annotation(text="Nenhum veículo no estacionamento",
-                             xref="paper", yref="paper",
-                             x=0.5, y=0.5, showarrow=False)
+    @shinywidgets.render_widget
+    @METRICAS.timed
+    def grafico_tendencia():
+        return create_trend_figure(LOT.capacidade)
+    
+    @output
+    @shinywidgets.render_widget
+    @METRICAS.timed
+    def grafico_receita():
+        return create_revenue_figure()
+    
+    @output
+    @shinywidgets.render_widget
+    @METRICAS.timed
+    def grafico_pico():
+        return create_peak_figure()
+    
+    ultima_tendencia = [0.0]
+    
+    @reactive.Effect
+    @METRICAS.timed
+    def atualizar_tendencias():
+        versao_lote.get()
+        tick_relogio.get()
+        granularidade = input.tendencia_granularidade()
+        fig_tendencia = grafico_tendencia.widget
+        fig_receita = grafico_receita.widget
+        fig_pico = grafico_pico.widget
+        if fig_tendencia is None or fig_receita is None or fig_pico is None:
+            return
         
-        fig.update_layout(
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="rgba(0,0,0,0)",
-            font_color=COLORS["light"],
-            xaxis_title="",
-            yaxis_title="Quantidade",
-            showlegend=False
-        )
+        espera = ultima_tendencia[0] + INTERVALO_GRAFICOS - time.monotonic()
+        if espera > 0:
+            reactive.invalidate_later(espera)
+            return
+        ultima_tendencia[0] = time.monotonic()
         
-        return fig
+        agora = datetime.now()
+        inicio = agora - pd.Timedelta(days=TENDENCIAS[granularidade][1])
+        # A importação de histórico soma às séries numa thread, com o lock
+        with LOT.locked():
+            serie = LOT.series.series(granularidade, inicio, agora)
+            receita = LOT.series.revenue_by_type(granularidade, inicio, agora)
+            pico = LOT.series.peak_hours(DIAS_PICO, agora)
+        with fig_tendencia.batch_update():
+            fig_tendencia.data[0].x = serie["Inicio"]
+            fig_tendencia.data[0].y = serie["Chegadas"]
+            fig_tendencia.data[1].x = serie["Inicio"]
+            fig_tendencia.data[1].y = serie["Saidas"]
+            fig_tendencia.data[2].x = serie["Inicio"]
+            fig_tendencia.data[2].y = serie["Ocupacao"]
+            fig_tendencia.layout.yaxis2.range = [0, LOT.capacidade]
+        
+        outros = [t for t in receita.columns if t not in TIPOS_VEICULO]
+        with fig_receita.batch_update():
+            for trace in fig_receita.data:
+                valores = receita[trace.name] if trace.name in receita else pd.Series(0.0, index=receita.index)
+                if trace.name == "Outro" and outros:
+                    valores = valores + receita[outros].sum(axis=1)
+                trace.x = receita.index
+                trace.y = valores
+        
+        with fig_pico.batch_update():
+            fig_pico.data[0].z = pico["Chegadas"].to_numpy().reshape(7, 24)
+
+    # Painel de métricas (só existe na página com PARKING_ADMIN=1)
+    @output
+    @render.table
+    def tabela_metricas():
+        tick_cotacao.get()
+        return pd.DataFrame(
+            METRICAS.summary(),
+            columns=["Função", "Chamadas", "Média (ms)", "p50 (ms)", "p99 (ms)", "Máx (ms)"]
+        ).sort_values("Média (ms)", ascending=False)
+
+shiny_app = App(app_ui, server, static_assets=os.path.join(os.path.dirname(os.path.abspath(__file__)), "www"))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Com PARKING_PREAQUECER=1 os módulos pesados são importados em segundo
+    # plano logo depois que o worker sobe (antes do primeiro usuário)
+    if PREAQUECER:
+        preload([pd, go, shinywidgets])
+    # Os alertas de prazo correm mesmo sem nenhuma sessão aberta (API /alertas)
+    for shard in SHARDS:
+        shard.alerts.start()
+    yield
+    POOL.shutdown()
+
 
-app = App(app_ui, server)	
\ No newline at end of file
+# API de ingestão das cancelas/câmeras e KPIs das unidades montados ao lado do app Shiny
+app = Starlette(routes=[
+    *METRICAS.routes(),
+    *SHARDS.routes(WebSocketMeter(shiny_app, METRICAS)),
+], lifespan=lifespan)	
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""Benchmarks do motor do estacionamento (pátio, cobrança e histórico).
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.run
+    python -m benchmarks.run --vagas 50 500 10000 --linhas 1000 100000 1000000 10000000
+    python -m benchmarks.run --json resultados.json
+    python -m benchmarks.run --base resultados.json --tolerancia 0.2
+
+Com --base, o processo termina com código 1 se algum cenário ficar mais
+lento (eventos/s ou p99) que a base além da tolerância.
+"""
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.traffic import generate_trace, history_frame
+from history import HistoryStore
+from lot import LotState
+from occupancy import LotError
+from storage import SQLiteStorage
+from tariff import TariffRule, TariffTable
+
+TARIFA = TariffTable(
+    TariffRule(primeira_hora=5.00, hora=5.00),
+    {"Moto": TariffRule(primeira_hora=3.00, hora=2.00, fracao_minutos=15, teto_diario=30.00)},
+)
+
+# A cada quantos eventos o replay também mede uma cotação, os KPIs e uma busca de placa
+AMOSTRA_LEITURAS = 10
+# Repetições das consultas ao histórico
+CONSULTAS = 2000
+
+
+class Latencias:
+    # Tempos (ns) por operação
+    def __init__(self):
+        self.tempos = {}
+
+    def medir(self, operacao, funcao, *args, **kwargs):
+        inicio = time.perf_counter_ns()
+        resultado = funcao(*args, **kwargs)
+        self.tempos.setdefault(operacao, []).append(time.perf_counter_ns() - inicio)
+        return resultado
+
+    def resumo(self):
+        return {
+            operacao: {
+                "n": len(tempos),
+                "p50_us": float(np.percentile(tempos, 50)) / 1000,
+                "p99_us": float(np.percentile(tempos, 99)) / 1000,
+            }
+            for operacao, tempos in self.tempos.items()
+        }
+
+
+def replay(lot, eventos, latencias=None):
+    # Aplica o tráfego ao pátio; chegadas com o pátio cheio são recusadas e a
+    # saída correspondente é ignorada
+    rng = random.Random(0)
+    ativas = []
+    posicao = {}
+    recusadas = 0
+    for n, (momento, evento, placa, tipo, cor) in enumerate(eventos):
+        if evento == "entrada":
+            try:
+                if latencias is None:
+                    lot.check_in("Cliente", "Modelo", placa, cor, tipo, momento)
+                else:
+                    latencias.medir("check_in", lot.check_in, "Cliente", "Modelo", placa, cor, tipo, momento)
+            except LotError:
+                recusadas += 1
+                continue
+            posicao[placa] = len(ativas)
+            ativas.append(placa)
+        elif placa in posicao:
+            if latencias is None:
+                lot.check_out(placa, momento)
+            else:
+                latencias.medir("check_out", lot.check_out, placa, momento)
+            # Remove da lista de ativas em O(1) trocando com a última
+            i = posicao.pop(placa)
+            ultima = ativas.pop()
+            if ultima != placa:
+                ativas[i] = ultima
+                posicao[ultima] = i
+
+        if latencias is not None and n % AMOSTRA_LEITURAS == 0 and ativas:
+            alvo = ativas[rng.randrange(len(ativas))]
+            latencias.medir("quote", lot.quote, lot.vagas.get(alvo), momento)
+            latencias.medir("kpis", lot.kpis.snapshot, momento)
+            latencias.medir("busca_placa", lot.placas.search, alvo[:5])
+    return recusadas
+
+
+def bench_lot(vagas, horas, sqlite=False, memoria=True):
+    eventos = generate_trace(vagas, horas)
+    if not sqlite:
+        return _bench_lot(eventos, vagas, horas, None, memoria)
+    # Os bancos são fechados dentro do bloco, antes de a pasta ser apagada
+    with tempfile.TemporaryDirectory() as pasta:
+        return _bench_lot(eventos, vagas, horas, pasta, memoria)
+
+
+def _bench_lot(eventos, vagas, horas, pasta, memoria):
+    def novo_lot(nome):
+        storage = SQLiteStorage(os.path.join(pasta, nome)) if pasta is not None else None
+        return LotState(vagas, TARIFA, storage), storage
+
+    lot, storage = novo_lot("tempo.db")
+    latencias = Latencias()
+    try:
+        inicio = time.perf_counter()
+        recusadas = replay(lot, eventos, latencias)
+        if storage is not None:
+            storage.flush()
+        duracao = time.perf_counter() - inicio
+    finally:
+        if storage is not None:
+            storage.close()
+
+    resultado = {
+        "cenario": f"patio vagas={vagas} horas={horas}" + (" sqlite" if pasta is not None else ""),
+        "eventos": len(eventos),
+        "recusadas": recusadas,
+        "eventos_s": len(eventos) / duracao,
+        "operacoes": latencias.resumo(),
+    }
+    if memoria:
+        # Segunda passada, sem medir tempo: o tracemalloc deixa tudo mais lento
+        tracemalloc.start()
+        lot, storage = novo_lot("memoria.db")
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            replay(lot, eventos)
+            if storage is not None:
+                storage.flush()
+            atual, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            if storage is not None:
+                storage.close()
+        resultado["memoria_mb"] = (atual - base) / 2 ** 20
+        resultado["memoria_pico_mb"] = (pico - base) / 2 ** 20
+    return resultado
+
+
+def bench_history(linhas, memoria=True):
+    df = history_frame(linhas)
+    historico = HistoryStore()
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    for i in range(0, linhas, 1_000_000):
+        historico.extend(df.iloc[i:i + 1_000_000])
+    carga = time.perf_counter() - inicio
+    resultado = {"cenario": f"historico linhas={linhas}", "linhas_s": linhas / carga}
+    if memoria:
+        atual, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        resultado["memoria_mb"] = atual / 2 ** 20
+        resultado["bytes_por_linha"] = atual / linhas
+    primeira = df["Saida"].iloc[0].to_pydatetime()
+    ultima = df["Saida"].iloc[-1].to_pydatetime()
+    del df
+
+    rng = np.random.default_rng(0)
+    latencias = Latencias()
+    total = (ultima - primeira).total_seconds()
+    for _ in range(CONSULTAS):
+        inicio_janela = primeira + timedelta(seconds=float(rng.uniform(0, total)))
+        i, j = latencias.medir("range", historico.range, inicio_janela, inicio_janela + timedelta(days=7))
+        latencias.medir("pagina_50", historico.rows, max(i, j - 50), j, reverso=True)
+    i, _ = historico.range(ultima - timedelta(days=1))
+    for _ in range(20):
+        latencias.medir("reprecificar_dia", TARIFA.price_history, historico, i, len(historico))
+    saida = ultima
+    for _ in range(CONSULTAS):
+        saida += timedelta(seconds=30)
+        latencias.medir(
+            "append", historico.append,
+            "Cliente", "Modelo", "ABC1D23", "Prata", "Carro", saida - timedelta(hours=2), saida, 10.0, 2.0
+        )
+    resultado["operacoes"] = latencias.resumo()
+    return resultado
+
+
+def print_result(r):
+    extras = []
+    for campo, formato in (("eventos_s", "{:,.0f} eventos/s"), ("linhas_s", "{:,.0f} linhas/s"),
+                           ("recusadas", "{} recusadas"), ("memoria_mb", "{:.1f} MB"),
+                           ("memoria_pico_mb", "pico {:.1f} MB"), ("bytes_por_linha", "{:.0f} B/linha")):
+        if campo in r:
+            extras.append(formato.format(r[campo]))
+    print(f"\n{r['cenario']}: " + ", ".join(extras))
+    for operacao, m in r["operacoes"].items():
+        print(f"  {operacao:<18} n={m['n']:<8} p50={m['p50_us']:>9.1f} us  p99={m['p99_us']:>9.1f} us")
+
+
+def compare(resultados, base, tolerancia):
+    # Regressões: menos eventos/linhas por segundo ou p99 maior que a base além da tolerância
+    anteriores = {r["cenario"]: r for r in base}
+    regressoes = []
+    for r in resultados:
+        antes = anteriores.get(r["cenario"])
+        if antes is None:
+            continue
+        for campo in ("eventos_s", "linhas_s"):
+            if campo in r and r[campo] < antes[campo] * (1 - tolerancia):
+                regressoes.append(f"{r['cenario']}: {campo} {antes[campo]:,.0f} -> {r[campo]:,.0f}")
+        for operacao, m in r["operacoes"].items():
+            anterior = antes["operacoes"].get(operacao)
+            if anterior and m["p99_us"] > anterior["p99_us"] * (1 + tolerancia):
+                regressoes.append(
+                    f"{r['cenario']}: {operacao} p99 {anterior['p99_us']:.1f} -> {m['p99_us']:.1f} us"
+                )
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vagas", type=int, nargs="*", default=[50, 500, 10_000], help="tamanhos de pátio")
+    parser.add_argument("--horas", type=float, default=72, help="duração do tráfego simulado")
+    parser.add_argument("--linhas", type=int, nargs="*", default=[1_000, 100_000, 1_000_000],
+                        help="tamanhos de histórico (ex.: 10000000)")
+    parser.add_argument("--sqlite", action="store_true", help="pátio com persistência em SQLite")
+    parser.add_argument("--sem-memoria", action="store_true", help="não mede memória (mais rápido)")
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    parser.add_argument("--base", help="resultados anteriores para comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"Python {sys.version.split()[0]}, {datetime.now():%Y-%m-%d %H:%M}")
+    resultados = []
+    for vagas in args.vagas:
+        resultados.append(bench_lot(vagas, args.horas, args.sqlite, not args.sem_memoria))
+        print_result(resultados[-1])
+    for linhas in args.linhas:
+        resultados.append(bench_history(linhas, not args.sem_memoria))
+        print_result(resultados[-1])
+
+    if args.json:
+        with open(args.json, "w") as arquivo:
+            json.dump(resultados, arquivo, indent=2)
+    if args.base:
+        with open(args.base) as arquivo:
+            regressoes = compare(resultados, json.load(arquivo), args.tolerancia)
+        if regressoes:
+            print("\nRegressões:")
+            for regressao in regressoes:
+                print(f"  {regressao}")
+            sys.exit(1)
+        print("\nSem regressões em relação à base")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Gerador de tráfego sintético para os benchmarks.
+
+Chegadas seguem um processo de Poisson com taxa variando ao longo do dia
+(picos de manhã e no fim da tarde); a permanência mistura estadias curtas,
+expedientes e pernoites, com distribuição log-normal em cada grupo.
+"""
+from datetime import datetime, timedelta
+import string
+
+import numpy as np
+
+# Multiplicador da taxa de chegada por hora do dia (média = 1)
+PERFIL_HORARIO = np.array([
+    0.15, 0.10, 0.08, 0.08, 0.10, 0.25, 0.70, 1.80, 2.60, 1.90, 1.20, 1.10,
+    1.40, 1.40, 1.10, 1.00, 1.30, 2.20, 2.50, 1.60, 0.90, 0.60, 0.40, 0.25,
+])
+PERFIL_HORARIO = PERFIL_HORARIO / PERFIL_HORARIO.mean()
+
+# Permanência: (proporção, mediana em horas, sigma do log)
+PERMANENCIAS = [
+    (0.60, 0.75, 0.6),   # compras, consultas
+    (0.30, 8.00, 0.25),  # expediente
+    (0.10, 20.0, 0.4),   # pernoite
+]
+
+TIPOS = np.array(["Carro", "Moto", "SUV", "Caminhonete", "Van"])
+PESOS_TIPOS = np.array([0.62, 0.14, 0.16, 0.05, 0.03])
+CORES = np.array(["Branco", "Preto", "Prata", "Vermelho", "Azul", "Outro"])
+
+
+def mean_dwell_hours():
+    return sum(p * m * np.exp(s * s / 2) for p, m, s in PERMANENCIAS)
+
+
+def arrival_offsets(horas, taxa_hora, rng):
+    # Poisson não homogêneo por afinamento: gera com a taxa máxima e mantém
+    # cada chegada com probabilidade perfil(hora) / perfil máximo
+    maximo = taxa_hora * PERFIL_HORARIO.max()
+    n = rng.poisson(maximo * horas)
+    segundos = np.sort(rng.uniform(0, horas * 3600, n))
+    perfil = PERFIL_HORARIO[(segundos // 3600).astype(np.int64) % 24]
+    return segundos[rng.uniform(size=n) < perfil / PERFIL_HORARIO.max()]
+
+
+def dwell_hours(n, rng):
+    proporcoes = np.array([p for p, _, _ in PERMANENCIAS])
+    grupo = rng.choice(len(PERMANENCIAS), size=n, p=proporcoes)
+    medianas = np.array([m for _, m, _ in PERMANENCIAS])[grupo]
+    sigmas = np.array([s for _, _, s in PERMANENCIAS])[grupo]
+    return np.exp(np.log(medianas) + sigmas * rng.standard_normal(n))
+
+
+def plates(n, rng):
+    # Placas únicas no formato Mercosul (ABC1D23)
+    letras = np.array(list(string.ascii_uppercase))
+    codigos = rng.choice(26 ** 3 * 10 * 26 * 100, n, replace=False)
+    resultado = []
+    for c in codigos.tolist():
+        c, numero = divmod(c, 100)
+        c, letra = divmod(c, 26)
+        c, digito = divmod(c, 10)
+        resultado.append(f"{letras[c // 676]}{letras[c // 26 % 26]}{letras[c % 26]}{digito}{letras[letra]}{numero:02d}")
+    return resultado
+
+
+def generate_trace(capacidade, horas, ocupacao_alvo=0.8, inicio=None, semente=0):
+    """Eventos (momento, "entrada"/"saida", placa, tipo, cor) em ordem de tempo.
+
+    A taxa média de chegada vem da lei de Little para que a ocupação média
+    fique perto de `ocupacao_alvo` da capacidade; nos picos o pátio lota e as
+    chegadas excedentes são recusadas pelo próprio motor.
+    """
+    rng = np.random.default_rng(semente)
+    inicio = inicio or datetime(2024, 1, 1)
+    taxa = ocupacao_alvo * capacidade / mean_dwell_hours()
+    chegadas = arrival_offsets(horas, taxa, rng)
+    n = len(chegadas)
+    saidas = chegadas + dwell_hours(n, rng) * 3600
+    placas = plates(n, rng)
+    tipos = rng.choice(TIPOS, size=n, p=PESOS_TIPOS).tolist()
+    cores = rng.choice(CORES, size=n).tolist()
+
+    momentos = np.concatenate([chegadas, saidas])
+    ordem = np.argsort(momentos, kind="stable")
+    eventos = []
+    for k in ordem.tolist():
+        i = k % n
+        evento = "entrada" if k < n else "saida"
+        eventos.append((inicio + timedelta(seconds=float(momentos[k])), evento, placas[i], tipos[i], cores[i]))
+    return eventos
+
+
+def history_frame(linhas, inicio=None, semente=0):
+    """DataFrame sintético com as colunas do histórico, em ordem de Saida."""
+    import pandas as pd
+
+    rng = np.random.default_rng(semente)
+    inicio = np.datetime64(inicio or datetime(2024, 1, 1), "s")
+    # Uma saída a cada ~30 s em média, permanências da mesma mistura do tráfego
+    saidas = inicio + np.cumsum(rng.exponential(30, linhas)).astype("timedelta64[s]")
+    entradas = saidas - (dwell_hours(linhas, rng) * 3600).astype("timedelta64[s]")
+    # Poucas placas distintas, repetidas: o histórico guarda só referências
+    placas = np.array(plates(min(linhas, 50_000), rng), dtype=object)[rng.integers(0, min(linhas, 50_000), linhas)]
+    tempo = (saidas - entradas) / np.timedelta64(3600, "s")
+    return pd.DataFrame({
+        "Nome": "Cliente",
+        "Modelo": "Modelo",
+        "Placa": placas,
+        "Cor": rng.choice(CORES, size=linhas),
+        "Tipo": rng.choice(TIPOS, size=linhas, p=PESOS_TIPOS),
+        "Entrada": entradas.astype("datetime64[ns]"),
+        "Saida": saidas.astype("datetime64[ns]"),
+        "Valor": np.round(tempo * 5.0, 2),
+        "Tempo": tempo,
+    })
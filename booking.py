@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+import json
+
+from shiny import reactive
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from ingest import parse_moment
+from reservations import ReservationError
+
+# Janela padrão da consulta de disponibilidade sem `fim`
+HORAS_DISPONIBILIDADE = 24
+
+
+def _reserva_json(reserva):
+    return {
+        "codigo": reserva.codigo, "placa": reserva.placa, "nome": reserva.nome, "zona": reserva.zona,
+        "inicio": reserva.inicio.isoformat(), "fim": reserva.fim.isoformat(), "situacao": reserva.situacao,
+    }
+
+
+class ReservationAPI:
+    """API de reservas de uma unidade (venda antecipada, eventos, parceiros).
+
+    As mudanças passam pelo `LotState`, então as sessões abertas veem as
+    reservas novas/canceladas no mesmo flush, como nos eventos das cancelas.
+    """
+
+    def __init__(self, lot):
+        self.lot = lot
+
+    def routes(self):
+        return [
+            Route("/reservas", self._get_reservas, methods=["GET"]),
+            Route("/reservas", self._post_reserva, methods=["POST"]),
+            Route("/reservas/{codigo}", self._delete_reserva, methods=["DELETE"]),
+            Route("/disponibilidade", self._get_disponibilidade, methods=["GET"]),
+        ]
+
+    async def _get_reservas(self, request):
+        return JSONResponse([_reserva_json(r) for r in self.lot.reservations()])
+
+    async def _post_reserva(self, request):
+        try:
+            dados = json.loads(await request.body())
+            placa, zona = dados["placa"], dados.get("zona") or self.lot.zonas[0].nome
+            inicio, fim = parse_moment(dados["inicio"]), parse_moment(dados["fim"])
+        except json.JSONDecodeError:
+            return JSONResponse({"erro": "JSON inválido"}, status_code=400)
+        except (KeyError, TypeError, ValueError):
+            return JSONResponse({"erro": "Campos obrigatórios: placa, inicio e fim (ISO 8601)"}, status_code=400)
+        try:
+            reserva = self.lot.reserve(dados.get("nome") or "Não informado", placa, zona, inicio, fim)
+        except ReservationError as e:
+            return JSONResponse({"erro": str(e)}, status_code=409)
+        await reactive.flush()
+        return JSONResponse(_reserva_json(reserva), status_code=201)
+
+    async def _delete_reserva(self, request):
+        try:
+            reserva = self.lot.cancel_reservation(request.path_params["codigo"])
+        except ReservationError as e:
+            return JSONResponse({"erro": str(e)}, status_code=404)
+        await reactive.flush()
+        return JSONResponse(_reserva_json(reserva))
+
+    async def _get_disponibilidade(self, request):
+        # ?zona=&inicio=&fim=: reservas que ainda cabem e o pico já reservado
+        consulta = request.query_params
+        try:
+            inicio = parse_moment(consulta["inicio"]) if "inicio" in consulta else datetime.now()
+            fim = parse_moment(consulta["fim"]) if "fim" in consulta else inicio + timedelta(hours=HORAS_DISPONIBILIDADE)
+        except ValueError:
+            return JSONResponse({"erro": "'inicio' e 'fim' devem estar em ISO 8601"}, status_code=400)
+        zonas = [consulta["zona"]] if "zona" in consulta else [z.nome for z in self.lot.zonas]
+        try:
+            resultado = [{
+                "zona": zona,
+                "disponiveis": self.lot.reservation_capacity(zona, inicio, fim),
+                "pico_reservado": self.lot.reserved_peak(inicio, fim, zona),
+            } for zona in zonas]
+        except ReservationError as e:
+            return JSONResponse({"erro": str(e)}, status_code=404)
+        return JSONResponse({"inicio": inicio.isoformat(), "fim": fim.isoformat(), "zonas": resultado})
@@ -0,0 +1,45 @@
+import asyncio
+import math
+import time
+
+from shiny import reactive
+
+
+class ClockBroadcaster:
+    """Relógio único do processo, compartilhado por todas as sessões.
+
+    Cada saída dependente do tempo assina uma resolução (`every(60)`) e recebe
+    um valor reativo que só muda quando aquela resolução vira. Um único timer
+    dorme até a próxima virada de qualquer resolução e só então faz um flush.
+    """
+
+    def __init__(self):
+        self._ticks = {}
+        self._tarefa = None
+
+    def every(self, segundos):
+        tick = self._ticks.get(segundos)
+        if tick is None:
+            tick = self._ticks[segundos] = reactive.Value(math.floor(time.time() / segundos), name=f"tick_{segundos}s")
+        return tick
+
+    def start(self):
+        # Chamado pelas sessões; só a primeira cria a tarefa no loop em execução
+        if self._tarefa is None:
+            self._tarefa = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            agora = time.time()
+            espera = min((s - agora % s for s in self._ticks), default=1.0)
+            await asyncio.sleep(espera)
+            agora = time.time()
+            mudou = False
+            with reactive.isolate():
+                for segundos, tick in self._ticks.items():
+                    atual = math.floor(agora / segundos)
+                    if atual != tick.get():
+                        tick.set(atual)
+                        mudou = True
+            if mudou:
+                await reactive.flush()
@@ -0,0 +1,336 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import threading
+
+from lazy import LazyModule
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+COLUNAS_HISTORICO = ["Nome", "Modelo", "Placa", "Cor", "Tipo", "Entrada", "Saida", "Valor", "Tempo"]
+
+# Colunas de texto livre, categóricas (códigos inteiros) e numéricas
+_TEXTO = ("Nome", "Modelo", "Placa")
+_CATEGORIAS = ("Cor", "Tipo")
+_DATAS = ("Entrada", "Saida")
+_NUMEROS = ("Valor", "Tempo")
+
+CAPACIDADE_INICIAL = 1024
+
+# Dias mais recentes mantidos na memória; os anteriores ficam no disco
+JANELA_QUENTE_DIAS = 7
+# Quantas partições diárias antigas podem ficar carregadas ao mesmo tempo
+MAX_PARTICOES = 31
+
+
+class HistoryStore:
+    """Histórico de saídas só de inserção, em arrays tipados pré-alocados.
+
+    Os arrays crescem geometricamente (dobram de tamanho), então cada saída
+    custa O(1) amortizado em vez de um `pd.concat` do histórico inteiro.
+    """
+
+    def __init__(self, capacidade=CAPACIDADE_INICIAL):
+        self._n = 0
+        self._colunas = {}
+        self._alocar(max(1, capacidade))
+        # Valor -> código de cada coluna categórica, na ordem de aparição
+        self._codigos = {c: {} for c in _CATEGORIAS}
+
+    def _alocar(self, capacidade):
+        novas = {}
+        for c in _TEXTO:
+            novas[c] = np.empty(capacidade, dtype=object)
+        for c in _CATEGORIAS:
+            novas[c] = np.empty(capacidade, dtype=np.int16)
+        for c in _DATAS:
+            novas[c] = np.empty(capacidade, dtype="datetime64[ns]")
+        for c in _NUMEROS:
+            novas[c] = np.empty(capacidade, dtype=np.float64)
+        for c, antigo in self._colunas.items():
+            novas[c][:self._n] = antigo[:self._n]
+        self._colunas = novas
+        self._capacidade = capacidade
+
+    def _reservar(self, extra):
+        necessario = self._n + extra
+        if necessario > self._capacidade:
+            capacidade = self._capacidade
+            while capacidade < necessario:
+                capacidade *= 2
+            self._alocar(capacidade)
+
+    def _codigo(self, coluna, valor):
+        codigos = self._codigos[coluna]
+        codigo = codigos.get(valor)
+        if codigo is None:
+            codigo = codigos[valor] = len(codigos)
+        return codigo
+
+    def __len__(self):
+        return self._n
+
+    def append(self, nome, modelo, placa, cor, tipo, entrada, saida, valor, tempo):
+        self._reservar(1)
+        i = self._n
+        cols = self._colunas
+        saida = np.datetime64(saida, "ns")
+        if i and saida < cols["Saida"][i - 1]:
+            # Saída atrasada (câmera): entra na posição certa e só as linhas
+            # depois dela andam uma casa
+            i = int(np.searchsorted(cols["Saida"][:i], saida, side="right"))
+            for coluna in cols.values():
+                coluna[i + 1:self._n + 1] = coluna[i:self._n]
+        cols["Nome"][i] = nome
+        cols["Modelo"][i] = modelo
+        cols["Placa"][i] = placa
+        cols["Cor"][i] = self._codigo("Cor", cor)
+        cols["Tipo"][i] = self._codigo("Tipo", tipo)
+        cols["Entrada"][i] = np.datetime64(entrada, "ns")
+        cols["Saida"][i] = saida
+        cols["Valor"][i] = valor
+        cols["Tempo"][i] = tempo
+        self._n += 1
+
+    def extend(self, df):
+        # Inserção em lote a partir de um DataFrame com as colunas do histórico
+        m = len(df)
+        if m == 0:
+            return
+        self._reservar(m)
+        ini, fim = self._n, self._n + m
+        cols = self._colunas
+        for c in _TEXTO:
+            cols[c][ini:fim] = df[c].to_numpy(dtype=object)
+        for c in _CATEGORIAS:
+            valores = df[c].astype(object).to_numpy()
+            unicos, inversos = np.unique(valores.astype(str), return_inverse=True)
+            mapa = np.array([self._codigo(c, u) for u in unicos], dtype=np.int16)
+            cols[c][ini:fim] = mapa[inversos]
+        for c in _DATAS:
+            cols[c][ini:fim] = pd.to_datetime(df[c]).to_numpy(dtype="datetime64[ns]")
+        for c in _NUMEROS:
+            cols[c][ini:fim] = df[c].to_numpy(dtype=np.float64)
+        self._n = fim
+        saidas = cols["Saida"][max(ini - 1, 0):fim]
+        if (saidas[1:] < saidas[:-1]).any():
+            self._ordenar()
+
+    def _ordenar(self):
+        # Mantém as linhas ordenadas por Saida depois de uma importação fora
+        # de ordem (saídas ao vivo atrasadas são inseridas no lugar por `append`)
+        ordem = np.argsort(self._colunas["Saida"][:self._n], kind="stable")
+        for coluna in self._colunas.values():
+            coluna[:self._n] = coluna[:self._n][ordem]
+
+    def range(self, inicio=None, fim=None):
+        # Intervalo [i, j) das linhas com inicio <= Saida < fim, por busca binária
+        saidas = self.column("Saida")
+        i = 0 if inicio is None else int(np.searchsorted(saidas, np.datetime64(inicio, "ns"), side="left"))
+        j = self._n if fim is None else int(np.searchsorted(saidas, np.datetime64(fim, "ns"), side="left"))
+        return i, j
+
+    def rows(self, i, j, reverso=False):
+        # DataFrame só com as linhas [i, j), opcionalmente da mais recente para a mais antiga
+        if j <= i:
+            passo = slice(0, 0)
+        elif reverso:
+            passo = slice(j - 1, i - 1 if i else None, -1)
+        else:
+            passo = slice(i, j)
+        dados = {}
+        for c in COLUNAS_HISTORICO:
+            valores = self._colunas[c][:self._n][passo]
+            if c in _CATEGORIAS:
+                dados[c] = pd.Categorical.from_codes(valores, categories=self.categories(c))
+            else:
+                dados[c] = valores
+        return pd.DataFrame(dados, columns=COLUNAS_HISTORICO)
+
+    def drop_before(self, k):
+        # Descarta as k linhas mais antigas (já persistidas no disco)
+        if k <= 0:
+            return
+        restantes = self._n - k
+        for coluna in self._colunas.values():
+            coluna[:restantes] = coluna[k:self._n]
+        self._n = restantes
+
+    def column(self, nome):
+        # Visão (sem cópia) dos valores preenchidos de uma coluna
+        return self._colunas[nome][:self._n]
+
+    def categories(self, coluna):
+        return list(self._codigos[coluna])
+
+    def copy(self, i=0, j=None):
+        # Cópia independente das linhas [i, j): os arrays daqui mudam no lugar
+        # (saídas atrasadas, descarte de dias antigos)
+        j = self._n if j is None else j
+        copia = HistoryStore(capacidade=j - i)
+        for c, coluna in self._colunas.items():
+            copia._colunas[c][:j - i] = coluna[i:j]
+        copia._n = j - i
+        copia._codigos = {c: dict(codigos) for c, codigos in self._codigos.items()}
+        return copia
+
+
+def _dia(momento):
+    return datetime(momento.year, momento.month, momento.day)
+
+
+class PartitionedHistory:
+    """Histórico particionado por dia de saída.
+
+    Os últimos `janela_dias` ficam num `HistoryStore` na memória. Os dias mais
+    antigos são faixas do índice em `saida` no SQLite, carregadas só quando
+    uma consulta chega nelas. No máximo `max_particoes` dias ficam em cache
+    (LRU). Sem storage não há onde guardar os dias antigos, então tudo fica
+    na memória.
+
+    Leituras podem vir de qualquer thread. Um lock interno cobre só o corte,
+    o cache de partições e o que é lido das linhas quentes (as consultas
+    copiam o trecho que usam); o flush da fila e a leitura dos dias antigos
+    no disco acontecem fora dele. Partições carregadas nunca mudam: uma saída
+    atrasada num dia antigo só tira o dia do cache.
+    """
+
+    def __init__(self, storage=None, janela_dias=JANELA_QUENTE_DIAS, max_particoes=MAX_PARTICOES, agora=None):
+        self.storage = storage
+        self.janela_dias = janela_dias
+        self.max_particoes = max_particoes
+        self._particoes = OrderedDict()
+        # Cresce a cada dia antigo invalidado: uma partição lida do disco
+        # antes disso não entra no cache
+        self._invalidacoes = 0
+        self._lock = threading.Lock()
+        self.corte = None
+        self.quente = HistoryStore()
+        if storage is not None:
+            self.corte = _dia(agora or datetime.now()) - timedelta(days=janela_dias - 1)
+            storage.flush()
+            self.quente.extend(storage.load_history(self.corte))
+
+    def _rolar(self, agora):
+        # Chamado com o lock. Na virada do dia, o dia que saiu da janela deixa a memória
+        if self.corte is None:
+            return
+        corte = _dia(agora) - timedelta(days=self.janela_dias - 1)
+        if corte > self.corte:
+            self.corte = corte
+            self.quente.drop_before(self.quente.range(corte)[0])
+
+    def _invalidar(self, dia):
+        # Chamado com o lock
+        self._particoes.pop(dia, None)
+        self._invalidacoes += 1
+
+    def append(self, nome, modelo, placa, cor, tipo, entrada, saida, valor, tempo):
+        with self._lock:
+            self._rolar(saida)
+            if self.corte is not None and saida < self.corte:
+                self._invalidar(_dia(saida))
+                return
+            self.quente.append(nome, modelo, placa, cor, tipo, entrada, saida, valor, tempo)
+
+    def extend(self, df):
+        with self._lock:
+            if self.corte is None:
+                self.quente.extend(df)
+                return
+            saidas = pd.to_datetime(df["Saida"])
+            recentes = (saidas >= self.corte).to_numpy()
+            self.quente.extend(df[recentes])
+            # Dias antigos afetados são relidos do disco na próxima consulta
+            for dia in saidas[~recentes].dt.normalize().unique():
+                self._invalidar(pd.Timestamp(dia).to_pydatetime())
+
+    def _corte_atual(self):
+        # Chamado com o lock, junto com a leitura das linhas quentes: os dias
+        # frios são os anteriores a este corte, então as duas partes batem
+        self._rolar(datetime.now())
+        return self.corte
+
+    def _particao(self, dia):
+        with self._lock:
+            particao = self._particoes.get(dia)
+            if particao is not None:
+                self._particoes.move_to_end(dia)
+                return particao
+            invalidacoes = self._invalidacoes
+        # Leitura do disco fora do lock
+        self.storage.flush()
+        particao = HistoryStore(capacidade=1)
+        particao.extend(self.storage.load_history(dia, dia + timedelta(days=1)))
+        with self._lock:
+            if invalidacoes == self._invalidacoes:
+                self._particoes[dia] = particao
+                while len(self._particoes) > self.max_particoes:
+                    self._particoes.popitem(last=False)
+        return particao
+
+    def _dias_frios(self, corte, inicio, fim):
+        # Dias antigos (antes de `corte`) com alguma saída em [inicio, fim), com contagens
+        if corte is None or (inicio is not None and inicio >= corte):
+            return []
+        limite = corte if fim is None else min(fim, corte)
+        self.storage.flush()
+        return self.storage.day_counts(inicio, limite)
+
+    def count(self, inicio=None, fim=None):
+        with self._lock:
+            corte = self._corte_atual()
+            i, j = self.quente.range(inicio, fim)
+        return (j - i) + sum(n for _, n in self._dias_frios(corte, inicio, fim))
+
+    def segments(self, inicio=None, fim=None):
+        # (store, i, j) em ordem cronológica; cada partição antiga só é
+        # carregada quando a iteração chega nela. As linhas quentes vêm de
+        # uma cópia feita no início
+        with self._lock:
+            corte = self._corte_atual()
+            quente = self.quente.copy(*self.quente.range(inicio, fim))
+        for dia, _ in self._dias_frios(corte, inicio, fim):
+            particao = self._particao(dia)
+            yield (particao, *particao.range(inicio, fim))
+        yield (quente, 0, len(quente))
+
+    def page(self, inicio, fim, deslocamento, limite):
+        # Página da mais recente para a mais antiga: pula `deslocamento` linhas a
+        # partir do fim e carrega só as partições que a página alcança
+        frames = []
+        with self._lock:
+            corte = self._corte_atual()
+            i, j = self.quente.range(inicio, fim)
+            if deslocamento < j - i:
+                fim_pagina = j - deslocamento
+                ini_pagina = max(i, fim_pagina - limite)
+                frames.append(self.quente.rows(ini_pagina, fim_pagina, reverso=True))
+                limite -= fim_pagina - ini_pagina
+                deslocamento = 0
+            else:
+                deslocamento -= j - i
+
+        if limite > 0:
+            for dia, n in reversed(self._dias_frios(corte, inicio, fim)):
+                if limite <= 0:
+                    break
+                if deslocamento >= n:
+                    deslocamento -= n
+                    continue
+                particao = self._particao(dia)
+                i, j = particao.range(inicio, fim)
+                fim_pagina = j - deslocamento
+                ini_pagina = max(i, fim_pagina - limite)
+                frames.append(particao.rows(ini_pagina, fim_pagina, reverso=True))
+                limite -= fim_pagina - ini_pagina
+                deslocamento = 0
+        if not frames:
+            return HistoryStore(capacidade=1).rows(0, 0)
+        return pd.concat(frames, ignore_index=True)
+
+    def iter_rows(self, inicio=None, fim=None, linhas=CAPACIDADE_INICIAL):
+        # Blocos de no máximo `linhas` registros, em ordem cronológica
+        for store, i, j in self.segments(inicio, fim):
+            for a in range(i, j, linhas):
+                yield store.rows(a, min(a + linhas, j))
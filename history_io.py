@@ -0,0 +1,105 @@
+import importlib.util
+import os
+
+from history import COLUNAS_HISTORICO
+from lazy import LazyModule
+
+pd = LazyModule("pandas")
+
+# Linhas por bloco na exportação/importação
+LINHAS_POR_BLOCO = 50_000
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("A exportação/importação em Parquet precisa do pacote pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def parquet_available():
+    # Sem importar o pyarrow (a página é montada antes de qualquer uso)
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def iter_history_csv(historico, inicio=None, fim=None, linhas=LINHAS_POR_BLOCO):
+    # Gera o CSV em blocos: só `linhas` registros formatados na memória por vez
+    yield ",".join(COLUNAS_HISTORICO) + "\n"
+    for bloco in historico.iter_rows(inicio, fim, linhas):
+        yield bloco.to_csv(header=False, index=False, date_format="%Y-%m-%d %H:%M:%S")
+
+
+def parquet_schema():
+    pa = _require_pyarrow()
+    texto = pa.string()
+    categoria = pa.dictionary(pa.int16(), pa.string())
+    return pa.schema([
+        ("Nome", texto),
+        ("Modelo", texto),
+        ("Placa", texto),
+        ("Cor", categoria),
+        ("Tipo", categoria),
+        ("Entrada", pa.timestamp("ns")),
+        ("Saida", pa.timestamp("ns")),
+        ("Valor", pa.float64()),
+        ("Tempo", pa.float64()),
+    ])
+
+
+def write_history_parquet(historico, destino, inicio=None, fim=None, linhas=LINHAS_POR_BLOCO):
+    # Um row group por bloco, com os tipos de colunas do histórico
+    pa = _require_pyarrow()
+    schema = parquet_schema()
+    with pa.parquet.ParquetWriter(destino, schema) as escritor:
+        vazio = True
+        for bloco in historico.iter_rows(inicio, fim, linhas):
+            escritor.write_table(pa.Table.from_pandas(bloco, schema=schema, preserve_index=False))
+            vazio = False
+        if vazio:
+            escritor.write_table(schema.empty_table())
+
+
+def _normalize(bloco, primeiro=1):
+    # Colunas do histórico com os tipos certos. Todas são NOT NULL no banco:
+    # um registro com algum valor faltando recusa o arquivo antes de qualquer
+    # gravação. `primeiro` é o número do primeiro registro do bloco (mensagens)
+    faltando = [c for c in COLUNAS_HISTORICO if c not in bloco.columns]
+    if faltando:
+        raise ValueError(f"Colunas ausentes no arquivo: {', '.join(faltando)}")
+    bloco = bloco[COLUNAS_HISTORICO].copy()
+    for c in ("Entrada", "Saida"):
+        bloco[c] = pd.to_datetime(bloco[c])
+    for c in ("Valor", "Tempo"):
+        bloco[c] = pd.to_numeric(bloco[c])
+    vazios = bloco.isna()
+    if vazios.to_numpy().any():
+        linhas = vazios.any(axis=1).to_numpy().nonzero()[0]
+        colunas = [c for c in COLUNAS_HISTORICO if vazios[c].any()]
+        raise ValueError(
+            f"{len(linhas)} registro(s) sem valor em {', '.join(colunas)} "
+            f"(o primeiro é o registro {primeiro + int(linhas[0])})"
+        )
+    return bloco
+
+
+def iter_history_file(caminho, linhas=LINHAS_POR_BLOCO):
+    # Lê um CSV ou Parquet de histórico em blocos, sem carregar o arquivo inteiro
+    lidos = 0
+    if os.path.splitext(caminho)[1].lower() == ".parquet":
+        pa = _require_pyarrow()
+        arquivo = pa.parquet.ParquetFile(caminho)
+        blocos = (lote.to_pandas() for lote in arquivo.iter_batches(batch_size=linhas))
+    else:
+        blocos = pd.read_csv(caminho, chunksize=linhas, dtype={"Placa": str})
+    for bloco in blocos:
+        yield _normalize(bloco, lidos + 1)
+        lidos += len(bloco)
+
+
+def validate_history_file(caminho, linhas=LINHAS_POR_BLOCO):
+    # Primeira passada da importação: lê e valida o arquivo bloco a bloco, sem
+    # guardar nenhum, e devolve o número de registros. Só um arquivo sem erros
+    # passa para a segunda passada, que lê de novo e aplica bloco a bloco
+    return sum(len(bloco) for bloco in iter_history_file(caminho, linhas))
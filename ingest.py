@@ -0,0 +1,209 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
+
+from shiny import reactive
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from occupancy import LotError
+
+log = logging.getLogger(__name__)
+
+# Tamanho da fila de eventos pendentes; acima disso a API responde 503
+# (e 413 para uma requisição com mais eventos que isso)
+FILA_MAXIMA = 10_000
+# Quantos eventos o worker aplica por lote (um único flush reativo por lote)
+LOTE_MAXIMO = 500
+# Quantos IDs de evento são lembrados para deduplicação
+IDS_LEMBRADOS = 200_000
+# Quanto o relógio de uma câmera pode estar adiantado; eventos mais no futuro
+# que isso são recusados (marcariam todo o diário seguinte como tardio)
+ADIANTAMENTO_MAXIMO = timedelta(minutes=5)
+
+EVENTOS = ("entrada", "saida")
+
+# Valores usados quando a câmera não informa os dados do veículo
+PADRAO_ENTRADA = {"nome": "Não informado", "modelo": "Não informado", "cor": "Outro", "tipo": "Carro"}
+# Operador das saídas registradas pelas cancelas sem campo 'operador'
+OPERADOR_CANCELA = "Cancela"
+
+
+class EventError(ValueError):
+    pass
+
+
+def parse_moment(valor):
+    # ISO 8601 -> horário local sem fuso, como no restante do app
+    momento = datetime.fromisoformat(valor)
+    if momento.tzinfo is not None:
+        momento = momento.astimezone().replace(tzinfo=None)
+    return momento
+
+
+class GateEvent:
+    __slots__ = ("id", "evento", "placa", "momento", "nome", "modelo", "cor", "tipo", "operador")
+
+    def __init__(self, id, evento, placa, momento, nome, modelo, cor, tipo, operador=OPERADOR_CANCELA):
+        self.id = id
+        self.evento = evento
+        self.placa = placa
+        self.momento = momento
+        self.nome = nome
+        self.modelo = modelo
+        self.cor = cor
+        self.tipo = tipo
+        self.operador = operador
+
+    @classmethod
+    def from_json(cls, dados, agora=None):
+        if not isinstance(dados, dict):
+            raise EventError("Cada evento deve ser um objeto JSON")
+        id = dados.get("id")
+        evento = dados.get("evento")
+        placa = dados.get("placa")
+        if not id or not isinstance(id, str):
+            raise EventError("Campo 'id' obrigatório")
+        if evento not in EVENTOS:
+            raise EventError(f"Evento {id}: 'evento' deve ser 'entrada' ou 'saida'")
+        if not placa or not isinstance(placa, str):
+            raise EventError(f"Evento {id}: campo 'placa' obrigatório")
+        for campo in (*PADRAO_ENTRADA, "operador"):
+            valor = dados.get(campo)
+            if valor is not None and not isinstance(valor, str):
+                raise EventError(f"Evento {id}: '{campo}' deve ser texto")
+
+        momento = dados.get("momento")
+        if momento is not None:
+            try:
+                momento = parse_moment(momento)
+            except (TypeError, ValueError):
+                raise EventError(f"Evento {id}: 'momento' deve estar em ISO 8601")
+            if momento > (agora or datetime.now()) + ADIANTAMENTO_MAXIMO:
+                raise EventError(f"Evento {id}: 'momento' está no futuro (relógio da câmera adiantado?)")
+
+        return cls(
+            id, evento, placa, momento,
+            *(dados.get(campo) or padrao for campo, padrao in PADRAO_ENTRADA.items()),
+            dados.get("operador") or OPERADOR_CANCELA,
+        )
+
+
+class GateIngestor:
+    """Recebe eventos das cancelas/câmeras e os aplica ao pátio em lotes.
+
+    Os eventos passam por uma fila asyncio limitada: se ela encher, a API
+    responde 503 com Retry-After em vez de acumular memória (e 413 para um
+    lote maior que a fila inteira). IDs já vistos
+    são ignorados, então o hardware pode reenviar com segurança.
+    """
+
+    def __init__(self, lot, fila_maxima=FILA_MAXIMA, lote_maximo=LOTE_MAXIMO):
+        self.lot = lot
+        self.lote_maximo = lote_maximo
+        self.fila_maxima = fila_maxima
+        self._fila = None
+        self._tarefa = None
+        # id do evento -> situação ("pendente", "ok" ou a mensagem de erro)
+        self._situacao = OrderedDict()
+
+    def start(self):
+        if self._tarefa is None:
+            self._fila = asyncio.Queue(self.fila_maxima)
+            self._tarefa = asyncio.get_running_loop().create_task(self._run())
+
+    def pending(self):
+        return self._fila.qsize() if self._fila is not None else 0
+
+    def status(self, id):
+        return self._situacao.get(id)
+
+    def submit(self, eventos):
+        # Enfileira os eventos novos; devolve (aceitos, duplicados) ou None sem espaço
+        self.start()
+        novos = []
+        vistos = set()
+        for evento in eventos:
+            if evento.id in self._situacao or evento.id in vistos:
+                continue
+            vistos.add(evento.id)
+            novos.append(evento)
+        if self._fila.maxsize - self._fila.qsize() < len(novos):
+            return None
+        for evento in novos:
+            self._lembrar(evento.id, "pendente")
+            self._fila.put_nowait(evento)
+        return len(novos), len(eventos) - len(novos)
+
+    def _lembrar(self, id, situacao):
+        self._situacao[id] = situacao
+        self._situacao.move_to_end(id)
+        while len(self._situacao) > IDS_LEMBRADOS:
+            self._situacao.popitem(last=False)
+
+    def apply(self, evento):
+        try:
+            if evento.evento == "entrada":
+                self.lot.check_in(evento.nome, evento.modelo, evento.placa, evento.cor, evento.tipo, evento.momento)
+            else:
+                self.lot.check_out(evento.placa, evento.momento, evento.operador)
+        except LotError as e:
+            return str(e)
+        return "ok"
+
+    async def _run(self):
+        while True:
+            lote = [await self._fila.get()]
+            while len(lote) < self.lote_maximo and not self._fila.empty():
+                lote.append(self._fila.get_nowait())
+            for evento in lote:
+                try:
+                    situacao = self.apply(evento)
+                except Exception as e:
+                    # Um evento que quebra algo inesperado não derruba o worker
+                    log.exception("Falha ao aplicar o evento %s", evento.id)
+                    situacao = f"Falha ao aplicar o evento: {e}"
+                self._lembrar(evento.id, situacao)
+            # Um flush por lote leva todas as mudanças às sessões de uma vez
+            await reactive.flush()
+
+    def routes(self):
+        return [
+            Route("/eventos", self._post_eventos, methods=["POST"]),
+            Route("/eventos/{id}", self._get_evento, methods=["GET"]),
+        ]
+
+    async def _post_eventos(self, request):
+        try:
+            dados = json.loads(await request.body())
+            lista = dados if isinstance(dados, list) else [dados]
+            eventos = [GateEvent.from_json(d) for d in lista]
+        except json.JSONDecodeError:
+            return JSONResponse({"erro": "JSON inválido"}, status_code=400)
+        except EventError as e:
+            return JSONResponse({"erro": str(e)}, status_code=400)
+
+        if len(eventos) > self.fila_maxima:
+            # Nunca caberia na fila: 503 faria o cliente reenviar para sempre
+            return JSONResponse(
+                {"erro": f"Lote grande demais: no máximo {self.fila_maxima} eventos por requisição"},
+                status_code=413,
+            )
+        resultado = self.submit(eventos)
+        if resultado is None:
+            return JSONResponse(
+                {"erro": "Fila de eventos cheia, tente novamente"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+        aceitos, duplicados = resultado
+        return JSONResponse({"aceitos": aceitos, "duplicados": duplicados}, status_code=202)
+
+    async def _get_evento(self, request):
+        id = request.path_params["id"]
+        situacao = self.status(id)
+        if situacao is None:
+            return JSONResponse({"erro": "Evento desconhecido"}, status_code=404)
+        return JSONResponse({"id": id, "situacao": situacao})
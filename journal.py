@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+import json
+import zlib
+
+from occupancy import LotError, VehicleRecord
+
+# Um snapshot novo a cada tantos eventos ou a cada tanto tempo de eventos,
+# o que vier primeiro: uma consulta nunca reaplica mais que isso
+SNAPSHOT_A_CADA_EVENTOS = 500
+SNAPSHOT_INTERVALO = timedelta(hours=1)
+# Eventos que chegam com o momento mais que isso atrás do último evento são
+# marcados como tardios e lidos à parte pela consulta
+ATRASO_MAXIMO = timedelta(minutes=10)
+
+
+def encode_state(registros):
+    # Veículos ativos -> JSON compactado com zlib
+    return zlib.compress(json.dumps(
+        [[r.vaga, r.nome, r.modelo, r.placa, r.cor, r.tipo, r.entrada.isoformat(sep=" ")] for r in registros],
+        separators=(",", ":"),
+    ).encode())
+
+
+def decode_state(estado):
+    return [
+        VehicleRecord(vaga, nome, modelo, placa, cor, tipo, datetime.fromisoformat(entrada))
+        for vaga, nome, modelo, placa, cor, tipo, entrada in json.loads(zlib.decompress(estado))
+    ]
+
+
+class LotJournal:
+    """Diário de entradas/saídas com snapshots periódicos do pátio.
+
+    Cada evento é gravado junto com a entrada/saída (mesma transação). O
+    estado num momento T é o último snapshot até T mais os eventos entre ele
+    e T, então uma consulta lê no máximo um intervalo de snapshot de eventos.
+
+    O momento de um snapshot é o do evento mais recente que ele contém. Um
+    evento que chega depois do snapshot com momento anterior a ele (câmera
+    atrasada) ainda é achado pela consulta se o atraso for menor que
+    ATRASO_MAXIMO; acima disso ele é gravado como tardio e vem por um índice
+    parcial, sem ampliar a janela lida.
+    """
+
+    def __init__(self, storage, vagas, agora=None):
+        self.storage = storage
+        self._ultimo_evento, self._ultimo_snapshot = storage.journal_bounds()
+        self._desde_snapshot = 0
+        if self._ultimo_snapshot is None:
+            # Primeiro uso do diário: o pátio atual é o ponto de partida
+            self.snapshot(vagas, agora or datetime.now())
+
+    def is_late(self, momento):
+        # Chamado antes de gravar um evento. Como nenhum snapshot tem momento
+        # depois do último evento, quem não é tardio cai na janela da consulta
+        return self._ultimo_evento is not None and momento <= self._ultimo_evento - ATRASO_MAXIMO
+
+    def recorded(self, momento, vagas):
+        # Chamado depois de gravar um evento (com o lock do pátio)
+        if self._ultimo_evento is None or momento > self._ultimo_evento:
+            self._ultimo_evento = momento
+        self._desde_snapshot += 1
+        if (self._desde_snapshot >= SNAPSHOT_A_CADA_EVENTOS
+                or self._ultimo_evento - self._ultimo_snapshot >= SNAPSHOT_INTERVALO):
+            self.snapshot(vagas, self._ultimo_evento)
+
+    def snapshot(self, vagas, momento):
+        self.storage.save_snapshot(momento, encode_state(vagas))
+        self._ultimo_snapshot = momento
+        if self._ultimo_evento is None or momento > self._ultimo_evento:
+            self._ultimo_evento = momento
+        self._desde_snapshot = 0
+
+    def state_at(self, momento):
+        # (momento do snapshot usado, veículos no pátio em `momento` por vaga)
+        self.storage.flush()
+        snapshot = self.storage.load_snapshot(momento)
+        if snapshot is None:
+            raise LotError("Não há registro do pátio antes deste momento!")
+        inicio, seq, estado = snapshot
+        ativos = {r.placa: r for r in decode_state(estado)}
+        for evento, *campos in self.storage.load_events(inicio - ATRASO_MAXIMO, momento, seq):
+            registro = VehicleRecord(*campos)
+            if evento == "entrada":
+                ativos[registro.placa] = registro
+            else:
+                ativos.pop(registro.placa, None)
+        return inicio, sorted(ativos.values(), key=lambda r: r.vaga)
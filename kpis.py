@@ -0,0 +1,74 @@
+from datetime import datetime
+
+
+class KPISnapshot:
+    # Valores prontos para os cartões de estatística
+    __slots__ = ("dia", "ativos", "livres", "capacidade", "receita_dia", "saidas_dia", "ticket_medio", "por_tipo")
+
+    def __init__(self, dia, ativos, capacidade, receita_dia, saidas_dia, por_tipo):
+        self.dia = dia
+        self.ativos = ativos
+        self.livres = capacidade - ativos
+        self.capacidade = capacidade
+        self.receita_dia = receita_dia
+        self.saidas_dia = saidas_dia
+        self.ticket_medio = receita_dia / saidas_dia if saidas_dia else 0.0
+        self.por_tipo = por_tipo
+
+
+class KPIAggregator:
+    """Contadores atualizados a cada entrada/saída, lidos em O(1).
+
+    Receita e número de saídas são acumulados por dia do calendário (data da
+    saída), então a virada da meia-noite não exige zerar nada: o dia novo
+    simplesmente começa sem totais.
+    """
+
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self.ativos = 0
+        self.por_tipo = {}
+        # data -> [receita, saídas]
+        self.por_dia = {}
+
+    def seed(self, registros_ativos, totais_por_dia):
+        # Estado inicial a partir dos veículos restaurados e dos totais gravados
+        for registro in registros_ativos:
+            self.on_check_in(registro)
+        for dia, receita, saidas in totais_por_dia:
+            self.por_dia[dia] = [receita, saidas]
+
+    def on_check_in(self, registro):
+        # O contador por tipo primeiro: se o tipo for inválido, nada muda
+        self.por_tipo[registro.tipo] = self.por_tipo.get(registro.tipo, 0) + 1
+        self.ativos += 1
+
+    def on_check_out(self, registro, saida, valor):
+        # Mesma ordem da entrada: um tipo que não está no pátio não muda nada
+        restantes = self.por_tipo[registro.tipo] - 1
+        if restantes:
+            self.por_tipo[registro.tipo] = restantes
+        else:
+            del self.por_tipo[registro.tipo]
+        self.ativos -= 1
+        totais = self.por_dia.setdefault(saida.date(), [0.0, 0])
+        totais[0] += valor
+        totais[1] += 1
+
+    @staticmethod
+    def history_totals(df):
+        # [(data, receita, saídas)] de um bloco importado; não mexe no estado,
+        # então pode rodar fora do lock do pátio
+        totais = df.groupby(df["Saida"].dt.date)["Valor"].agg(["sum", "count"])
+        return list(zip(totais.index, totais["sum"].tolist(), totais["count"].tolist()))
+
+    def on_history_import(self, totais_por_dia):
+        for dia, receita, saidas in totais_por_dia:
+            acumulado = self.por_dia.setdefault(dia, [0.0, 0])
+            acumulado[0] += receita
+            acumulado[1] += int(saidas)
+
+    def snapshot(self, agora=None):
+        dia = (agora or datetime.now()).date()
+        receita, saidas = self.por_dia.get(dia, (0.0, 0))
+        return KPISnapshot(dia, self.ativos, self.capacidade, receita, saidas, dict(self.por_tipo))
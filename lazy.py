@@ -0,0 +1,54 @@
+import importlib
+import threading
+
+
+class LazyModule:
+    """Módulo importado só no primeiro acesso a um atributo.
+
+    `pd = LazyModule("pandas")` no topo de um arquivo deixa o import (e o seu
+    custo) para a primeira vez que `pd.<algo>` for usado. Depois disso os
+    atributos do módulo são copiados para a instância e o acesso custa o mesmo
+    que o de um atributo comum. A classe não tem métodos públicos para não
+    esconder nenhum nome do módulo (np.load, por exemplo).
+    """
+
+    def __init__(self, nome):
+        self._lazy_nome = nome
+        self._lazy_modulo = None
+
+    def __getattr__(self, atributo):
+        # Só chega aqui o que ainda não está no __dict__ da instância (antes
+        # do import, ou atributos criados sob demanda pelo próprio módulo)
+        if atributo.startswith("__"):
+            raise AttributeError(atributo)
+        return getattr(load(self), atributo)
+
+    def __repr__(self):
+        estado = "carregado" if loaded(self) else "não carregado"
+        return f"<LazyModule {self._lazy_nome} ({estado})>"
+
+
+def load(modulo):
+    # Importa (uma vez) e devolve o módulo real por trás de um LazyModule
+    real = modulo._lazy_modulo
+    if real is None:
+        real = importlib.import_module(modulo._lazy_nome)
+        modulo.__dict__.update({k: v for k, v in vars(real).items() if not k.startswith("__")})
+        modulo._lazy_modulo = real
+    return real
+
+
+def loaded(modulo):
+    return modulo._lazy_modulo is not None
+
+
+def preload(modulos):
+    # Importa os módulos numa thread em segundo plano, para que o primeiro
+    # usuário não pague o import; devolve a thread
+    def carregar():
+        for modulo in modulos:
+            load(modulo)
+
+    thread = threading.Thread(target=carregar, name="preload", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,338 @@
+from collections import deque
+from datetime import datetime
+import logging
+import threading
+
+from occupancy import LotError, OccupancyStore, VehicleNotFoundError
+from history import PartitionedHistory
+from journal import LotJournal
+from kpis import KPIAggregator
+from analytics import TimeSeriesRollups
+from plates import PlateIndex
+from reservations import Reservation, ReservationBook, ReservationError, ReservedCapacityError
+from storage import OPERADOR_PADRAO
+from tariff import QuoteCache
+
+log = logging.getLogger(__name__)
+
+
+class LotEvent:
+    # Notificação enviada aos assinantes após cada mudança no pátio
+    __slots__ = ("tipo", "versao", "registro", "saida", "valor", "horas")
+
+    def __init__(self, tipo, versao, registro, saida=None, valor=None, horas=None):
+        self.tipo = tipo
+        self.versao = versao
+        self.registro = registro
+        self.saida = saida
+        self.valor = valor
+        self.horas = horas
+
+
+# Quantas mudanças de vaga ficam guardadas para sincronização incremental
+HISTORICO_MUDANCAS = 1024
+
+
+class Zone:
+    # Faixa contínua de vagas de um piso/setor
+    __slots__ = ("nome", "primeira", "ultima")
+
+    def __init__(self, nome, primeira, ultima):
+        self.nome = nome
+        self.primeira = primeira
+        self.ultima = ultima
+
+    @property
+    def vagas(self):
+        return self.ultima - self.primeira + 1
+
+
+def build_zones(zonas):
+    # [("Piso 1", 40), ("Piso 2", 60)] -> zonas numeradas em sequência a partir da vaga 1
+    resultado = []
+    primeira = 1
+    for nome, vagas in zonas:
+        resultado.append(Zone(nome, primeira, primeira + vagas - 1))
+        primeira += vagas
+    return resultado
+
+
+class LotState:
+    """Estado único do estacionamento, compartilhado por todas as sessões.
+
+    Entradas e saídas são serializadas por um lock; depois de cada mudança os
+    assinantes recebem um `LotEvent` (fora do lock).
+    """
+
+    def __init__(self, capacidade, tarifa, storage=None, zonas=None):
+        self.zonas = build_zones(zonas or [("Geral", capacidade)])
+        capacidade = sum(z.vagas for z in self.zonas)
+        self.capacidade = capacidade
+        self.tarifa = tarifa
+        self.cotacoes = QuoteCache(tarifa)
+        self.storage = storage
+        self.vagas = OccupancyStore(capacidade)
+        self._historico = None
+        self.kpis = KPIAggregator(capacidade)
+        self.series = TimeSeriesRollups()
+        self.placas = PlateIndex()
+        self.reservas = ReservationBook(self.zonas)
+        if storage is not None:
+            # Só os veículos ativos são carregados na partida; o histórico
+            # fica no disco até alguém precisar dele
+            self.vagas.load(storage.load_vehicles())
+            meia_noite = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            self.kpis.seed(self.vagas, storage.day_totals(meia_noite))
+            self.placas.load(storage.plate_last_exits() + [(r.placa, None) for r in self.vagas])
+            agora = datetime.now()
+            self.series.seed({
+                nome: storage.bucket_totals(rollup.segundos, rollup.first_key(agora))
+                for nome, rollup in self.series.rollups.items()
+            }, agora)
+            orfas = self.reservas.load(Reservation(*linha) for linha in storage.load_reservations())
+            if orfas:
+                # Zona removida da configuração: a reserva não tem mais onde valer
+                log.warning(
+                    "%d reserva(s) cancelada(s) porque a zona não existe mais: %s",
+                    len(orfas), ", ".join(f"{r.codigo} ({r.zona})" for r in orfas),
+                )
+                storage.save_reservation_status(orfas)
+        # Diário de entradas/saídas para reconstruir o pátio em qualquer momento
+        self.journal = LotJournal(storage, self.vagas) if storage is not None else None
+        self.versao = 0
+        # (versão, vaga, placa ou None) das últimas mudanças de vaga
+        self._mudancas = deque(maxlen=HISTORICO_MUDANCAS)
+        self._lock = threading.RLock()
+        self._assinantes = []
+
+    @property
+    def historico(self):
+        if self._historico is None:
+            with self._lock:
+                if self._historico is None:
+                    # Só a janela recente vai para a memória; dias antigos são
+                    # lidos do disco quando alguma consulta chega neles
+                    self._historico = PartitionedHistory(self.storage)
+        return self._historico
+
+    def subscribe(self, callback):
+        self._assinantes.append(callback)
+
+        def cancelar():
+            if callback in self._assinantes:
+                self._assinantes.remove(callback)
+        return cancelar
+
+    def locked(self):
+        # Lock das mudanças no pátio, para leituras feitas fora do loop de
+        # eventos (threads de render) verem um estado consistente
+        return self._lock
+
+    def _notificar(self, evento):
+        for callback in list(self._assinantes):
+            callback(evento)
+
+    def import_history(self, df):
+        # Um bloco de histórico já validado, aplicado numa thread (a importação
+        # vem bloco a bloco). As agregações e a formatação para o banco são
+        # feitas fora do lock; com o lock só entram os totais prontos. Não
+        # avisa as sessões: isso é do history_imported, no fim da importação
+        linhas = self.storage.history_rows(df) if self.storage is not None else None
+        por_dia = self.kpis.history_totals(df)
+        intervalos = self.series.history_totals(df)
+        ultimas = df.groupby("Placa")["Saida"].max()
+        placas = list(zip(ultimas.index, ultimas.dt.to_pydatetime()))
+        with self._lock:
+            # Registros antigos entram direto no disco; só vão para a memória
+            # se o histórico já estiver carregado
+            if self._historico is not None or self.storage is None:
+                self.historico.extend(df)
+            if self.storage is not None:
+                self.storage.save_history(df, linhas)
+            self.kpis.on_history_import(por_dia)
+            self.series.on_history_import(intervalos)
+            self.placas.seen_many(placas)
+
+    def history_imported(self):
+        # Fim de uma importação (no loop de eventos): um aviso só às sessões
+        with self._lock:
+            self.versao += 1
+            evento = LotEvent("importacao", self.versao, None)
+        self._notificar(evento)
+
+    def slot_changes_since(self, versao):
+        # (versão atual, [(vaga, placa ou None)]) desde `versao`; a lista é None
+        # quando essas mudanças já saíram do buffer e o cliente precisa do mapa inteiro
+        with self._lock:
+            if versao is None or (versao < self.versao and (
+                    not self._mudancas or self._mudancas[0][0] > versao + 1)):
+                return self.versao, None
+            mudancas = []
+            for v, vaga, placa in reversed(self._mudancas):
+                if v <= versao:
+                    break
+                mudancas.append((vaga, placa))
+            mudancas.reverse()
+            return self.versao, mudancas
+
+    def quote(self, registro, agora):
+        # Prévia ao vivo (cache por placa); a cobrança na saída usa a tabela direto
+        return self.cotacoes.quote(registro, agora)
+
+    def _ocupadas(self, zona):
+        return self.vagas.occupied_between(zona.primeira, zona.ultima)
+
+    def _expirar(self, agora):
+        # Chamado com o lock: reservas sem chegada até o prazo liberam as vagas
+        expiradas = self.reservas.expire(agora)
+        if expiradas and self.storage is not None:
+            self.storage.save_reservation_status(expiradas)
+        return expiradas
+
+    def _faixa_entrada(self, placa, agora):
+        # (reserva usada, faixa de vagas) de uma entrada. Quem tem reserva entra
+        # na zona reservada; avulsos só entram numa zona com vaga livre além
+        # das prometidas às reservas das próximas horas
+        self._expirar(agora)
+        reserva = self.reservas.for_plate(placa, agora)
+        if reserva is not None:
+            zona = self.reservas.zone(reserva.zona)
+            if self._ocupadas(zona) < zona.vagas:
+                return reserva, (zona.primeira, zona.ultima)
+            # Zona cheia por quem passou do horário: qualquer vaga livre serve
+            return reserva, None
+        if not self.reservas:
+            return None, None
+        zona = self.reservas.walk_in_zone(agora, self._ocupadas)
+        if zona is None:
+            if self.vagas.livres and placa not in self.vagas:
+                raise ReservedCapacityError()
+            return None, None
+        return None, (zona.primeira, zona.ultima)
+
+    def check_in(self, nome, modelo, placa, cor, tipo, entrada=None):
+        with self._lock:
+            reserva, faixa = None, None
+            if self.reservas:
+                reserva, faixa = self._faixa_entrada(placa, entrada or datetime.now())
+            registro = self.vagas.check_in(nome, modelo, placa, cor, tipo, entrada, faixa)
+            try:
+                # Índices em memória antes do banco: se algo falhar aqui, nada
+                # foi gravado e a vaga volta a ficar livre
+                self.kpis.on_check_in(registro)
+                self.series.on_check_in(registro, self.kpis.ativos)
+                self.placas.check_in(registro.placa)
+            except Exception:
+                self.vagas.check_out(registro.placa)
+                raise
+            if reserva is not None:
+                self.reservas.remove(reserva.codigo, "utilizada")
+                if self.storage is not None:
+                    self.storage.save_reservation_status([reserva])
+            if self.storage is not None:
+                self.storage.save_check_in(registro, self.journal.is_late(registro.entrada))
+                self.journal.recorded(registro.entrada, self.vagas)
+            self.versao += 1
+            self._mudancas.append((self.versao, registro.vaga, registro.placa))
+            evento = LotEvent("entrada", self.versao, registro)
+        self._notificar(evento)
+        return registro
+
+    def check_out(self, placa, saida=None, operador=None):
+        # `operador`: quem registrou a saída (só vai para o banco, para os relatórios)
+        with self._lock:
+            registro = self.vagas.get(placa)
+            if registro is None:
+                raise VehicleNotFoundError(placa)
+            saida = saida or datetime.now()
+            valor, horas = self.tarifa.price(registro.entrada, saida, registro.tipo)
+            # O histórico é carregado no primeiro uso: se a leitura falhar, o
+            # veículo ainda não saiu do pátio
+            historico = self.historico
+            self.vagas.check_out(placa)
+            try:
+                # Índices em memória antes do banco: se algo falhar aqui, nada
+                # foi gravado e o veículo volta para a mesma vaga
+                historico.append(
+                    registro.nome, registro.modelo, registro.placa, registro.cor, registro.tipo,
+                    registro.entrada, saida, valor, horas
+                )
+                self.kpis.on_check_out(registro, saida, valor)
+                self.series.on_check_out(registro, saida, valor, self.kpis.ativos)
+                self.placas.check_out(registro.placa, saida)
+            except Exception:
+                self.vagas.load([registro.as_tuple()])
+                raise
+            self.cotacoes.discard(registro.placa)
+            if self.storage is not None:
+                self.storage.save_check_out(
+                    registro, saida, valor, horas, self.journal.is_late(saida), operador or OPERADOR_PADRAO
+                )
+                self.journal.recorded(saida, self.vagas)
+            self.versao += 1
+            self._mudancas.append((self.versao, registro.vaga, None))
+            evento = LotEvent("saida", self.versao, registro, saida, valor, horas)
+        self._notificar(evento)
+        return evento
+
+    def reserve(self, nome, placa, zona, inicio, fim, agora=None):
+        # Reserva uma vaga na zona em [inicio, fim); ReservationError se não couber
+        with self._lock:
+            agora = agora or datetime.now()
+            self._expirar(agora)
+            reserva = self.reservas.book(placa, nome, zona, inicio, fim, agora, self._ocupadas)
+            if self.storage is not None:
+                self.storage.save_reservation(reserva)
+            self.versao += 1
+            evento = LotEvent("reserva", self.versao, reserva)
+        self._notificar(evento)
+        return reserva
+
+    def cancel_reservation(self, codigo):
+        with self._lock:
+            if self.reservas.get(codigo) is None:
+                raise ReservationError(f"Reserva {codigo} não encontrada!")
+            reserva = self.reservas.remove(codigo, "cancelada")
+            if self.storage is not None:
+                self.storage.save_reservation_status([reserva])
+            self.versao += 1
+            evento = LotEvent("cancelamento", self.versao, reserva)
+        self._notificar(evento)
+        return reserva
+
+    def expire_reservations(self, agora=None):
+        # Expira na hora certa (chamado pelos alertas) em vez de esperar a
+        # próxima operação; devolve as reservas expiradas
+        with self._lock:
+            expiradas = self._expirar(agora or datetime.now())
+            if not expiradas:
+                return expiradas
+            self.versao += 1
+            evento = LotEvent("expiracao", self.versao, None)
+        self._notificar(evento)
+        return expiradas
+
+    def reservations(self, agora=None, limite=None):
+        # Reservas ativas em ordem de início
+        with self._lock:
+            self._expirar(agora or datetime.now())
+            return self.reservas.upcoming(limite)
+
+    def reservation_capacity(self, zona, inicio, fim, agora=None):
+        # Quantas reservas ainda cabem na zona em [inicio, fim)
+        with self._lock:
+            agora = agora or datetime.now()
+            self._expirar(agora)
+            return self.reservas.capacity(zona, inicio, fim, agora, self._ocupadas)
+
+    def reserved_peak(self, inicio, fim, zona=None):
+        # Pico de vagas reservadas ao mesmo tempo em [inicio, fim)
+        with self._lock:
+            return self.reservas.peak(inicio, fim, zona)
+
+    def state_at(self, momento):
+        # (momento do snapshot usado, veículos no pátio em `momento`), a partir
+        # do diário; a leitura é feita fora do lock
+        if self.journal is None:
+            raise LotError("A consulta por momento precisa do banco de dados (PARKING_DB)!")
+        return self.journal.state_at(momento)
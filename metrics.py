@@ -0,0 +1,186 @@
+from bisect import bisect_left
+import functools
+import inspect
+import time
+
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+# Limites (segundos) dos buckets de duração
+BUCKETS_DURACAO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Limites (bytes) dos buckets de tamanho de mensagem
+BUCKETS_BYTES = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+
+
+class Histogram:
+    # Contagens por bucket (não acumuladas; o acúmulo é feito só na exportação)
+    __slots__ = ("limites", "contagens", "soma", "total", "maximo")
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+        self.maximo = 0.0
+
+    def observe(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def quantile(self, q):
+        # Estimativa pelo limite superior do bucket que contém o quantil
+        if not self.total:
+            return 0.0
+        alvo = q * self.total
+        acumulado = 0
+        for limite, contagem in zip(self.limites, self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ""
+    pares = ",".join(f'{chave}="{valor}"' for chave, valor in rotulos)
+    return "{" + pares + "}"
+
+
+class MetricsRegistry:
+    """Contadores, histogramas e medidores do processo, no formato do Prometheus.
+
+    Cada observação é só um incremento em memória (sem lock: tudo roda no
+    loop do servidor), então a instrumentação pode ficar sempre ligada.
+    """
+
+    def __init__(self, prefixo="parking"):
+        self.prefixo = prefixo
+        self._ajuda = {}
+        self._contadores = {}
+        self._histogramas = {}
+        self._medidores = {}
+
+    def _nome(self, nome, ajuda, tipo):
+        nome = f"{self.prefixo}_{nome}"
+        self._ajuda.setdefault(nome, (ajuda, tipo))
+        return nome
+
+    def inc(self, nome, ajuda, valor=1, **rotulos):
+        chave = (self._nome(nome, ajuda, "counter"), tuple(sorted(rotulos.items())))
+        self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def histogram(self, nome, ajuda, limites=BUCKETS_DURACAO, **rotulos):
+        chave = (self._nome(nome, ajuda, "histogram"), tuple(sorted(rotulos.items())))
+        histograma = self._histogramas.get(chave)
+        if histograma is None:
+            histograma = self._histogramas[chave] = Histogram(limites)
+        return histograma
+
+    def gauge(self, nome, ajuda, funcao, **rotulos):
+        # Medidor lido na hora da coleta (funcao() -> número)
+        self._medidores[(self._nome(nome, ajuda, "gauge"), tuple(sorted(rotulos.items())))] = funcao
+
+    def timed(self, funcao):
+        # Decorador: mede duração e chamadas de um efeito/render (síncrono ou async)
+        rotulo = funcao.__name__
+        histograma = self.histogram("reactive_duracao_segundos", "Duração de efeitos e renders", funcao=rotulo)
+
+        if inspect.iscoroutinefunction(funcao):
+            @functools.wraps(funcao)
+            async def medida(*args, **kwargs):
+                inicio = time.perf_counter()
+                try:
+                    return await funcao(*args, **kwargs)
+                finally:
+                    histograma.observe(time.perf_counter() - inicio)
+        else:
+            @functools.wraps(funcao)
+            def medida(*args, **kwargs):
+                inicio = time.perf_counter()
+                try:
+                    return funcao(*args, **kwargs)
+                finally:
+                    histograma.observe(time.perf_counter() - inicio)
+        return medida
+
+    def summary(self):
+        # [(função, chamadas, média ms, p50 ms, p99 ms, máx ms)] para o painel
+        linhas = []
+        for (nome, rotulos), h in sorted(self._histogramas.items()):
+            if nome.endswith("reactive_duracao_segundos") and h.total:
+                linhas.append((
+                    dict(rotulos)["funcao"], h.total, h.soma / h.total * 1000,
+                    h.quantile(0.5) * 1000, h.quantile(0.99) * 1000, h.maximo * 1000,
+                ))
+        return linhas
+
+    def render(self):
+        linhas = []
+        por_nome = {}
+        for (nome, rotulos), valor in self._contadores.items():
+            por_nome.setdefault(nome, []).append(f"{nome}{_rotulos(rotulos)} {valor}")
+        for (nome, rotulos), h in self._histogramas.items():
+            serie = por_nome.setdefault(nome, [])
+            acumulado = 0
+            for limite, contagem in zip(h.limites + ("+Inf",), h.contagens):
+                acumulado += contagem
+                serie.append(f"{nome}_bucket{_rotulos(rotulos + (('le', limite),))} {acumulado}")
+            serie.append(f"{nome}_sum{_rotulos(rotulos)} {h.soma}")
+            serie.append(f"{nome}_count{_rotulos(rotulos)} {h.total}")
+        for (nome, rotulos), funcao in self._medidores.items():
+            por_nome.setdefault(nome, []).append(f"{nome}{_rotulos(rotulos)} {funcao()}")
+        for nome in sorted(por_nome):
+            ajuda, tipo = self._ajuda[nome]
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            linhas.extend(por_nome[nome])
+        return "\n".join(linhas) + "\n"
+
+    def routes(self):
+        async def metricas(request):
+            return PlainTextResponse(self.render(), media_type="text/plain; version=0.0.4")
+        return [Route("/metrics", metricas, methods=["GET"])]
+
+
+def _tipo_mensagem(texto):
+    # '{"values": ...' -> "values"; '{"custom": {"vagas": ...' -> "custom:vagas"
+    fim = texto.find('"', 2)
+    tipo = texto[2:fim]
+    if tipo == "custom":
+        inicio = texto.find('"', fim + 1) + 1
+        tipo += ":" + texto[inicio:texto.find('"', inicio)]
+    return tipo
+
+
+class WebSocketMeter:
+    """Middleware ASGI que mede o tamanho das mensagens enviadas às sessões."""
+
+    def __init__(self, app, metricas):
+        self.app = app
+        self.metricas = metricas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "websocket":
+            return await self.app(scope, receive, send)
+
+        metricas = self.metricas
+
+        async def medir(mensagem):
+            if mensagem["type"] == "websocket.send":
+                # Bytes que vão pela rede: texto em UTF-8 (acentos ocupam mais
+                # de um byte) ou o quadro binário como está
+                texto = mensagem.get("text")
+                if texto:
+                    tipo, tamanho = _tipo_mensagem(texto), len(texto.encode("utf-8"))
+                else:
+                    tipo, tamanho = "binario", len(mensagem.get("bytes") or b"")
+                if tamanho:
+                    metricas.histogram("ws_mensagem_bytes", "Tamanho das mensagens enviadas às sessões",
+                                       BUCKETS_BYTES, tipo=tipo).observe(tamanho)
+            await send(mensagem)
+
+        await self.app(scope, receive, medir)
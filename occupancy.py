@@ -0,0 +1,158 @@
+from datetime import datetime
+
+from lazy import LazyModule
+
+pd = LazyModule("pandas")
+
+COLUNAS_VEICULOS = ["Vaga", "Nome", "Modelo", "Placa", "Cor", "Tipo", "Entrada"]
+
+
+class LotError(Exception):
+    # Erro de operação do estacionamento (mensagem pronta para o operador)
+    pass
+
+
+class DuplicatePlateError(LotError):
+    def __init__(self, placa):
+        super().__init__("Já existe um veículo com esta placa!")
+        self.placa = placa
+
+
+class LotFullError(LotError):
+    def __init__(self):
+        super().__init__("Estacionamento lotado!")
+
+
+class VehicleNotFoundError(LotError):
+    def __init__(self, placa):
+        super().__init__(f"Veículo {placa} não está no estacionamento!")
+        self.placa = placa
+
+
+class VehicleRecord:
+    # Registro de um veículo estacionado (sem __dict__ para economizar memória)
+    __slots__ = ("vaga", "nome", "modelo", "placa", "cor", "tipo", "entrada")
+
+    def __init__(self, vaga, nome, modelo, placa, cor, tipo, entrada):
+        self.vaga = vaga
+        self.nome = nome
+        self.modelo = modelo
+        self.placa = placa
+        self.cor = cor
+        self.tipo = tipo
+        self.entrada = entrada
+
+    def as_tuple(self):
+        return (self.vaga, self.nome, self.modelo, self.placa, self.cor, self.tipo, self.entrada)
+
+
+class OccupancyStore:
+    """Veículos ativos indexados por placa, com vagas numeradas de 1 a `capacidade`."""
+
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self._por_placa = {}
+        # Pilha de vagas livres: o topo é a menor vaga ainda não usada; vagas
+        # liberadas voltam para o topo e são reaproveitadas primeiro. Uma vaga
+        # tomada por zona (pelo bitmap) fica na pilha e é descartada quando
+        # chega ao topo ocupada
+        self._vagas_livres = list(range(capacidade, 0, -1))
+        self._livres = capacidade
+        self._por_vaga = [None] * (capacidade + 1)
+        # Bitmap de ocupação por vaga (índice 0 não é usado)
+        self.mapa = bytearray(capacidade + 1)
+        self._frame = None
+
+    def __len__(self):
+        return len(self._por_placa)
+
+    def __contains__(self, placa):
+        return placa in self._por_placa
+
+    def __iter__(self):
+        return iter(self._por_placa.values())
+
+    @property
+    def livres(self):
+        return self._livres
+
+    def get(self, placa):
+        return self._por_placa.get(placa)
+
+    def at_slot(self, vaga):
+        return self._por_vaga[vaga]
+
+    def occupied_between(self, primeira, ultima):
+        return self.mapa.count(1, primeira, ultima + 1)
+
+    def placas(self):
+        return list(self._por_placa)
+
+    def check_in(self, nome, modelo, placa, cor, tipo, entrada=None, faixa=None):
+        # Com `faixa` (primeira, última), a vaga sai só dessa faixa (uma zona)
+        if placa in self._por_placa:
+            raise DuplicatePlateError(placa)
+        if faixa is None:
+            if not self._livres:
+                raise LotFullError()
+            vaga = self._vagas_livres.pop()
+            while self.mapa[vaga]:
+                vaga = self._vagas_livres.pop()
+        else:
+            vaga = self.mapa.find(0, faixa[0], faixa[1] + 1)
+            if vaga < 0:
+                raise LotFullError()
+        self._livres -= 1
+
+        registro = VehicleRecord(vaga, nome, modelo, placa, cor, tipo, entrada or datetime.now())
+        self._por_placa[placa] = registro
+        self._por_vaga[vaga] = registro
+        self.mapa[vaga] = 1
+        self._frame = None
+        return registro
+
+    def load(self, registros):
+        # Restaura veículos já estacionados (vaga, nome, modelo, placa, cor, tipo, entrada)
+        for vaga, nome, modelo, placa, cor, tipo, entrada in registros:
+            registro = VehicleRecord(vaga, nome, modelo, placa, cor, tipo, entrada)
+            self._por_placa[placa] = registro
+            self._por_vaga[vaga] = registro
+            self.mapa[vaga] = 1
+        self._vagas_livres = [v for v in range(self.capacidade, 0, -1) if self._por_vaga[v] is None]
+        self._livres = len(self._vagas_livres)
+        self._frame = None
+
+    def check_out(self, placa):
+        registro = self._por_placa.pop(placa, None)
+        if registro is None:
+            raise VehicleNotFoundError(placa)
+
+        self._por_vaga[registro.vaga] = None
+        self.mapa[registro.vaga] = 0
+        self._vagas_livres.append(registro.vaga)
+        self._livres += 1
+        if len(self._vagas_livres) > 2 * self.capacidade:
+            self._compactar()
+        self._frame = None
+        return registro
+
+    def _compactar(self):
+        # Tira da pilha as vagas ocupadas e as repetidas, mantendo a ordem de reuso
+        vistas = set()
+        pilha = []
+        for vaga in reversed(self._vagas_livres):
+            if not self.mapa[vaga] and vaga not in vistas:
+                vistas.add(vaga)
+                pilha.append(vaga)
+        pilha.reverse()
+        self._vagas_livres = pilha
+
+    def to_frame(self):
+        # Visão pandas para as tabelas; reconstruída apenas após alguma mudança
+        if self._frame is None:
+            self._frame = pd.DataFrame(
+                [r.as_tuple() for r in self._por_placa.values()],
+                columns=COLUNAS_VEICULOS,
+            )
+            self._frame["Entrada"] = pd.to_datetime(self._frame["Entrada"])
+        return self._frame
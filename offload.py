@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+
+from shiny import reactive, req
+
+# Threads do pool de renders, compartilhado por todas as sessões e unidades
+THREADS_RENDER = 4
+
+POOL = ThreadPoolExecutor(THREADS_RENDER, thread_name_prefix="render")
+
+
+class OffloadedOutput:
+    """Resultado de uma saída pesada, calculado no pool de threads.
+
+    Um efeito chama `request(chave, func, *args)` quando as entradas mudam e
+    o render lê `result()`. O render só é invalidado quando um resultado novo
+    fica pronto, então o cliente continua mostrando o anterior enquanto isso.
+
+    Cada saída tem no máximo um cálculo rodando. Pedidos que chegam nesse meio
+    tempo ocupam uma única vaga de espera (o mais novo substitui o anterior,
+    que nunca roda). `chave` identifica as escolhas do usuário (filtros,
+    página): um resultado cuja chave não é mais a pedida é descartado, e um
+    com a mesma chave só com dados mais antigos é mostrado até o próximo.
+    """
+
+    def __init__(self, nome, pool=POOL):
+        self.pool = pool
+        # (erro, valor) do último resultado publicado
+        self._resultado = reactive.Value(name=nome)
+        self._chave = None
+        self._rodando = None
+        self._proximo = None
+        self._fechado = False
+        # O loop só guarda referências fracas das tarefas
+        self._tarefas = set()
+
+    def request(self, chave, func, *args):
+        self._chave = chave
+        self._proximo = (chave, func, args)
+        if self._rodando is None:
+            self._iniciar()
+
+    def _iniciar(self):
+        chave, func, args = self._proximo
+        self._proximo = None
+        loop = asyncio.get_running_loop()
+        try:
+            self._rodando = self.pool.submit(func, *args)
+        except RuntimeError:
+            # Pool já encerrado: o processo está terminando
+            return
+        self._rodando.add_done_callback(lambda futuro: loop.call_soon_threadsafe(self._pronto, chave, futuro))
+
+    def _pronto(self, chave, futuro):
+        self._rodando = None
+        if self._fechado:
+            return
+        if self._proximo is not None:
+            self._iniciar()
+        if chave == self._chave:
+            tarefa = asyncio.create_task(self._publicar(chave, futuro))
+            self._tarefas.add(tarefa)
+            tarefa.add_done_callback(self._tarefas.discard)
+
+    async def _publicar(self, chave, futuro):
+        async with reactive.lock():
+            if self._fechado or chave != self._chave:
+                return
+            self._resultado.set((futuro.exception(), None if futuro.exception() else futuro.result()))
+            await reactive.flush()
+
+    def result(self):
+        # Último resultado pronto; antes do primeiro, a saída fica "calculando"
+        if not self._resultado.is_set():
+            req(False, cancel_output="progress")
+        erro, valor = self._resultado.get()
+        if erro is not None:
+            raise erro
+        return valor
+
+    def close(self):
+        # Fim da sessão: o pedido em espera não roda e o que está rodando é ignorado
+        self._fechado = True
+        self._proximo = None
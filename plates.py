@@ -0,0 +1,166 @@
+from bisect import bisect_left, insort
+import re
+
+# Quantas placas a busca devolve
+TOP_K = 20
+# Consultas mais curtas que isso só fazem busca por prefixo
+MINIMO_APROXIMADA = 5
+
+_ALFANUMERICO = re.compile(r"[^0-9A-Z]")
+_ALFABETO = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+# Trocas típicas do OCR, conforme o que a posição da placa exige
+_COMO_LETRA = str.maketrans("01258", "OIZSB")
+_COMO_DIGITO = str.maketrans("OQDILZSBG", "000112586")
+# Mercosul: a letra na 5ª posição corresponde ao dígito da placa antiga (A=0 ... J=9)
+_MERCOSUL = str.maketrans("ABCDEFGHIJ", "0123456789")
+
+
+def normalize_plate(placa):
+    # Maiúsculas, sem hífen/espaços: "abc-1234" -> "ABC1234"
+    return _ALFANUMERICO.sub("", placa.upper())
+
+
+def plate_key(placa):
+    """Chave de busca de uma placa (ou do começo de uma placa).
+
+    Antiga (ABC1234) e Mercosul (ABC1C34) caem na mesma chave. Nas posições
+    de letra, dígitos parecidos viram letras (0 -> O, 1 -> I...) e nas de
+    dígito o contrário, corrigindo as confusões mais comuns do OCR.
+    """
+    placa = normalize_plate(placa)
+    if len(placa) > 7:
+        return placa
+    letras = placa[:3].translate(_COMO_LETRA)
+    digitos = placa[3:4].translate(_COMO_DIGITO)
+    if len(placa) > 4:
+        digitos += placa[4].translate(_MERCOSUL).translate(_COMO_DIGITO)
+    digitos += placa[5:].translate(_COMO_DIGITO)
+    return letras + digitos
+
+
+def _vizinhas(chave):
+    # Todas as strings a uma edição (troca, remoção ou inserção) de distância
+    for i in range(len(chave)):
+        yield chave[:i] + chave[i + 1:]
+        for c in _ALFABETO:
+            if c != chave[i]:
+                yield chave[:i] + c + chave[i + 1:]
+    for i in range(len(chave) + 1):
+        for c in _ALFABETO:
+            yield chave[:i] + c + chave[i:]
+
+
+class PlateIndex:
+    """Índice de placas do pátio e do histórico para a busca do atendente.
+
+    As chaves normalizadas ficam numa lista ordenada: a busca por prefixo é
+    uma busca binária, e a busca tolerante a erros testa como prefixo cada
+    variação da consulta a uma edição de distância.
+    """
+
+    def __init__(self):
+        self._chaves = []
+        # chave -> {placa: última saída (None = no pátio)}
+        self._placas = {}
+        # Placas no pátio em ordem: a busca vazia devolve o começo da lista
+        self._ativas = []
+
+    def __len__(self):
+        return sum(len(placas) for placas in self._placas.values())
+
+    def _entrada(self, placa):
+        chave = plate_key(placa)
+        placas = self._placas.get(chave)
+        if placas is None:
+            placas = self._placas[chave] = {}
+            insort(self._chaves, chave)
+        return placas
+
+    def check_in(self, placa):
+        self._entrada(placa)[placa] = None
+        i = bisect_left(self._ativas, placa)
+        if i == len(self._ativas) or self._ativas[i] != placa:
+            self._ativas.insert(i, placa)
+
+    def check_out(self, placa, saida):
+        self._entrada(placa)[placa] = saida
+        i = bisect_left(self._ativas, placa)
+        if i < len(self._ativas) and self._ativas[i] == placa:
+            del self._ativas[i]
+
+    def seen(self, placa, saida):
+        # Registro histórico (importação/carga): não tira do pátio quem está nele
+        placas = self._entrada(placa)
+        if placa in placas:
+            anterior = placas[placa]
+            if anterior is None or anterior >= saida:
+                return
+        placas[placa] = saida
+
+    def seen_many(self, registros):
+        # Um bloco de registros históricos [(placa, saída)]: as chaves novas
+        # entram de uma vez, com uma ordenação só (timsort junta as duas partes
+        # já ordenadas em tempo linear)
+        novas = []
+        for placa, saida in registros:
+            chave = plate_key(placa)
+            placas = self._placas.get(chave)
+            if placas is None:
+                placas = self._placas[chave] = {}
+                novas.append(chave)
+            anterior = placas.get(placa, saida)
+            if anterior is not None and anterior <= saida:
+                placas[placa] = saida
+        if novas:
+            novas.sort()
+            self._chaves.extend(novas)
+            self._chaves.sort()
+
+    def load(self, registros):
+        # Carga inicial em lote [(placa, última saída ou None)]: ordena as chaves
+        # uma vez só em vez de inserir uma a uma
+        ativas = set(self._ativas)
+        for placa, saida in registros:
+            placas = self._placas.setdefault(plate_key(placa), {})
+            if saida is None:
+                ativas.add(placa)
+            elif placas.get(placa, saida) is None:
+                continue
+            placas[placa] = saida
+        self._chaves = sorted(self._placas)
+        self._ativas = sorted(ativas)
+
+    def _prefixo(self, prefixo, limite):
+        i = bisect_left(self._chaves, prefixo)
+        resultado = []
+        while i < len(self._chaves) and len(resultado) < limite and self._chaves[i].startswith(prefixo):
+            resultado.append(self._chaves[i])
+            i += 1
+        return resultado
+
+    def search(self, consulta, k=TOP_K):
+        # [(placa, última saída ou None)]: primeiro as chaves que começam com a
+        # consulta, depois as que diferem em um caractere; no pátio antes do histórico
+        chave = plate_key(consulta)
+        if not chave:
+            return [(placa, None) for placa in self._ativas[:k]]
+
+        exatas = self._prefixo(chave, k)
+        aproximadas = []
+        if len(exatas) < k and len(chave) >= MINIMO_APROXIMADA:
+            vistas = set(exatas)
+            candidatas = set()
+            # As variações são normalizadas de novo: uma letra que faltava
+            # muda a posição (e a correção) dos caracteres seguintes
+            for vizinha in {plate_key(v) for v in _vizinhas(normalize_plate(consulta))}:
+                candidatas.update(c for c in self._prefixo(vizinha, k) if c not in vistas)
+            aproximadas = sorted(candidatas)
+
+        resultado = []
+        for distancia, chaves in enumerate((exatas, aproximadas)):
+            for c in chaves:
+                for placa, saida in self._placas[c].items():
+                    resultado.append((distancia, saida is not None, c, placa, saida))
+        resultado.sort(key=lambda r: r[:4])
+        return [(placa, saida) for _, _, _, placa, saida in resultado[:k]]
@@ -0,0 +1,320 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+import asyncio
+import multiprocessing
+import os
+import threading
+
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from lazy import LazyModule
+from occupancy import LotError
+from storage import OPERADOR_PADRAO, load_report_rows
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+PERIODOS = {"diario": "Diário", "turno": "Turno", "mensal": "Mensal"}
+# Turnos de HORAS_TURNO horas: (nome, hora de início); o da noite vira o dia
+TURNOS = [("Manhã", 6), ("Tarde", 14), ("Noite", 22)]
+HORAS_TURNO = 8
+
+# Faixas de permanência: (limite em horas, rótulo); a última não tem limite
+FAIXAS_PERMANENCIA = [
+    (0.5, "Até 30 min"),
+    (1, "30 min a 1 h"),
+    (2, "1 a 2 h"),
+    (4, "2 a 4 h"),
+    (8, "4 a 8 h"),
+    (24, "8 a 24 h"),
+    (float("inf"), "Mais de 24 h"),
+]
+
+# Processos do pool de relatórios, compartilhado por todas as unidades
+PROCESSOS = min(4, os.cpu_count() or 1)
+# Trechos diários guardados por unidade (um ano cabe com folga)
+TRECHOS_EM_CACHE = 400
+
+
+class ReportError(LotError):
+    pass
+
+
+def report_period(tipo, dia, turno=None):
+    # [inicio, fim) do relatório `tipo` que contém o dia (e o turno)
+    inicio = datetime(dia.year, dia.month, dia.day)
+    if tipo == "diario":
+        return inicio, inicio + timedelta(days=1)
+    if tipo == "turno":
+        horas = dict(TURNOS).get(turno)
+        if horas is None:
+            raise ReportError(f"Turno {turno} não existe!")
+        inicio += timedelta(hours=horas)
+        return inicio, inicio + timedelta(hours=HORAS_TURNO)
+    if tipo == "mensal":
+        inicio = inicio.replace(day=1)
+        return inicio, (inicio + timedelta(days=32)).replace(day=1)
+    raise ReportError(f"Relatório {tipo} não existe!")
+
+
+def split_days(inicio, fim):
+    # [inicio, fim) cortado nas meias-noites: cada trecho é a unidade do cache
+    trechos = []
+    while inicio < fim:
+        meia_noite = datetime(inicio.year, inicio.month, inicio.day) + timedelta(days=1)
+        trechos.append((inicio, min(meia_noite, fim)))
+        inicio = meia_noite
+    return trechos
+
+
+def _totals(chaves, valores):
+    # {chave: [saídas, receita]}
+    grupos = valores.groupby(chaves.to_numpy(), sort=False).agg(["count", "sum"])
+    return {chave: [int(n), float(soma)] for chave, (n, soma) in zip(grupos.index, grupos.to_numpy())}
+
+
+def summarize(df):
+    # Parcial de um trecho do histórico em tipos simples: volta do processo de
+    # relatório por pickle e se soma com os outros trechos em merge()
+    entradas = pd.to_datetime(df["Entrada"], format="ISO8601")
+    saidas = pd.to_datetime(df["Saida"], format="ISO8601")
+    horas = (saidas - entradas).dt.total_seconds().to_numpy(dtype=np.float64) / 3600
+    limites = [limite for limite, _ in FAIXAS_PERMANENCIA]
+    faixas = np.bincount(np.searchsorted(limites, horas), minlength=len(limites))
+    operadores = df["Operador"] if "Operador" in df else pd.Series(OPERADOR_PADRAO, index=df.index)
+    valores = df["Valor"].astype(np.float64)
+    return {
+        "saidas": len(df),
+        "receita": float(valores.sum()),
+        "horas": float(horas.sum()),
+        "por_tipo": _totals(df["Tipo"].astype(str), valores),
+        "por_operador": _totals(operadores.astype(str), valores),
+        "permanencia": faixas.tolist(),
+    }
+
+
+def summarize_db(caminho, inicio, fim):
+    # Executado num processo do pool: lê e agrega o trecho sem passar pelo app
+    return summarize(load_report_rows(caminho, inicio, fim))
+
+
+def merge(parciais):
+    total = {"saidas": 0, "receita": 0.0, "horas": 0.0, "por_tipo": {}, "por_operador": {},
+             "permanencia": [0] * len(FAIXAS_PERMANENCIA)}
+    for parcial in parciais:
+        total["saidas"] += parcial["saidas"]
+        total["receita"] += parcial["receita"]
+        total["horas"] += parcial["horas"]
+        for campo in ("por_tipo", "por_operador"):
+            for chave, (n, receita) in parcial[campo].items():
+                atual = total[campo].setdefault(chave, [0, 0.0])
+                atual[0] += n
+                atual[1] += receita
+        total["permanencia"] = [a + b for a, b in zip(total["permanencia"], parcial["permanencia"])]
+    return total
+
+
+class Report:
+    # Relatório pronto; `em_cache` = trechos que não precisaram ser calculados
+    __slots__ = ("tipo", "inicio", "fim", "totais", "pico", "pico_em", "trechos", "em_cache")
+
+    def __init__(self, tipo, inicio, fim, totais, pico, pico_em, trechos, em_cache):
+        self.tipo = tipo
+        self.inicio = inicio
+        self.fim = fim
+        self.totais = totais
+        self.pico = pico
+        self.pico_em = pico_em
+        self.trechos = trechos
+        self.em_cache = em_cache
+
+    @property
+    def ticket_medio(self):
+        return self.totais["receita"] / self.totais["saidas"] if self.totais["saidas"] else 0.0
+
+    @property
+    def permanencia_media(self):
+        return self.totais["horas"] / self.totais["saidas"] if self.totais["saidas"] else 0.0
+
+    def _ranking(self, campo, nome):
+        linhas = sorted(self.totais[campo].items(), key=lambda item: item[1][1], reverse=True)
+        return pd.DataFrame([(chave, n, receita) for chave, (n, receita) in linhas], columns=[nome, "Saídas", "Receita"])
+
+    def revenue_by_type(self):
+        return self._ranking("por_tipo", "Tipo")
+
+    def operators(self):
+        return self._ranking("por_operador", "Operador")
+
+    def dwell_times(self):
+        total = max(self.totais["saidas"], 1)
+        return pd.DataFrame(
+            [(rotulo, n, 100 * n / total) for (_, rotulo), n in zip(FAIXAS_PERMANENCIA, self.totais["permanencia"])],
+            columns=["Permanência", "Saídas", "%"],
+        )
+
+    def as_json(self):
+        return {
+            "tipo": self.tipo,
+            "inicio": self.inicio.isoformat(),
+            "fim": self.fim.isoformat(),
+            "saidas": self.totais["saidas"],
+            "receita": self.totais["receita"],
+            "ticket_medio": self.ticket_medio,
+            "permanencia_media_horas": self.permanencia_media,
+            "pico_ocupacao": self.pico,
+            "pico_em": self.pico_em.isoformat() if self.pico_em is not None else None,
+            "receita_por_tipo": {tipo: {"saidas": n, "receita": r} for tipo, (n, r) in self.totais["por_tipo"].items()},
+            "por_operador": {op: {"saidas": n, "receita": r} for op, (n, r) in self.totais["por_operador"].items()},
+            "permanencia": {rotulo: n for (_, rotulo), n in zip(FAIXAS_PERMANENCIA, self.totais["permanencia"])},
+        }
+
+
+class ReportPool:
+    """Pool de processos dos relatórios, criado no primeiro uso.
+
+    Os processos são iniciados com spawn: o processo do app tem threads (a do
+    SQLite, a do relógio) e um fork com threads ativas pode travar.
+    """
+
+    def __init__(self, processos=PROCESSOS):
+        self.processos = processos
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.processos, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+POOL = ReportPool()
+
+
+class ReportService:
+    """Relatórios diário, de turno e mensal de uma unidade, fora do loop de eventos.
+
+    O período é cortado em trechos de no máximo um dia. Cada trecho é lido e
+    agregado por um processo do pool (direto do SQLite, com PARKING_DB) e os
+    parciais são somados aqui. Trechos já encerrados ficam em cache pela faixa
+    [inicio, fim), então o mês reaproveita os dias já calculados e repetir um
+    relatório não lê o histórico de novo. Uma saída atrasada ou uma importação
+    descarta os trechos afetados. O pico de ocupação vem das séries
+    pré-agregadas do pátio, não do histórico.
+    """
+
+    def __init__(self, lot, caminho=None, pool=POOL, max_trechos=TRECHOS_EM_CACHE):
+        self.lot = lot
+        self.caminho = caminho
+        self.pool = pool
+        self.max_trechos = max_trechos
+        self._cache = OrderedDict()
+        # Maior fim entre os trechos guardados: saídas depois dele (as ao vivo)
+        # não invalidam nada
+        self._fim_cache = None
+        # Muda a cada invalidação: parciais calculados antes não entram no cache
+        self._geracao = 0
+        lot.subscribe(self._on_event)
+
+    def _on_event(self, evento):
+        if evento.tipo == "importacao":
+            self._geracao += 1
+            self._cache.clear()
+        elif evento.tipo == "saida" and self._fim_cache is not None and evento.saida < self._fim_cache:
+            self._geracao += 1
+            for trecho in [t for t in self._cache if t[0] <= evento.saida < t[1]]:
+                del self._cache[trecho]
+
+    def _guardar(self, trecho, parcial):
+        self._cache[trecho] = parcial
+        self._cache.move_to_end(trecho)
+        while len(self._cache) > self.max_trechos:
+            self._cache.popitem(last=False)
+        if self._fim_cache is None or trecho[1] > self._fim_cache:
+            self._fim_cache = trecho[1]
+
+    def _tarefa(self, trecho):
+        # (função, *argumentos) que o processo vai executar para o trecho
+        if self.caminho:
+            return (summarize_db, self.caminho, *trecho)
+        # Sem banco o histórico inteiro está na memória: o trecho segue por pickle
+        blocos = list(self.lot.historico.iter_rows(*trecho))
+        if not blocos:
+            return (summarize, pd.DataFrame({c: [] for c in ("Tipo", "Entrada", "Saida", "Valor")}))
+        return (summarize, pd.concat(blocos, ignore_index=True))
+
+    def _peak(self, inicio, fim):
+        # (pico, início do intervalo do pico) pelas séries horárias, ou diárias
+        # para períodos que já saíram da retenção das horárias
+        if fim <= inicio:
+            return 0, None
+        with self.lot.locked():
+            hora = self.lot.series.rollups["hora"]
+            primeira = hora.first_key(datetime.now())
+            granularidade = "hora" if primeira is None or hora.key(inicio) >= primeira else "dia"
+            serie = self.lot.series.series(granularidade, inicio, fim - timedelta(microseconds=1))
+        i = int(serie["Pico"].to_numpy().argmax())
+        return int(serie["Pico"].iloc[i]), serie["Inicio"].iloc[i].to_pydatetime()
+
+    async def build(self, tipo, inicio, fim, progresso=None):
+        # `progresso(feitos, total)` é chamado a cada trecho pronto
+        agora = datetime.now()
+        trechos = split_days(inicio, fim)
+        if self.lot.storage is not None:
+            # Saídas ainda na fila de escrita entram no relatório
+            await asyncio.to_thread(self.lot.storage.flush)
+        geracao = self._geracao
+        loop = asyncio.get_running_loop()
+        parciais = {}
+        pendentes = {}
+        for trecho in trechos:
+            parcial = self._cache.get(trecho)
+            if parcial is not None:
+                self._cache.move_to_end(trecho)
+                parciais[trecho] = parcial
+            else:
+                pendentes[loop.run_in_executor(self.pool.executor(), *self._tarefa(trecho))] = trecho
+        em_cache = len(parciais)
+        if progresso is not None:
+            progresso(len(parciais), len(trechos))
+        try:
+            while pendentes:
+                prontos, _ = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+                for futuro in prontos:
+                    trecho = pendentes.pop(futuro)
+                    parciais[trecho] = futuro.result()
+                    if trecho[1] <= agora and geracao == self._geracao:
+                        self._guardar(trecho, parciais[trecho])
+                if progresso is not None:
+                    progresso(len(parciais), len(trechos))
+        finally:
+            # Relatório cancelado (sessão fechada): trechos na fila não rodam
+            for futuro in pendentes:
+                futuro.cancel()
+        pico, pico_em = self._peak(inicio, min(fim, agora))
+        return Report(tipo, inicio, fim, merge(parciais[t] for t in trechos), pico, pico_em, len(trechos), em_cache)
+
+    def routes(self):
+        return [Route("/relatorios", self._get_relatorio, methods=["GET"])]
+
+    async def _get_relatorio(self, request):
+        # ?tipo=diario|turno|mensal&data=AAAA-MM-DD[&turno=Manhã]
+        consulta = request.query_params
+        try:
+            dia = date.fromisoformat(consulta["data"]) if "data" in consulta else date.today()
+            inicio, fim = report_period(consulta.get("tipo", "diario"), dia, consulta.get("turno"))
+        except ValueError:
+            return JSONResponse({"erro": "'data' deve estar em ISO 8601 (AAAA-MM-DD)"}, status_code=400)
+        except ReportError as e:
+            return JSONResponse({"erro": str(e)}, status_code=400)
+        relatorio = await self.build(consulta.get("tipo", "diario"), inicio, fim)
+        return JSONResponse(relatorio.as_json())
@@ -0,0 +1,257 @@
+from datetime import datetime, timedelta
+import heapq
+import uuid
+
+from occupancy import LotError
+
+# Granularidade das reservas (minutos): o início é arredondado para baixo e o
+# fim para cima
+MINUTOS_POR_INTERVALO = 15
+# Até quantos dias à frente se pode reservar
+HORIZONTE_DIAS = 180
+# A origem das árvores é reposicionada quando fica mais que isso para trás
+FOLGA_DIAS = 7
+# Entradas avulsas não podem usar vagas reservadas para as próximas horas
+PROTECAO_HORAS = 2
+# Chegada antecipada que ainda conta como a reserva
+ANTECEDENCIA_MINUTOS = 30
+# Atraso tolerado; depois disso a reserva expira e a vaga volta a ficar livre
+TOLERANCIA_MINUTOS = 30
+
+_PASSO = timedelta(minutes=MINUTOS_POR_INTERVALO)
+
+
+class ReservationError(LotError):
+    pass
+
+
+class ReservedCapacityError(LotError):
+    def __init__(self):
+        super().__init__("As vagas livres estão reservadas!")
+
+
+class Reservation:
+    # Reserva de uma vaga numa zona; `situacao`: ativa, utilizada, cancelada ou expirada
+    __slots__ = ("codigo", "placa", "nome", "zona", "inicio", "fim", "situacao")
+
+    def __init__(self, codigo, placa, nome, zona, inicio, fim, situacao="ativa"):
+        self.codigo = codigo
+        self.placa = placa
+        self.nome = nome
+        self.zona = zona
+        self.inicio = inicio
+        self.fim = fim
+        self.situacao = situacao
+
+    @property
+    def prazo(self):
+        # Até quando o veículo pode chegar
+        return min(self.inicio + timedelta(minutes=TOLERANCIA_MINUTOS), self.fim)
+
+    def as_tuple(self):
+        return (self.codigo, self.placa, self.nome, self.zona, self.inicio, self.fim)
+
+
+class CommitmentTree:
+    """Árvore de segmentos com soma em faixa e máximo em faixa.
+
+    Cada nó guarda o acréscimo aplicado ao seu intervalo inteiro e o máximo
+    dentro dele (já com o acréscimo). Nada é propagado para os filhos, então
+    somar numa faixa e consultar o máximo de uma faixa custam O(log n).
+    """
+
+    def __init__(self, tamanho):
+        n = 1
+        while n < tamanho:
+            n *= 2
+        self.tamanho = n
+        self._acrescimo = [0] * (2 * n)
+        self._maximo = [0] * (2 * n)
+
+    def add(self, inicio, fim, valor):
+        # Soma `valor` nas posições [inicio, fim)
+        if inicio < fim:
+            self._add(1, 0, self.tamanho, inicio, fim, valor)
+
+    def _add(self, no, esquerda, direita, inicio, fim, valor):
+        if inicio <= esquerda and direita <= fim:
+            self._acrescimo[no] += valor
+            self._maximo[no] += valor
+            return
+        meio = (esquerda + direita) // 2
+        if inicio < meio:
+            self._add(2 * no, esquerda, meio, inicio, fim, valor)
+        if fim > meio:
+            self._add(2 * no + 1, meio, direita, inicio, fim, valor)
+        self._maximo[no] = max(self._maximo[2 * no], self._maximo[2 * no + 1]) + self._acrescimo[no]
+
+    def peak(self, inicio, fim):
+        # Máximo em [inicio, fim); faixa vazia = 0
+        if inicio >= fim:
+            return 0
+        return self._peak(1, 0, self.tamanho, inicio, fim)
+
+    def _peak(self, no, esquerda, direita, inicio, fim):
+        if inicio <= esquerda and direita <= fim:
+            return self._maximo[no]
+        meio = (esquerda + direita) // 2
+        # As contagens nunca são negativas, então 0 serve de ponto de partida
+        maior = 0
+        if inicio < meio:
+            maior = self._peak(2 * no, esquerda, meio, inicio, fim)
+        if fim > meio:
+            maior = max(maior, self._peak(2 * no + 1, meio, direita, inicio, fim))
+        return maior + self._acrescimo[no]
+
+
+class ReservationBook:
+    """Reservas pendentes do pátio, com o compromisso por zona ao longo do tempo.
+
+    Cada zona tem uma `CommitmentTree` com quantas vagas estão reservadas em
+    cada intervalo de 15 minutos (mais uma árvore para o pátio todo). "Cabe
+    mais uma reserva entre T1 e T2?" e "qual o pico reservado nas próximas N
+    horas?" são uma consulta de máximo, sem percorrer as reservas. Só as
+    reservas ativas ficam aqui; utilizadas, canceladas e expiradas saem.
+    """
+
+    def __init__(self, zonas, agora=None):
+        self.zonas = zonas
+        self._zonas = {zona.nome: i for i, zona in enumerate(zonas)}
+        self._ativas = {}
+        # placa -> {códigos}
+        self._por_placa = {}
+        # (prazo, código) das ativas; as que saíram antes do prazo ficam até
+        # chegar a vez delas e são descartadas então
+        self._prazos = []
+        self._reposicionar(agora or datetime.now())
+
+    def __len__(self):
+        return len(self._ativas)
+
+    def __iter__(self):
+        return iter(self._ativas.values())
+
+    def get(self, codigo):
+        return self._ativas.get(codigo)
+
+    def zone(self, nome):
+        indice = self._zonas.get(nome)
+        if indice is None:
+            raise ReservationError(f"Zona {nome} não existe!")
+        return self.zonas[indice]
+
+    def _reposicionar(self, agora):
+        # Recria as árvores a partir da meia-noite de hoje com as reservas ativas
+        self.origem = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+        intervalos = (HORIZONTE_DIAS + FOLGA_DIAS + 1) * timedelta(days=1) // _PASSO
+        self._arvores = [CommitmentTree(intervalos) for _ in self.zonas]
+        self._total = CommitmentTree(intervalos)
+        for reserva in self._ativas.values():
+            self._aplicar(reserva, 1)
+
+    def _posicoes(self, inicio, fim):
+        # [i, j) dos intervalos que cobrem [inicio, fim), limitados à árvore
+        i = max((inicio - self.origem) // _PASSO, 0)
+        j = -((self.origem - fim) // _PASSO)
+        return i, min(max(j, 0), self._total.tamanho)
+
+    def _aplicar(self, reserva, valor):
+        i, j = self._posicoes(reserva.inicio, reserva.fim)
+        self._arvores[self._zonas[reserva.zona]].add(i, j, valor)
+        self._total.add(i, j, valor)
+
+    def add(self, reserva):
+        self._ativas[reserva.codigo] = reserva
+        self._por_placa.setdefault(reserva.placa, set()).add(reserva.codigo)
+        heapq.heappush(self._prazos, (reserva.prazo, reserva.codigo))
+        self._aplicar(reserva, 1)
+
+    def load(self, reservas):
+        # Carga na partida; devolve as reservas de zonas que não existem mais,
+        # já marcadas como canceladas (o chamador grava a nova situação)
+        orfas = []
+        for reserva in reservas:
+            if reserva.zona in self._zonas:
+                self.add(reserva)
+            else:
+                reserva.situacao = "cancelada"
+                orfas.append(reserva)
+        return orfas
+
+    def remove(self, codigo, situacao):
+        reserva = self._ativas.pop(codigo)
+        codigos = self._por_placa[reserva.placa]
+        codigos.discard(codigo)
+        if not codigos:
+            del self._por_placa[reserva.placa]
+        self._aplicar(reserva, -1)
+        reserva.situacao = situacao
+        return reserva
+
+    def expire(self, agora):
+        # Tira as reservas cujo prazo de chegada passou; devolve as expiradas
+        if agora - self.origem > timedelta(days=FOLGA_DIAS):
+            self._reposicionar(agora)
+        expiradas = []
+        while self._prazos and self._prazos[0][0] <= agora:
+            _, codigo = heapq.heappop(self._prazos)
+            if codigo in self._ativas:
+                expiradas.append(self.remove(codigo, "expirada"))
+        return expiradas
+
+    def for_plate(self, placa, agora):
+        # Reserva ativa da placa que vale para uma chegada em `agora`
+        antecedencia = timedelta(minutes=ANTECEDENCIA_MINUTOS)
+        for codigo in self._por_placa.get(placa, ()):
+            reserva = self._ativas[codigo]
+            if reserva.inicio - antecedencia <= agora < reserva.fim:
+                return reserva
+        return None
+
+    def peak(self, inicio, fim, zona=None):
+        # Máximo de vagas reservadas ao mesmo tempo em [inicio, fim)
+        arvore = self._total if zona is None else self._arvores[self._zonas[zona]]
+        return arvore.peak(*self._posicoes(inicio, fim))
+
+    def walk_in_zone(self, agora, ocupadas):
+        # Primeira zona com vaga que não esteja prometida a uma reserva nas
+        # próximas PROTECAO_HORAS; None se todas as livres estão reservadas
+        fim = agora + timedelta(hours=PROTECAO_HORAS)
+        for i, zona in enumerate(self.zonas):
+            livres = zona.vagas - ocupadas(zona)
+            if livres > 0 and livres > self._arvores[i].peak(*self._posicoes(agora, fim)):
+                return zona
+        return None
+
+    def capacity(self, zona, inicio, fim, agora, ocupadas):
+        # Quantas reservas ainda cabem na zona em [inicio, fim); `ocupadas(zona)`
+        # são as vagas ocupadas agora, que contam quando o início está perto
+        zona = self.zone(zona)
+        limite = zona.vagas
+        if inicio < agora + timedelta(hours=PROTECAO_HORAS):
+            limite -= ocupadas(zona)
+        return max(limite - self.peak(inicio, fim, zona.nome), 0)
+
+    def book(self, placa, nome, zona, inicio, fim, agora, ocupadas):
+        # Valida e registra uma reserva nova
+        if fim <= inicio:
+            raise ReservationError("O fim da reserva deve ser depois do início!")
+        if fim <= agora:
+            raise ReservationError("A reserva já terminou!")
+        if fim > agora + timedelta(days=HORIZONTE_DIAS):
+            raise ReservationError(f"Reservas só até {HORIZONTE_DIAS} dias à frente!")
+        for codigo in self._por_placa.get(placa, ()):
+            outra = self._ativas[codigo]
+            if outra.inicio < fim and inicio < outra.fim:
+                raise ReservationError(f"A placa {placa} já tem a reserva {codigo} neste período!")
+        if not self.capacity(zona, inicio, fim, agora, ocupadas):
+            raise ReservationError(f"Sem vagas para reservar na zona {zona} neste período!")
+
+        reserva = Reservation(uuid.uuid4().hex[:10].upper(), placa, nome, zona, inicio, fim)
+        self.add(reserva)
+        return reserva
+
+    def upcoming(self, limite=None):
+        # Reservas ativas em ordem de início
+        reservas = sorted(self._ativas.values(), key=lambda r: (r.inicio, r.codigo))
+        return reservas if limite is None else reservas[:limite]
@@ -0,0 +1,191 @@
+from datetime import datetime
+from urllib.parse import parse_qs
+import asyncio
+import json
+import os
+import re
+
+from shiny import reactive
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+from alerts import PERMANENCIA_MAXIMA_HORAS, AlertScheduler
+from booking import ReservationAPI
+from ingest import GateIngestor, parse_moment
+from lot import LotState
+from occupancy import LotError
+from reports import ReportService
+from storage import SQLiteStorage
+from tariff import TariffRule, TariffTable
+
+_CAMINHO_LOTE = re.compile(r"/lotes/([^/]+)")
+
+
+class ConfigError(ValueError):
+    # Configuração de unidades inválida (PARKING_LOTS / PARKING_LOTS_ONLY)
+    pass
+
+
+def tariff_from_config(dados):
+    # {"primeira_hora": 5, "hora": 5, ..., "por_tipo": {"Moto": {...}}, "noite_inicio": 22}
+    dados = dict(dados)
+    por_tipo = {tipo: TariffRule(**regra) for tipo, regra in dados.pop("por_tipo", {}).items()}
+    noite = {k: dados.pop(k) for k in ("noite_inicio", "noite_fim") if k in dados}
+    return TariffTable(TariffRule(**dados), por_tipo, **noite)
+
+
+def load_lots_config(caminho, somente=None):
+    """Lê a lista de unidades de um arquivo JSON.
+
+    Cada unidade: {"id", "nome", "zonas": [["Térreo", 40], ...], "tarifa": {...},
+    "banco": "centro.db", "permanencia_maxima_horas": 24}. Com `somente`, só
+    essas unidades ficam neste processo; um id de `somente` que não está no
+    arquivo é um `ConfigError`.
+    """
+    with open(caminho) as arquivo:
+        unidades = json.load(arquivo)
+    base = os.path.dirname(os.path.abspath(caminho))
+    configs = []
+    for unidade in unidades:
+        if somente and unidade["id"] not in somente:
+            continue
+        banco = unidade.get("banco")
+        configs.append({
+            "id": unidade["id"],
+            "nome": unidade.get("nome", unidade["id"]),
+            "zonas": [tuple(z) for z in unidade["zonas"]],
+            "tarifa": tariff_from_config(unidade["tarifa"]),
+            "banco": os.path.join(base, banco) if banco else None,
+            "permanencia_maxima_horas": unidade.get("permanencia_maxima_horas", PERMANENCIA_MAXIMA_HORAS),
+        })
+    if somente:
+        desconhecidas = sorted(set(somente) - {unidade["id"] for unidade in unidades})
+        if desconhecidas:
+            raise ConfigError(f"PARKING_LOTS_ONLY: unidades que não estão em {caminho}: {', '.join(desconhecidas)}")
+    return configs
+
+
+class LotShard:
+    """Uma unidade: estado do pátio, valores reativos (versão, alertas), relatórios e APIs."""
+
+    def __init__(self, id, nome, zonas, tarifa, banco=None, permanencia_maxima_horas=PERMANENCIA_MAXIMA_HORAS):
+        self.id = id
+        self.nome = nome
+        self.storage = SQLiteStorage(banco) if banco else None
+        self.lot = LotState(sum(vagas for _, vagas in zonas), tarifa, self.storage, zonas)
+        # Mesmo esquema do modo de uma unidade: um valor reativo por pátio avisa
+        # todas as sessões daquele pátio
+        self.versao = reactive.Value(self.lot.versao, name=f"versao_{id}")
+        self.lot.subscribe(lambda evento: self.versao.set(evento.versao))
+        self.gates = GateIngestor(self.lot)
+        self.booking = ReservationAPI(self.lot)
+        self.reports = ReportService(self.lot, banco)
+        # Alertas de prazo: cada lote vencido vira um valor reativo que as
+        # sessões da unidade mostram como notificação
+        self.alerts = AlertScheduler(self.lot, permanencia_maxima_horas)
+        self.alertas = reactive.Value((), name=f"alertas_{id}")
+        self.alerts.subscribe(lambda alertas: self.alertas.set(tuple(alertas)))
+
+    def api_routes(self):
+        return (
+            self.gates.routes() + self.booking.routes() + self.reports.routes() + self.alerts.routes()
+            + [Route("/ocupacao", self._get_ocupacao, methods=["GET"])]
+        )
+
+    async def _get_ocupacao(self, request):
+        # ?momento=<ISO 8601>: veículos no pátio naquele momento (diário + snapshots)
+        try:
+            momento = parse_moment(request.query_params["momento"])
+        except (KeyError, ValueError):
+            return JSONResponse({"erro": "Parâmetro 'momento' obrigatório (ISO 8601)"}, status_code=400)
+        try:
+            # Lê o banco numa thread para não travar o loop
+            base, registros = await asyncio.to_thread(self.lot.state_at, momento)
+        except LotError as e:
+            return JSONResponse({"erro": str(e)}, status_code=404)
+        return JSONResponse({
+            "momento": momento.isoformat(),
+            "snapshot": base.isoformat(),
+            "veiculos": [
+                {"vaga": r.vaga, "placa": r.placa, "nome": r.nome, "modelo": r.modelo,
+                 "cor": r.cor, "tipo": r.tipo, "entrada": r.entrada.isoformat()}
+                for r in registros
+            ],
+        })
+
+    def close(self):
+        if self.storage is not None:
+            self.storage.close()
+
+
+class ShardRegistry:
+    """Unidades servidas por este processo.
+
+    Uma sessão escolhe a unidade pelo caminho (/lotes/<id>/) ou pelo parâmetro
+    `?lote=<id>`; sem nenhum dos dois, vale a primeira unidade.
+    """
+
+    def __init__(self, configs):
+        self.shards = {}
+        for config in configs:
+            shard = LotShard(**config)
+            self.shards[shard.id] = shard
+        if not self.shards:
+            raise ConfigError("Nenhuma unidade para este processo: confira PARKING_LOTS e PARKING_LOTS_ONLY")
+        self.padrao = next(iter(self.shards.values()))
+
+    def __iter__(self):
+        return iter(self.shards.values())
+
+    def __len__(self):
+        return len(self.shards)
+
+    def resolve(self, caminho, consulta):
+        # Devolve None para uma unidade que não existe neste processo
+        encontrado = _CAMINHO_LOTE.search(caminho or "")
+        if encontrado:
+            return self.shards.get(encontrado.group(1))
+        lote = parse_qs((consulta or "").lstrip("?")).get("lote")
+        if lote:
+            return self.shards.get(lote[0])
+        return self.padrao
+
+    def for_request(self, request):
+        return self.resolve(request.url.path, request.url.query)
+
+    def kpis(self, agora=None):
+        # Indicadores de cada unidade e o total deste processo
+        agora = agora or datetime.now()
+        lotes = []
+        for shard in self:
+            with shard.lot.locked():
+                s = shard.lot.kpis.snapshot(agora)
+            lotes.append({
+                "id": shard.id, "nome": shard.nome, "capacidade": s.capacidade, "ativos": s.ativos,
+                "livres": s.livres, "receita_dia": s.receita_dia, "saidas_dia": s.saidas_dia,
+            })
+        return {"dia": agora.date().isoformat(), "lotes": lotes, "total": sum_kpis(lotes)}
+
+    def routes(self, app):
+        # /api/kpis, APIs das cancelas e das reservas por unidade e o app em
+        # /lotes/<id>/; a unidade padrão também responde em /api e na raiz
+        async def kpis(request):
+            return JSONResponse(self.kpis())
+
+        rotas = [Route("/api/kpis", kpis, methods=["GET"])]
+        for shard in self:
+            rotas.append(Mount(f"/api/lotes/{shard.id}", routes=shard.api_routes()))
+        rotas.append(Mount("/api", routes=self.padrao.api_routes()))
+        for shard in self:
+            rotas.append(Mount(f"/lotes/{shard.id}", app=app))
+        rotas.append(Mount("/", app=app))
+        return rotas
+
+
+def sum_kpis(lotes):
+    total = {"capacidade": 0, "ativos": 0, "livres": 0, "receita_dia": 0.0, "saidas_dia": 0}
+    for lote in lotes:
+        for chave in total:
+            total[chave] += lote[chave]
+    total["ticket_medio"] = total["receita_dia"] / total["saidas_dia"] if total["saidas_dia"] else 0.0
+    return total
@@ -0,0 +1,395 @@
+from datetime import date, datetime
+import logging
+import queue
+import sqlite3
+import threading
+
+from history import COLUNAS_HISTORICO
+from lazy import LazyModule
+
+pd = LazyModule("pandas")
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS veiculos (
+    placa   TEXT PRIMARY KEY,
+    vaga    INTEGER NOT NULL,
+    nome    TEXT NOT NULL,
+    modelo  TEXT NOT NULL,
+    cor     TEXT NOT NULL,
+    tipo    TEXT NOT NULL,
+    entrada TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS historico (
+    id      INTEGER PRIMARY KEY,
+    nome    TEXT NOT NULL,
+    modelo  TEXT NOT NULL,
+    placa   TEXT NOT NULL,
+    cor     TEXT NOT NULL,
+    tipo    TEXT NOT NULL,
+    entrada TEXT NOT NULL,
+    saida   TEXT NOT NULL,
+    valor   REAL NOT NULL,
+    tempo   REAL NOT NULL,
+    operador TEXT NOT NULL DEFAULT 'Não informado'
+);
+CREATE INDEX IF NOT EXISTS idx_historico_saida ON historico (saida);
+CREATE TABLE IF NOT EXISTS reservas (
+    codigo   TEXT PRIMARY KEY,
+    placa    TEXT NOT NULL,
+    nome     TEXT NOT NULL,
+    zona     TEXT NOT NULL,
+    inicio   TEXT NOT NULL,
+    fim      TEXT NOT NULL,
+    situacao TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reservas_situacao ON reservas (situacao);
+CREATE TABLE IF NOT EXISTS eventos (
+    seq     INTEGER PRIMARY KEY,
+    momento TEXT NOT NULL,
+    evento  TEXT NOT NULL,
+    vaga    INTEGER NOT NULL,
+    nome    TEXT NOT NULL,
+    modelo  TEXT NOT NULL,
+    placa   TEXT NOT NULL,
+    cor     TEXT NOT NULL,
+    tipo    TEXT NOT NULL,
+    entrada TEXT NOT NULL,
+    tardio  INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_eventos_momento ON eventos (momento);
+CREATE INDEX IF NOT EXISTS idx_eventos_tardios ON eventos (seq) WHERE tardio = 1;
+CREATE TABLE IF NOT EXISTS snapshots (
+    id      INTEGER PRIMARY KEY,
+    momento TEXT NOT NULL,
+    seq     INTEGER NOT NULL,
+    estado  BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_momento ON snapshots (momento);
+"""
+
+# SQL fixo: o sqlite3 mantém as instruções preparadas em cache pelo texto
+SQL_ENTRADA = "INSERT INTO veiculos (placa, vaga, nome, modelo, cor, tipo, entrada) VALUES (?, ?, ?, ?, ?, ?, ?)"
+SQL_REMOVER = "DELETE FROM veiculos WHERE placa = ?"
+SQL_HISTORICO = (
+    "INSERT INTO historico (nome, modelo, placa, cor, tipo, entrada, saida, valor, tempo, operador) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+SQL_RESERVA = (
+    "INSERT INTO reservas (codigo, placa, nome, zona, inicio, fim, situacao) VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+SQL_SITUACAO_RESERVA = "UPDATE reservas SET situacao = ? WHERE codigo = ?"
+SQL_EVENTO = (
+    "INSERT INTO eventos (momento, evento, vaga, nome, modelo, placa, cor, tipo, entrada, tardio) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+# O snapshot cobre todos os eventos gravados antes dele na fila
+SQL_SNAPSHOT = "INSERT INTO snapshots (momento, seq, estado) VALUES (?, (SELECT COALESCE(MAX(seq), 0) FROM eventos), ?)"
+
+# Quem registrou a saída, quando ninguém foi informado (e nos bancos
+# criados antes da coluna existir)
+OPERADOR_PADRAO = "Não informado"
+
+# Commit em grupo: até LOTE_MAXIMO eventos ou INTERVALO_COMMIT segundos de espera
+LOTE_MAXIMO = 500
+INTERVALO_COMMIT = 0.05
+
+_FIM = object()
+
+
+def _texto(momento):
+    return momento.isoformat(sep=" ")
+
+
+def _periodo(inicio, fim):
+    condicoes, params = [], []
+    if inicio is not None:
+        condicoes.append("saida >= ?")
+        params.append(_texto(inicio))
+    if fim is not None:
+        condicoes.append("saida < ?")
+        params.append(_texto(fim))
+    return ("WHERE " + " AND ".join(condicoes)) if condicoes else "", params
+
+
+def _evento(evento, registro, momento, tardio):
+    return (SQL_EVENTO, (
+        _texto(momento), evento, registro.vaga, registro.nome, registro.modelo,
+        registro.placa, registro.cor, registro.tipo, _texto(registro.entrada), int(tardio),
+    ))
+
+
+def _executar(conn, operacoes):
+    for sql, params in operacoes:
+        # Lista de parâmetros = inserção em lote (executemany)
+        if isinstance(params, list):
+            conn.executemany(sql, params)
+        else:
+            conn.execute(sql, params)
+
+
+def _migrate(conn):
+    # Colunas acrescentadas depois da criação do banco
+    colunas = {linha[1] for linha in conn.execute("PRAGMA table_info(historico)")}
+    if "operador" not in colunas:
+        with conn:
+            conn.execute(f"ALTER TABLE historico ADD COLUMN operador TEXT NOT NULL DEFAULT '{OPERADOR_PADRAO}'")
+
+
+def connect(caminho):
+    conn = sqlite3.connect(caminho, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Com WAL, NORMAL só sincroniza no checkpoint: sem fsync a cada commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SQLiteStorage:
+    """Persistência do pátio e do histórico em SQLite (modo WAL).
+
+    As escritas vão para uma fila e uma thread dedicada as grava em
+    transações agrupadas, sem bloquear o loop de eventos do Shiny. Um item
+    que o banco recusa é registrado no log e descartado sozinho; a thread
+    continua gravando os demais.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._leitura = connect(caminho)
+        self._leitura.executescript(SCHEMA)
+        _migrate(self._leitura)
+        self._fila = queue.Queue()
+        # Itens da fila que o banco recusou (e foram descartados)
+        self.descartadas = 0
+        self._escritor = threading.Thread(target=self._gravar, name="sqlite-writer", daemon=True)
+        self._escritor.start()
+
+    def _gravar(self):
+        conn = connect(self.caminho)
+        fim = False
+        while not fim:
+            lote = [self._fila.get()]
+            # Junta o que chegar na janela de commit em uma única transação
+            try:
+                while len(lote) < LOTE_MAXIMO:
+                    lote.append(self._fila.get(timeout=INTERVALO_COMMIT))
+            except queue.Empty:
+                pass
+            if _FIM in lote:
+                fim = True
+                lote = [op for op in lote if op is not _FIM]
+            try:
+                self._gravar_lote(conn, lote)
+            except Exception:
+                log.exception("Falha inesperada na thread de gravação; %d itens perdidos", len(lote))
+            finally:
+                # Sempre: flush() espera por todos os itens da fila
+                for _ in range(len(lote) + fim):
+                    self._fila.task_done()
+        conn.close()
+
+    def _gravar_lote(self, conn, lote):
+        try:
+            with conn:
+                for operacoes in lote:
+                    _executar(conn, operacoes)
+            return
+        except Exception:
+            pass
+        # Um item com erro desfaz a transação do lote inteiro: os itens são
+        # regravados um a um e só o que falhar de novo é descartado
+        for operacoes in lote:
+            try:
+                with conn:
+                    _executar(conn, operacoes)
+            except Exception:
+                self.descartadas += 1
+                log.exception("Gravação descartada (%s)", operacoes[0][0].split(" (")[0])
+
+    def save_check_in(self, registro, tardio=False):
+        # A entrada vai para o diário de eventos na mesma transação
+        self._fila.put((
+            (SQL_ENTRADA, (
+                registro.placa, registro.vaga, registro.nome, registro.modelo,
+                registro.cor, registro.tipo, _texto(registro.entrada),
+            )),
+            _evento("entrada", registro, registro.entrada, tardio),
+        ))
+
+    def save_check_out(self, registro, saida, valor, horas, tardio=False, operador=OPERADOR_PADRAO):
+        # Cada item da fila vai inteiro para uma transação: a saída nunca fica
+        # gravada pela metade
+        self._fila.put((
+            (SQL_REMOVER, (registro.placa,)),
+            (SQL_HISTORICO, (
+                registro.nome, registro.modelo, registro.placa, registro.cor, registro.tipo,
+                _texto(registro.entrada), _texto(saida), valor, horas, operador,
+            )),
+            _evento("saida", registro, saida, tardio),
+        ))
+
+    def save_snapshot(self, momento, estado):
+        self._fila.put(((SQL_SNAPSHOT, (_texto(momento), estado)),))
+
+    @staticmethod
+    def history_rows(df):
+        # Linhas do banco para um bloco de histórico (a parte cara da gravação,
+        # separada para rodar fora de qualquer lock)
+        formato = "%Y-%m-%d %H:%M:%S.%f"
+        return list(zip(
+            df["Nome"].astype(str), df["Modelo"].astype(str), df["Placa"].astype(str),
+            df["Cor"].astype(str), df["Tipo"].astype(str),
+            df["Entrada"].dt.strftime(formato), df["Saida"].dt.strftime(formato),
+            df["Valor"].astype(float), df["Tempo"].astype(float),
+            [OPERADOR_PADRAO] * len(df),
+        ))
+
+    def save_history(self, df, linhas=None):
+        # Inserção em lote de registros já prontos (importação de histórico);
+        # `linhas` são as de history_rows(df), quando já foram montadas
+        if linhas is None:
+            linhas = self.history_rows(df)
+        self._fila.put(((SQL_HISTORICO, linhas),))
+
+    def save_reservation(self, reserva):
+        self._fila.put(((SQL_RESERVA, (
+            reserva.codigo, reserva.placa, reserva.nome, reserva.zona,
+            _texto(reserva.inicio), _texto(reserva.fim), reserva.situacao,
+        )),))
+
+    def save_reservation_status(self, reservas):
+        # Reservas que saíram de "ativa" (utilizadas, canceladas, expiradas)
+        self._fila.put(((SQL_SITUACAO_RESERVA, [(r.situacao, r.codigo) for r in reservas]),))
+
+    def flush(self):
+        self._fila.join()
+
+    def close(self):
+        self._fila.put(_FIM)
+        self._escritor.join()
+        self._leitura.close()
+
+    def load_vehicles(self):
+        cursor = self._leitura.execute(
+            "SELECT vaga, nome, modelo, placa, cor, tipo, entrada FROM veiculos"
+        )
+        return [
+            (vaga, nome, modelo, placa, cor, tipo, datetime.fromisoformat(entrada))
+            for vaga, nome, modelo, placa, cor, tipo, entrada in cursor
+        ]
+
+    def load_reservations(self):
+        # Reservas ainda ativas: (código, placa, nome, zona, início, fim)
+        cursor = self._leitura.execute(
+            "SELECT codigo, placa, nome, zona, inicio, fim FROM reservas WHERE situacao = 'ativa'"
+        )
+        return [
+            (codigo, placa, nome, zona, datetime.fromisoformat(inicio), datetime.fromisoformat(fim))
+            for codigo, placa, nome, zona, inicio, fim in cursor
+        ]
+
+    def journal_bounds(self):
+        # (momento do último evento, momento do último snapshot), None se não houver
+        evento, snapshot = self._leitura.execute(
+            "SELECT (SELECT MAX(momento) FROM eventos), (SELECT MAX(momento) FROM snapshots)"
+        ).fetchone()
+        return (
+            datetime.fromisoformat(evento) if evento else None,
+            datetime.fromisoformat(snapshot) if snapshot else None,
+        )
+
+    def load_snapshot(self, ate):
+        # (momento, seq, estado) do último snapshot em ou antes de `ate`, ou None
+        linha = self._leitura.execute(
+            "SELECT momento, seq, estado FROM snapshots WHERE momento <= ? ORDER BY momento DESC, id DESC LIMIT 1",
+            (_texto(ate),),
+        ).fetchone()
+        if linha is None:
+            return None
+        return datetime.fromisoformat(linha[0]), linha[1], linha[2]
+
+    def load_events(self, inicio, fim, depois_de):
+        # Eventos com seq > depois_de e momento até `fim`, na ordem em que
+        # aconteceram: os de (inicio, fim] pelo índice de momento e os tardios
+        # anteriores a `inicio` pelo índice parcial (poucos)
+        colunas = "momento, seq, evento, vaga, nome, modelo, placa, cor, tipo, entrada"
+        cursor = self._leitura.execute(
+            f"SELECT {colunas} FROM eventos WHERE momento > :inicio AND momento <= :fim AND seq > :seq "
+            f"UNION ALL SELECT {colunas} FROM eventos WHERE tardio = 1 AND seq > :seq AND momento <= :inicio "
+            "ORDER BY momento, seq",
+            {"inicio": _texto(inicio), "fim": _texto(fim), "seq": depois_de},
+        )
+        return [
+            (evento, vaga, nome, modelo, placa, cor, tipo, datetime.fromisoformat(entrada))
+            for _, _, evento, vaga, nome, modelo, placa, cor, tipo, entrada in cursor
+        ]
+
+    def load_history(self, inicio=None, fim=None):
+        # Saídas em [inicio, fim) em ordem cronológica; sem limites, o histórico inteiro
+        filtro, params = _periodo(inicio, fim)
+        df = pd.read_sql_query(
+            "SELECT nome, modelo, placa, cor, tipo, entrada, saida, valor, tempo "
+            f"FROM historico {filtro} ORDER BY saida",
+            self._leitura,
+            params=params,
+        )
+        df.columns = COLUNAS_HISTORICO
+        return df
+
+    def day_counts(self, inicio=None, fim=None):
+        # (dia, saídas) por dia de saída em [inicio, fim), sem ler as linhas
+        filtro, params = _periodo(inicio, fim)
+        cursor = self._leitura.execute(
+            f"SELECT substr(saida, 1, 10), COUNT(*) FROM historico {filtro} "
+            "GROUP BY substr(saida, 1, 10) ORDER BY 1",
+            params,
+        )
+        return [(datetime.fromisoformat(dia), saidas) for dia, saidas in cursor]
+
+    def plate_last_exits(self):
+        # (placa, última saída) de cada placa do histórico
+        cursor = self._leitura.execute("SELECT placa, MAX(saida) FROM historico GROUP BY placa")
+        return [(placa, datetime.fromisoformat(saida)) for placa, saida in cursor]
+
+    def bucket_totals(self, segundos, primeira=None):
+        # (intervalo, tipo, chegadas, saídas, receita) em intervalos de `segundos`
+        # desde a época; com `primeira`, tudo antes dela cai no intervalo primeira - 1
+        chave = "CAST(strftime('%s', {0}) AS INTEGER) / :segundos"
+        if primeira is not None:
+            chave = f"MAX({chave}, :primeira - 1)"
+        cursor = self._leitura.execute(
+            "SELECT intervalo, tipo, SUM(chegadas), SUM(saidas), SUM(receita) FROM ("
+            f"SELECT {chave.format('entrada')} AS intervalo, tipo, 1 AS chegadas, 0 AS saidas, 0.0 AS receita FROM historico "
+            f"UNION ALL SELECT {chave.format('saida')}, tipo, 0, 1, valor FROM historico "
+            f"UNION ALL SELECT {chave.format('entrada')}, tipo, 1, 0, 0.0 FROM veiculos"
+            ") GROUP BY intervalo, tipo",
+            {"segundos": segundos, "primeira": primeira},
+        )
+        return cursor.fetchall()
+
+    def day_totals(self, inicio):
+        # (data, receita, saídas) por dia de saída a partir de `inicio`, via índice em saida
+        cursor = self._leitura.execute(
+            "SELECT substr(saida, 1, 10), SUM(valor), COUNT(*) FROM historico "
+            "WHERE saida >= ? GROUP BY substr(saida, 1, 10)",
+            (_texto(inicio),),
+        )
+        return [(date.fromisoformat(dia), receita, saidas) for dia, receita, saidas in cursor]
+
+
+def load_report_rows(caminho, inicio, fim):
+    # Saídas em [inicio, fim) com as colunas dos relatórios, por uma conexão
+    # só de leitura aberta aqui (chamado nos processos de relatório)
+    conn = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+    try:
+        filtro, params = _periodo(inicio, fim)
+        df = pd.read_sql_query(
+            f"SELECT tipo, entrada, saida, valor, operador FROM historico {filtro}",
+            conn,
+            params=params,
+        )
+    finally:
+        conn.close()
+    df.columns = ["Tipo", "Entrada", "Saida", "Valor", "Operador"]
+    return df
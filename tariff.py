@@ -0,0 +1,215 @@
+import math
+
+from lazy import LazyModule
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+
+class _Escalar:
+    # Mesmas operações do NumPy usadas em `_cobranca`, para um único ticket
+    # sem passar por arrays
+    floor = staticmethod(math.floor)
+    ceil = staticmethod(math.ceil)
+    minimum = staticmethod(min)
+    maximum = staticmethod(max)
+
+    @staticmethod
+    def where(condicao, sim, nao):
+        return sim if condicao else nao
+
+    @staticmethod
+    def round(valor, casas):
+        # Como np.round: multiplica, arredonda para o par mais próximo e divide
+        return round(valor * 10 ** casas) / 10 ** casas
+
+
+def _cobranca(ops, horas, carencia, primeira, hora, fracao, teto):
+    # Valor cobrado por estadias de `horas`, com os parâmetros já resolvidos
+    # (hora noturna incluída). `ops` é o numpy (arrays) ou _Escalar (um
+    # ticket): a mesma conta serve aos dois caminhos
+    minutos = horas * 60
+
+    # Arredondamento por frações (só onde a regra define fração)
+    com_fracao = fracao > 0
+    cobradas = ops.where(
+        com_fracao,
+        ops.ceil(minutos / ops.where(com_fracao, fracao, 1)) * fracao / 60,
+        horas,
+    )
+
+    # Primeiro bloco de 24h inclui a primeira hora; os seguintes só a hora normal
+    dias = ops.floor(cobradas / 24)
+    resto = cobradas - dias * 24
+    primeiro_bloco = ops.where(dias > 0, 24.0, resto)
+    bruto_primeiro = ops.minimum(primeiro_bloco, 1) * primeira + ops.maximum(primeiro_bloco - 1, 0) * hora
+    valor = ops.minimum(bruto_primeiro, teto)
+    blocos_cheios = ops.maximum(dias - 1, 0)
+    valor += blocos_cheios * ops.minimum(24 * hora, teto)
+    valor += ops.where(dias > 0, ops.minimum(resto * hora, teto), 0)
+
+    valor = ops.where(minutos <= carencia, 0.0, valor)
+    return ops.round(valor, 2)
+
+
+class TariffRule:
+    """Regras de cobrança de um tipo de veículo.
+
+    - `carencia_minutos`: permanências até esse limite não pagam nada;
+    - `primeira_hora`: valor da primeira hora (proporcional se a estadia for menor);
+    - `hora`: valor de cada hora seguinte;
+    - `fracao_minutos`: arredonda o tempo cobrado para cima em frações (0 = contínuo);
+    - `teto_diario`: valor máximo por bloco de 24 horas (None = sem teto);
+    - `hora_noturna`: valor da hora seguinte para estadias que começam no período
+      noturno da tabela (None = igual a `hora`).
+    """
+
+    __slots__ = ("carencia_minutos", "primeira_hora", "hora", "fracao_minutos", "teto_diario", "hora_noturna")
+
+    def __init__(self, primeira_hora, hora, carencia_minutos=0, fracao_minutos=0,
+                 teto_diario=None, hora_noturna=None):
+        self.carencia_minutos = carencia_minutos
+        self.primeira_hora = primeira_hora
+        self.hora = hora
+        self.fracao_minutos = fracao_minutos
+        self.teto_diario = teto_diario
+        self.hora_noturna = hora_noturna
+
+    def params(self):
+        return (
+            self.carencia_minutos,
+            self.primeira_hora,
+            self.hora,
+            self.fracao_minutos,
+            np.inf if self.teto_diario is None else self.teto_diario,
+            self.hora if self.hora_noturna is None else self.hora_noturna,
+        )
+
+
+class TariffTable:
+    """Tabela de tarifas: regra padrão, regras por `Tipo` e janela noturna.
+
+    `price_batch` calcula um array inteiro de estadias de uma vez com NumPy;
+    `price` faz a mesma conta (`_cobranca`) em float para um único ticket.
+    """
+
+    def __init__(self, padrao, por_tipo=None, noite_inicio=22, noite_fim=6):
+        self.padrao = padrao
+        self.por_tipo = dict(por_tipo or {})
+        self.noite_inicio = noite_inicio
+        self.noite_fim = noite_fim
+
+    def rule(self, tipo):
+        return self.por_tipo.get(tipo, self.padrao)
+
+    def is_night(self, momento):
+        hora = momento.hour + momento.minute / 60 + momento.second / 3600
+        if self.noite_inicio > self.noite_fim:
+            return hora >= self.noite_inicio or hora < self.noite_fim
+        return self.noite_inicio <= hora < self.noite_fim
+
+    def stay_params(self, entrada, tipo):
+        # (carência, primeira hora, hora, fração, teto) de uma estadia, com a
+        # hora noturna já resolvida pelo horário de entrada
+        carencia, primeira, hora, fracao, teto, noturna = self.rule(tipo).params()
+        return carencia, primeira, noturna if self.is_night(entrada) else hora, fracao, teto
+
+    def price(self, entrada, saida, tipo):
+        # Um ticket (saída do pátio): conta em float puro, sem montar arrays
+        horas = (saida - entrada).total_seconds() / 3600
+        return float(_cobranca(_Escalar, horas, *self.stay_params(entrada, tipo))), horas
+
+    def price_hours(self, horas, params):
+        # (valor, faixa) de uma estadia de `horas` com os parâmetros de
+        # `stay_params`. O valor é o mesmo para todo tempo em (desde, até] da
+        # faixa, em minutos; None quando a cobrança é contínua
+        carencia, _, _, fracao, _ = params
+        valor = float(_cobranca(_Escalar, horas, *params))
+        # Mesma conta de minutos de `_cobranca`, para as fronteiras baterem
+        minutos = horas * 60
+        if minutos <= carencia:
+            return valor, (-math.inf, carencia)
+        if fracao > 0:
+            fracoes = math.ceil(minutos / fracao)
+            return valor, (max((fracoes - 1) * fracao, carencia), fracoes * fracao)
+        return valor, None
+
+    def price_batch(self, entradas, saidas, tipos):
+        entradas = np.asarray(entradas, dtype="datetime64[ns]")
+        saidas = np.asarray(saidas, dtype="datetime64[ns]")
+        tipos = pd.Categorical(tipos)
+
+        # Parâmetros de cada categoria (mais a regra padrão no fim, para tipos
+        # ausentes), espalhados para as linhas pelos códigos
+        regras = [self.rule(t) for t in tipos.categories] + [self.padrao]
+        tabela = np.array([r.params() for r in regras], dtype=np.float64)
+        codigos = np.where(tipos.codes < 0, len(regras) - 1, tipos.codes)
+        carencia, primeira, hora, fracao, teto, noturna = tabela[codigos].T
+
+        uma_hora = np.timedelta64(3600, "s")
+        horas = (saidas - entradas) / uma_hora
+
+        # Estadias que começam no período noturno usam a hora noturna
+        hora_entrada = (entradas - entradas.astype("datetime64[D]")) / uma_hora
+        if self.noite_inicio > self.noite_fim:
+            noturna_mask = (hora_entrada >= self.noite_inicio) | (hora_entrada < self.noite_fim)
+        else:
+            noturna_mask = (hora_entrada >= self.noite_inicio) & (hora_entrada < self.noite_fim)
+        hora = np.where(noturna_mask, noturna, hora)
+
+        return _cobranca(np, horas, carencia, primeira, hora, fracao, teto), horas
+
+    def price_history(self, historico, i=0, j=None):
+        # Recalcula os valores das linhas [i, j) de um HistoryStore (auditoria / simulação)
+        j = len(historico) if j is None else j
+        tipos = pd.Categorical.from_codes(historico.column("Tipo")[i:j], categories=historico.categories("Tipo"))
+        valores, _ = self.price_batch(historico.column("Entrada")[i:j], historico.column("Saida")[i:j], tipos)
+        return valores
+
+    def price_period(self, historico, inicio=None, fim=None):
+        # Recalcula as saídas em [inicio, fim) de um PartitionedHistory (o
+        # histórico do pátio), um lote por partição, em ordem cronológica
+        valores = [self.price_history(store, i, j) for store, i, j in historico.segments(inicio, fim)]
+        return np.concatenate(valores)
+
+
+class _Cotacao:
+    # Parâmetros de uma estadia fixados na entrada; o valor depende só do tempo decorrido
+    __slots__ = ("entrada", "params", "valor", "faixa")
+
+    def __init__(self, entrada, params):
+        self.entrada = entrada
+        self.params = params
+        self.valor = None
+        # (desde, até]: minutos decorridos em que `valor` continua valendo
+        self.faixa = None
+
+    def at(self, tarifa, horas):
+        if self.faixa is not None and self.faixa[0] < horas * 60 <= self.faixa[1]:
+            return self.valor
+        self.valor, self.faixa = tarifa.price_hours(horas, self.params)
+        return self.valor
+
+
+class QuoteCache:
+    """Cotações ao vivo por placa, calculadas em O(1) a partir do tempo decorrido.
+
+    A regra e o período (noturno ou não) são resolvidos uma vez por estadia;
+    o valor vem de `TariffTable.price_hours` e é reaproveitado enquanto o
+    tempo decorrido ficar na mesma faixa (carência ou fração) da tabela.
+    """
+
+    def __init__(self, tarifa):
+        self.tarifa = tarifa
+        self._cotacoes = {}
+
+    def quote(self, registro, agora):
+        cotacao = self._cotacoes.get(registro.placa)
+        if cotacao is None or cotacao.entrada != registro.entrada:
+            cotacao = _Cotacao(registro.entrada, self.tarifa.stay_params(registro.entrada, registro.tipo))
+            self._cotacoes[registro.placa] = cotacao
+        horas = (agora - registro.entrada).total_seconds() / 3600
+        return cotacao.at(self.tarifa, horas), horas
+
+    def discard(self, placa):
+        self._cotacoes.pop(placa, None)
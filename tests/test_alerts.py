@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+import random
+
+from alerts import AlertScheduler, DeadlineHeap
+from lot import LotState
+from tariff import TariffRule, TariffTable
+
+T0 = datetime(2026, 1, 1)
+
+
+def test_heap_matches_a_dict_of_deadlines():
+    rng = random.Random(5)
+    prazos = DeadlineHeap()
+    esperado = {}
+    agora = T0
+    for _ in range(20_000):
+        chave = rng.randrange(300)
+        sorteio = rng.random()
+        if sorteio < 0.5:
+            prazo = agora + timedelta(minutes=rng.randrange(1, 600))
+            prazos.schedule(chave, prazo, chave)
+            esperado[chave] = prazo
+        elif sorteio < 0.8:
+            prazos.cancel(chave)
+            esperado.pop(chave, None)
+        else:
+            agora += timedelta(minutes=rng.randrange(30))
+            vencidos = prazos.pop_due(agora)
+            assert {c: (p, dados) for c, p, dados in vencidos} == {c: (p, c) for c, p in esperado.items() if p <= agora}
+            assert [p for _, p, _ in vencidos] == sorted(p for _, p, _ in vencidos)
+            for c, _, _ in vencidos:
+                del esperado[c]
+        assert len(prazos) == len(esperado)
+        assert prazos.next_deadline() == min(esperado.values(), default=None)
+        # Entradas mortas não se acumulam sem limite
+        assert len(prazos._heap) <= 2 * len(esperado) + 65
+
+
+def test_load_then_pop_in_deadline_order():
+    prazos = DeadlineHeap()
+    prazos.load([("b", T0 + timedelta(hours=2), 2), ("a", T0 + timedelta(hours=1), 1), ("c", T0 + timedelta(hours=3), 3)])
+    prazos.cancel("b")
+    assert prazos.pop_due(T0 + timedelta(hours=2)) == [("a", T0 + timedelta(hours=1), 1)]
+    assert prazos.next_deadline() == T0 + timedelta(hours=3)
+    assert len(prazos) == 1
+
+
+def lot():
+    return LotState(5, TariffTable(TariffRule(8, 4), {"Moto": TariffRule(3, 2, carencia_minutos=15)}))
+
+
+def test_scheduler_follows_lot_events():
+    patio = lot()
+    alertas = AlertScheduler(patio, permanencia_maxima_horas=2)
+    entrada = datetime.now().replace(microsecond=0) - timedelta(minutes=5)
+    patio.check_in("n", "m", "MOTO001", "Preto", "Moto", entrada)
+    patio.check_in("n", "m", "CARRO01", "Preto", "Carro", entrada)
+    patio.check_in("n", "m", "CARRO02", "Preto", "Carro", entrada)
+    patio.check_out("CARRO02")
+    assert len(alertas.prazos) == 3
+
+    carencia = alertas.due(entrada + timedelta(minutes=15))
+    assert [(a.tipo, a.chave) for a in carencia] == [("carencia", "MOTO001")]
+    permanencia = alertas.due(entrada + timedelta(hours=3))
+    assert sorted((a.tipo, a.chave) for a in permanencia) == [("permanencia", "CARRO01"), ("permanencia", "MOTO001")]
+    assert [a.seq for a in carencia + permanencia] == [1, 2, 3]
+    assert alertas.due(entrada + timedelta(days=2)) == []
+    assert len(alertas.recentes) == 3
+
+
+def test_vehicle_that_left_and_came_back_gets_new_deadlines():
+    patio = lot()
+    alertas = AlertScheduler(patio, permanencia_maxima_horas=2)
+    agora = datetime.now().replace(microsecond=0)
+    patio.check_in("n", "m", "CARRO01", "Preto", "Carro", agora - timedelta(minutes=30))
+    patio.check_out("CARRO01", agora - timedelta(minutes=20))
+    patio.check_in("n", "m", "CARRO01", "Preto", "Carro", agora - timedelta(minutes=10))
+    assert alertas.due(agora + timedelta(minutes=100)) == []
+    assert [a.chave for a in alertas.due(agora + timedelta(minutes=110))] == ["CARRO01"]
+
+
+def test_reservation_without_arrival_expires_with_an_alert():
+    patio = lot()
+    alertas = AlertScheduler(patio)
+    agora = datetime.now().replace(microsecond=0)
+    reserva = patio.reserve("Cliente", "RES0001", "Geral", agora + timedelta(hours=1), agora + timedelta(hours=3), agora)
+    cancelada = patio.reserve("Cliente", "RES0002", "Geral", agora + timedelta(hours=1), agora + timedelta(hours=3), agora)
+    patio.cancel_reservation(cancelada.codigo)
+    vencidas = alertas.due(reserva.prazo)
+    assert [(a.tipo, a.chave) for a in vencidas] == [("reserva", reserva.codigo)]
+    assert reserva.situacao == "expirada"
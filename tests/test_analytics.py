@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+import random
+
+import pandas as pd
+
+from analytics import TimeSeriesRollups
+
+T0 = datetime(2026, 3, 2, 10, 0)
+
+
+class Registro:
+    def __init__(self, tipo, entrada):
+        self.tipo = tipo
+        self.entrada = entrada
+
+
+def test_events_land_in_every_granularity():
+    series = TimeSeriesRollups()
+    carro = Registro("Carro", T0 + timedelta(minutes=3))
+    moto = Registro("Moto", T0 + timedelta(minutes=7))
+    series.on_check_in(carro, 1)
+    series.on_check_in(moto, 2)
+    series.on_check_out(carro, T0 + timedelta(minutes=62), 12.0, 1)
+
+    cinco = series.series("5min", T0, T0 + timedelta(minutes=10)).set_index("Inicio")
+    assert list(cinco["Chegadas"]) == [1, 1, 0]
+    assert list(cinco["Ocupacao"]) == [1, 2, 2]
+    horas = series.series("hora", T0, T0 + timedelta(hours=1)).set_index("Inicio")
+    assert list(horas["Chegadas"]) == [2, 0]
+    assert list(horas["Saidas"]) == [0, 1]
+    assert list(horas["Receita"]) == [0.0, 12.0]
+    assert list(horas["Ocupacao"]) == [2, 1]
+    # O pico da hora da saída conta o carro que ainda estava lá
+    assert horas["Pico"].iloc[1] == 2
+    dia = series.series("dia", T0, T0)
+    assert (dia["Chegadas"].iloc[0], dia["Saidas"].iloc[0]) == (2, 1)
+    receita = series.revenue_by_type("hora", T0, T0 + timedelta(hours=2))
+    assert receita.loc[T0 + timedelta(hours=1), "Carro"] == 12.0
+
+
+def test_retention_keeps_the_occupancy_curve():
+    # Mesmos eventos em uma série com retenção de 3 intervalos e outra sem limite
+    series = TimeSeriesRollups({"curta": (60, 3), "toda": (60, None)})
+    rng = random.Random(3)
+    dentro = []
+    momento = T0
+    for _ in range(300):
+        momento += timedelta(seconds=rng.randrange(40))
+        if dentro and rng.random() < 0.5:
+            registro = dentro.pop(rng.randrange(len(dentro)))
+            series.on_check_out(registro, momento, 2.0, len(dentro))
+        else:
+            registro = Registro("Carro", momento)
+            dentro.append(registro)
+            series.on_check_in(registro, len(dentro))
+    curta, toda = series.rollups["curta"], series.rollups["toda"]
+    assert len(curta.intervalos) <= 3
+    assert len(toda.intervalos) > 3
+    inicio = momento - timedelta(minutes=2)
+    a = series.series("curta", inicio, momento)
+    b = series.series("toda", inicio, momento)
+    assert list(a["Ocupacao"]) == list(b["Ocupacao"])
+    assert a["Ocupacao"].iloc[-1] == len(dentro)
+
+
+def test_late_events_before_retention_only_move_the_base():
+    series = TimeSeriesRollups({"curta": (60, 2)})
+    series.on_check_in(Registro("Carro", T0 + timedelta(minutes=10)), 1)
+    # Entrada tardia muito antes da janela mantida
+    series.on_check_in(Registro("Moto", T0), 2)
+    rollup = series.rollups["curta"]
+    assert sorted(rollup.intervalos) == [rollup.key(T0 + timedelta(minutes=10))]
+    assert rollup.base == 1
+    df = series.series("curta", T0 + timedelta(minutes=9), T0 + timedelta(minutes=10))
+    assert list(df["Ocupacao"]) == [1, 2]
+
+
+def test_history_import_matches_live_updates():
+    vivo = TimeSeriesRollups()
+    linhas = []
+    for k in range(50):
+        entrada = T0 + timedelta(minutes=17 * k)
+        saida = entrada + timedelta(minutes=45 + k)
+        registro = Registro(["Carro", "Moto"][k % 2], entrada)
+        vivo.on_check_in(registro, 1)
+        vivo.on_check_out(registro, saida, float(k), 0)
+        linhas.append({"Tipo": registro.tipo, "Entrada": entrada, "Saida": saida, "Valor": float(k)})
+    importado = TimeSeriesRollups()
+    importado.on_history_import(importado.history_totals(pd.DataFrame(linhas)))
+    fim = T0 + timedelta(days=1)
+    for granularidade in ("5min", "hora", "dia"):
+        a = vivo.series(granularidade, T0, fim)
+        b = importado.series(granularidade, T0, fim)
+        assert a[["Chegadas", "Saidas", "Receita", "Ocupacao"]].equals(b[["Chegadas", "Saidas", "Receita", "Ocupacao"]])
+    a = vivo.revenue_by_type("dia", T0, fim)
+    b = importado.revenue_by_type("dia", T0, fim)
+    assert a.sort_index(axis=1).equals(b.sort_index(axis=1))
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from history import COLUNAS_HISTORICO, HistoryStore, PartitionedHistory
+from storage import SQLiteStorage
+from tariff import TariffRule, TariffTable
+
+AGORA = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+
+
+def frame(saidas, prefixo="P"):
+    saidas = pd.to_datetime(pd.Series(saidas))
+    return pd.DataFrame({
+        "Nome": "Cliente",
+        "Modelo": "Modelo",
+        "Placa": [f"{prefixo}{i:05d}" for i in range(len(saidas))],
+        "Cor": "Preto",
+        "Tipo": ["Carro", "Moto"] * (len(saidas) // 2) + ["Carro"] * (len(saidas) % 2),
+        "Entrada": saidas - pd.Timedelta(hours=1),
+        "Saida": saidas,
+        "Valor": np.arange(len(saidas), dtype=float),
+        "Tempo": 1.0,
+    }, columns=COLUNAS_HISTORICO)
+
+
+@pytest.fixture
+def historico(tmp_path):
+    # 6 dias de saídas (a cada 17 min): 2 dias na memória, 4 no disco
+    storage = SQLiteStorage(str(tmp_path / "parking.db"))
+    saidas = pd.date_range(AGORA - timedelta(days=6), AGORA, freq="17min")
+    df = frame(saidas)
+    storage.save_history(df)
+    storage.flush()
+    yield PartitionedHistory(storage, janela_dias=2, max_particoes=2, agora=AGORA), df
+    storage.close()
+
+
+def test_hot_window_and_cold_days(historico):
+    historico, df = historico
+    assert len(historico.quente) == (df["Saida"] >= historico.corte).sum()
+    assert historico.count() == len(df)
+
+
+@pytest.mark.parametrize("dias", [None, 1, 3, 5])
+def test_pages_cross_hot_and_cold(historico, dias):
+    historico, df = historico
+    inicio = None if dias is None else AGORA - timedelta(days=dias, hours=5)
+    esperado = df if inicio is None else df[df["Saida"] >= inicio]
+    esperado = esperado.iloc[::-1].reset_index(drop=True)
+    assert historico.count(inicio) == len(esperado)
+    for deslocamento in (0, 40, len(esperado) - 60, len(esperado) - 10, len(esperado) + 5):
+        pagina = historico.page(inicio, None, deslocamento, 50)
+        assert list(pagina["Placa"]) == list(esperado["Placa"].iloc[deslocamento:deslocamento + 50])
+        assert list(pagina["Tipo"]) == list(esperado["Tipo"].iloc[deslocamento:deslocamento + 50])
+    # O cache de dias antigos respeita o limite
+    assert len(historico._particoes) <= 2
+
+
+def test_iter_rows_in_order(historico):
+    historico, df = historico
+    blocos = list(historico.iter_rows(AGORA - timedelta(days=4), AGORA - timedelta(hours=6), linhas=100))
+    lidos = pd.concat(blocos, ignore_index=True)
+    esperado = df[(df["Saida"] >= AGORA - timedelta(days=4)) & (df["Saida"] < AGORA - timedelta(hours=6))]
+    assert list(lidos["Placa"]) == list(esperado["Placa"])
+    assert all(len(b) <= 100 for b in blocos)
+
+
+
+def test_late_exit_in_a_cold_day_is_read_again(historico):
+    historico, df = historico
+    dia = AGORA - timedelta(days=4)
+    inicio = dia.replace(hour=0)
+    antes = historico.count(inicio, inicio + timedelta(days=1))
+    historico.page(inicio, inicio + timedelta(days=1), 0, 10)
+    # Uma saída atrasada vai para o disco; a partição em cache fica inválida
+    saida = dia.replace(hour=23, minute=59)
+    historico.append("Cliente", "Modelo", "TARDIA", "Preto", "Carro", saida - timedelta(hours=1), saida, 1.0, 1.0)
+    historico.storage.save_history(frame([saida], "TARDIA"))
+    pagina = historico.page(inicio, inicio + timedelta(days=1), 0, 1)
+    assert historico.count(inicio, inicio + timedelta(days=1)) == antes + 1
+    assert pagina["Placa"].iloc[0] == "TARDIA00000"
+
+def test_reprice_a_period_across_partitions(historico):
+    historico, df = historico
+    tarifa = TariffTable(TariffRule(8, 4), {"Moto": TariffRule(3, 2, fracao_minutos=15)})
+    inicio, fim = AGORA - timedelta(days=4, hours=3), AGORA - timedelta(hours=5)
+    esperado = df[(df["Saida"] >= inicio) & (df["Saida"] < fim)]
+    valores, _ = tarifa.price_batch(esperado["Entrada"], esperado["Saida"], esperado["Tipo"])
+    assert np.allclose(tarifa.price_period(historico, inicio, fim), valores)
+    assert len(tarifa.price_period(historico)) == len(df)
+
+def test_store_keeps_late_appends_sorted():
+    store = HistoryStore(capacidade=2)
+    base = datetime(2026, 1, 1)
+    ordem = [0, 10, 20, 5, 30, 5, 1]
+    for k, minutos in enumerate(ordem):
+        saida = base + timedelta(minutes=minutos)
+        store.append(f"n{k}", "m", f"P{k}", "Preto", "Carro", saida, saida, float(k), 1.0)
+    linhas = store.rows(0, len(store))
+    # Empates mantêm a ordem de chegada
+    assert list(linhas["Placa"]) == ["P0", "P6", "P3", "P5", "P1", "P2", "P4"]
+    assert (np.diff(store.column("Saida").astype("int64")) >= 0).all()
+
+
+def test_copy_is_independent():
+    store = HistoryStore()
+    base = datetime(2026, 1, 1)
+    for k in range(5):
+        store.append("n", "m", f"P{k}", "Preto", "Carro", base, base + timedelta(minutes=10 * k), 1.0, 1.0)
+    copia = store.copy(1, 5)
+    store.drop_before(2)
+    store.append("n", "m", "P9", "Preto", "Carro", base, base + timedelta(minutes=25), 1.0, 1.0)
+    assert list(copia.rows(0, len(copia))["Placa"]) == ["P1", "P2", "P3", "P4"]
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from history import COLUNAS_HISTORICO
+from history_io import iter_history_file, validate_history_file
+
+
+def historico(n):
+    saidas = [datetime(2026, 1, 1) + timedelta(minutes=7 * k) for k in range(n)]
+    return pd.DataFrame({
+        "Nome": [f"Cliente {k}" for k in range(n)],
+        "Modelo": "Modelo",
+        # Placa só com dígitos não pode virar número
+        "Placa": [f"{k:07d}" for k in range(n)],
+        "Cor": "Preto",
+        "Tipo": "Carro",
+        "Entrada": [s - timedelta(hours=1) for s in saidas],
+        "Saida": saidas,
+        "Valor": [float(k) for k in range(n)],
+        "Tempo": 1.0,
+    }, columns=COLUNAS_HISTORICO)
+
+
+@pytest.mark.parametrize("extensao", ["csv", "parquet"])
+def test_file_is_read_in_typed_blocks(tmp_path, extensao):
+    df = historico(25)
+    caminho = str(tmp_path / f"historico.{extensao}")
+    if extensao == "csv":
+        # Colunas fora de ordem e uma coluna a mais: só as do histórico ficam
+        df.assign(Extra=1)[COLUNAS_HISTORICO[::-1] + ["Extra"]].to_csv(caminho, index=False)
+    else:
+        pytest.importorskip("pyarrow")
+        df.to_parquet(caminho, index=False)
+    blocos = list(iter_history_file(caminho, linhas=10))
+    assert [len(b) for b in blocos] == [10, 10, 5]
+    lido = pd.concat(blocos, ignore_index=True)
+    assert list(lido.columns) == COLUNAS_HISTORICO
+    assert lido["Placa"].iloc[3] == "0000003"
+    assert lido["Saida"].dtype.kind == "M" and lido["Valor"].dtype.kind == "f"
+    assert (lido["Saida"] == df["Saida"]).all()
+
+
+def test_missing_columns_are_reported(tmp_path):
+    caminho = str(tmp_path / "historico.csv")
+    historico(3).drop(columns=["Valor", "Tipo"]).to_csv(caminho, index=False)
+    with pytest.raises(ValueError, match="Tipo, Valor"):
+        list(iter_history_file(caminho))
+
+
+def test_missing_values_are_rejected_with_the_record_number(tmp_path):
+    df = historico(25)
+    df.loc[13, "Valor"] = None
+    df.loc[17, "Nome"] = None
+    caminho = str(tmp_path / "historico.csv")
+    df.to_csv(caminho, index=False)
+    blocos = iter_history_file(caminho, linhas=10)
+    assert len(next(blocos)) == 10
+    with pytest.raises(ValueError, match=r"2 registro\(s\) sem valor em Nome, Valor \(o primeiro é o registro 14\)"):
+        next(blocos)
+
+
+def test_validation_counts_the_records_and_stops_at_the_first_error(tmp_path):
+    caminho = str(tmp_path / "historico.csv")
+    historico(25).to_csv(caminho, index=False)
+    assert validate_history_file(caminho, linhas=10) == 25
+    df = historico(25)
+    df.loc[21, "Placa"] = None
+    df.to_csv(caminho, index=False)
+    with pytest.raises(ValueError, match="o primeiro é o registro 22"):
+        validate_history_file(caminho, linhas=10)
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+
+from ingest import EventError, GateEvent, GateIngestor
+from lot import LotState
+from tariff import TariffRule, TariffTable
+
+AGORA = datetime(2026, 3, 10, 12, 0)
+
+
+def lot():
+    return LotState(5, TariffTable(TariffRule(5, 5)))
+
+
+@pytest.mark.parametrize("dados", [
+    [],
+    {"evento": "entrada", "placa": "ABC1234"},
+    {"id": 7, "evento": "entrada", "placa": "ABC1234"},
+    {"id": "e1", "evento": "passagem", "placa": "ABC1234"},
+    {"id": "e1", "evento": "entrada"},
+    {"id": "e1", "evento": "entrada", "placa": ["ABC1234"]},
+    {"id": "e1", "evento": "entrada", "placa": "ABC1234", "tipo": ["Carro"]},
+    {"id": "e1", "evento": "entrada", "placa": "ABC1234", "nome": 42},
+    {"id": "e1", "evento": "saida", "placa": "ABC1234", "operador": {"x": 1}},
+    {"id": "e1", "evento": "entrada", "placa": "ABC1234", "momento": "ontem"},
+    {"id": "e1", "evento": "entrada", "placa": "ABC1234", "momento": 1700000000},
+    {"id": "e1", "evento": "entrada", "placa": "ABC1234", "momento": "2026-03-10T13:00:00"},
+])
+def test_malformed_events_are_rejected(dados):
+    with pytest.raises(EventError):
+        GateEvent.from_json(dados, agora=AGORA)
+
+
+def test_valid_event_gets_defaults():
+    evento = GateEvent.from_json(
+        {"id": "e1", "evento": "entrada", "placa": "ABC1234", "momento": "2026-03-10T12:03:00", "tipo": None},
+        agora=AGORA,
+    )
+    assert evento.momento == datetime(2026, 3, 10, 12, 3)
+    assert evento.tipo == "Carro"
+    assert evento.operador == "Cancela"
+
+
+def test_worker_survives_unexpected_failure():
+    patio = lot()
+    ingestor = GateIngestor(patio)
+    # Passa pelo __init__ direto, sem a validação do from_json
+    quebrado = GateEvent("e1", "entrada", "ABC1234", None, "n", "m", "Preto", ["Carro"])
+    bom = GateEvent("e2", "entrada", "XYZ9876", None, "n", "m", "Preto", "Carro")
+
+    async def rodar():
+        assert ingestor.submit([quebrado]) == (1, 0)
+        for _ in range(100):
+            if ingestor.status("e1") != "pendente":
+                break
+            await asyncio.sleep(0.01)
+        assert ingestor.submit([bom]) == (1, 0)
+        for _ in range(100):
+            if ingestor.status("e2") != "pendente":
+                break
+            await asyncio.sleep(0.01)
+        ingestor._tarefa.cancel()
+
+    asyncio.run(rodar())
+    assert ingestor.status("e1").startswith("Falha")
+    assert ingestor.status("e2") == "ok"
+    # O evento que falhou não deixou vaga presa nem contadores alterados
+    assert "ABC1234" not in patio.vagas
+    assert len(patio.vagas) == patio.kpis.ativos == 1
+    assert patio.vagas.livres == 4
+
+
+def test_post_rejects_batches_larger_than_the_queue():
+    ingestor = GateIngestor(lot(), fila_maxima=5)
+    cliente = TestClient(Starlette(routes=ingestor.routes()))
+    eventos = [{"id": f"e{k}", "evento": "entrada", "placa": f"P{k}"} for k in range(6)]
+    resposta = cliente.post("/eventos", json=eventos)
+    assert resposta.status_code == 413
+    assert ingestor.pending() == 0
+
+    resposta = cliente.post("/eventos", json=eventos[:5])
+    assert resposta.status_code == 202
+    assert resposta.json() == {"aceitos": 5, "duplicados": 0}
+    assert cliente.post("/eventos", json=[{"id": "e1"}]).status_code == 400
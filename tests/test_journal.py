@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import journal
+from lot import LotState
+from occupancy import LotError
+from storage import SQLiteStorage
+from tariff import TariffRule, TariffTable
+
+
+@pytest.fixture
+def lot(tmp_path, monkeypatch):
+    # Snapshots frequentes: as consultas cruzam vários, com eventos tardios no meio
+    monkeypatch.setattr(journal, "SNAPSHOT_A_CADA_EVENTOS", 3)
+    storage = SQLiteStorage(str(tmp_path / "parking.db"))
+    yield LotState(20, TariffTable(TariffRule(5, 5)), storage)
+    storage.close()
+
+
+def test_state_at_with_late_events(lot):
+    t0 = datetime.now().replace(microsecond=0) + timedelta(hours=1)
+    eventos = []
+
+    def entrada(placa, minutos):
+        lot.check_in("Cliente", "Modelo", placa, "Preto", "Carro", t0 + timedelta(minutes=minutos))
+        eventos.append((minutos, placa, True))
+
+    def saida(placa, minutos):
+        lot.check_out(placa, t0 + timedelta(minutes=minutos))
+        eventos.append((minutos, placa, False))
+
+    for i in range(8):
+        entrada(f"P{i}", 10 * i)
+    saida("P0", 75)
+    saida("P3", 80)
+    # Câmera atrasada: bem mais que ATRASO_MAXIMO atrás do último evento
+    entrada("TARDIA1", 5)
+    saida("P1", 12)
+    entrada("TARDIA2", 33)
+    saida("TARDIA2", 41)
+    entrada("P9", 90)
+    lot.storage.flush()
+    assert lot.storage._leitura.execute("SELECT COUNT(*) FROM eventos WHERE tardio = 1").fetchone()[0] == 4
+
+    for minutos in range(0, 100, 3):
+        momento = t0 + timedelta(minutes=minutos, seconds=30)
+        _, registros = lot.state_at(momento)
+        esperado = set()
+        for quando, placa, entrou in sorted(eventos):
+            if quando <= minutos:
+                (esperado.add if entrou else esperado.discard)(placa)
+        assert {r.placa for r in registros} == esperado, minutos
+
+
+def test_state_before_first_snapshot(lot):
+    with pytest.raises(LotError):
+        lot.state_at(datetime.now() - timedelta(days=1))
@@ -0,0 +1,64 @@
+from datetime import date, datetime, timedelta
+
+from kpis import KPIAggregator
+from occupancy import OccupancyStore
+from storage import SQLiteStorage
+
+
+class Registro:
+    def __init__(self, tipo):
+        self.tipo = tipo
+
+
+def test_counts_follow_check_ins_and_outs():
+    kpis = KPIAggregator(10)
+    carro, moto = Registro("Carro"), Registro("Moto")
+    kpis.on_check_in(carro)
+    kpis.on_check_in(moto)
+    kpis.on_check_in(Registro("Carro"))
+    kpis.on_check_out(moto, datetime(2026, 1, 1, 10), 7.5)
+    instantaneo = kpis.snapshot(datetime(2026, 1, 1, 18))
+    assert (instantaneo.ativos, instantaneo.livres) == (2, 8)
+    assert instantaneo.por_tipo == {"Carro": 2}
+    assert (instantaneo.receita_dia, instantaneo.saidas_dia, instantaneo.ticket_medio) == (7.5, 1, 7.5)
+
+
+def test_midnight_starts_a_new_day_without_resetting_anything():
+    kpis = KPIAggregator(10)
+    for minutos, valor in ((-30, 10.0), (-1, 5.0), (0, 4.0), (90, 6.0)):
+        kpis.on_check_in(Registro("Carro"))
+        kpis.on_check_out(Registro("Carro"), datetime(2026, 1, 2) + timedelta(minutes=minutos), valor)
+    ontem = kpis.snapshot(datetime(2026, 1, 1, 23, 59, 59))
+    hoje = kpis.snapshot(datetime(2026, 1, 2, 0, 0))
+    assert (ontem.dia, ontem.receita_dia, ontem.saidas_dia) == (date(2026, 1, 1), 15.0, 2)
+    assert (hoje.dia, hoje.receita_dia, hoje.saidas_dia) == (date(2026, 1, 2), 10.0, 2)
+    assert hoje.ticket_medio == 5.0
+    vazio = kpis.snapshot(datetime(2026, 1, 3, 0, 1))
+    assert (vazio.receita_dia, vazio.saidas_dia, vazio.ticket_medio) == (0.0, 0, 0.0)
+    assert vazio.ativos == 0
+
+
+def test_seed_from_storage_matches_live_counts(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "parking.db"))
+    vagas = OccupancyStore(10)
+    vivo = KPIAggregator(10)
+    agora = datetime.now().replace(microsecond=0)
+    for k, tipo in enumerate(["Carro", "Moto", "Carro", "Van", "Moto"]):
+        registro = vagas.check_in("n", "m", f"P{k}", "Preto", tipo, agora - timedelta(hours=3))
+        storage.save_check_in(registro)
+        vivo.on_check_in(registro)
+    for k, valor in ((1, 3.0), (3, 12.5)):
+        registro = vagas.check_out(f"P{k}")
+        storage.save_check_out(registro, agora, valor, 3.0)
+        vivo.on_check_out(registro, agora, valor)
+    storage.flush()
+
+    restaurado = OccupancyStore(10)
+    restaurado.load(storage.load_vehicles())
+    kpis = KPIAggregator(10)
+    meia_noite = agora.replace(hour=0, minute=0, second=0)
+    kpis.seed(restaurado, storage.day_totals(meia_noite))
+    storage.close()
+    a, b = kpis.snapshot(agora), vivo.snapshot(agora)
+    assert (a.ativos, a.por_tipo, a.receita_dia, a.saidas_dia) == (b.ativos, b.por_tipo, b.receita_dia, b.saidas_dia)
+    assert a.por_tipo == {"Carro": 2, "Moto": 1}
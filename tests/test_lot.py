@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from history import PartitionedHistory
+from lot import LotState
+from occupancy import VehicleNotFoundError
+from storage import SQLiteStorage
+from tariff import TariffRule, TariffTable
+
+
+@pytest.fixture
+def lot(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "parking.db"))
+    yield LotState(5, TariffTable(TariffRule(5, 5)), storage)
+    storage.close()
+
+
+def estado(lot):
+    # O que as telas e o banco mostram do pátio
+    lot.storage.flush()
+    banco = lot.storage._leitura
+    return (
+        sorted((r.vaga, r.placa) for r in lot.vagas),
+        lot.vagas.livres,
+        lot.kpis.ativos,
+        dict(lot.kpis.por_tipo),
+        lot.placas.search("ABC1234"),
+        lot.versao,
+        banco.execute("SELECT COUNT(*) FROM veiculos").fetchone()[0],
+        banco.execute("SELECT COUNT(*) FROM historico").fetchone()[0],
+    )
+
+
+def test_failed_history_load_keeps_the_vehicle(lot, monkeypatch):
+    entrada = datetime.now() - timedelta(hours=2)
+    lot.check_in("Cliente", "Modelo", "ABC1234", "Preto", "Carro", entrada)
+    lot.check_in("Cliente", "Modelo", "XYZ9876", "Preto", "Moto", entrada)
+    antes = estado(lot)
+
+    def quebrar(self, storage):
+        raise OSError("disco indisponível")
+
+    monkeypatch.setattr(PartitionedHistory, "__init__", quebrar)
+    with pytest.raises(OSError):
+        lot.check_out("ABC1234")
+    assert estado(lot) == antes
+    assert lot.vagas.get("ABC1234").entrada == entrada
+
+    monkeypatch.undo()
+    evento = lot.check_out("ABC1234")
+    assert evento.valor == 10.0
+    assert "ABC1234" not in lot.vagas and lot.kpis.ativos == 1
+
+
+def test_failed_history_append_puts_the_vehicle_back(lot, monkeypatch):
+    lot.check_in("Cliente", "Modelo", "ABC1234", "Preto", "Carro", datetime.now() - timedelta(hours=1))
+    lot.check_in("Cliente", "Modelo", "XYZ9876", "Preto", "Moto")
+    vaga = lot.vagas.get("ABC1234").vaga
+    antes = estado(lot)
+    linhas = lot.historico.count()
+
+    def quebrar(self, *campos):
+        raise MemoryError()
+
+    monkeypatch.setattr(PartitionedHistory, "append", quebrar)
+    with pytest.raises(MemoryError):
+        lot.check_out("ABC1234")
+    assert estado(lot) == antes
+    assert lot.historico.count() == linhas
+    assert lot.vagas.at_slot(vaga).placa == "ABC1234"
+
+    monkeypatch.undo()
+    lot.check_out("ABC1234")
+    lot.check_in("Cliente", "Modelo", "NEW0001", "Preto", "Carro")
+    assert len(lot.vagas) == 2 and lot.vagas.livres == 3
+    assert lot.historico.count() == linhas + 1
+
+
+def test_kpis_reject_an_unknown_type_without_changes(lot):
+    registro = lot.check_in("Cliente", "Modelo", "ABC1234", "Preto", "Carro")
+    registro.tipo = "Van"
+    with pytest.raises(KeyError):
+        lot.check_out("ABC1234")
+    assert (lot.kpis.ativos, lot.kpis.por_tipo) == (1, {"Carro": 1})
+    assert lot.vagas.get("ABC1234").vaga == registro.vaga
+    assert lot.vagas.livres == 4
+
+
+def test_unknown_plate_changes_nothing(lot):
+    lot.check_in("Cliente", "Modelo", "ABC1234", "Preto", "Carro")
+    antes = estado(lot)
+    with pytest.raises(VehicleNotFoundError):
+        lot.check_out("ZZZ0000")
+    assert estado(lot) == antes
+    assert lot._historico is None
+
+
+def test_history_import_in_blocks_notifies_once(lot):
+    eventos = []
+    lot.subscribe(eventos.append)
+    saida = datetime.now() - timedelta(days=3)
+    blocos = [pd.DataFrame({
+        "Nome": "Cliente", "Modelo": "Modelo", "Placa": placas, "Cor": "Preto", "Tipo": "Carro",
+        "Entrada": saida - timedelta(hours=1), "Saida": saida, "Valor": 5.0, "Tempo": 1.0,
+    }) for placas in (["IMP0001", "IMP0002"], ["IMP0002", "IMP0003"])]
+    for bloco in blocos:
+        lot.import_history(bloco)
+    assert (eventos, lot.versao) == ([], 0)
+    lot.history_imported()
+    assert [(e.tipo, e.versao) for e in eventos] == [("importacao", 1)]
+    assert estado(lot)[-1] == 4
+    assert lot.kpis.por_dia[saida.date()] == [20.0, 4]
+    assert [p for p, _ in lot.placas.search("IMP000")] == ["IMP0001", "IMP0002", "IMP0003"]
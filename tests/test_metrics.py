@@ -0,0 +1,70 @@
+import asyncio
+
+from metrics import BUCKETS_BYTES, MetricsRegistry, WebSocketMeter
+
+
+def test_render_uses_the_prometheus_text_format():
+    metricas = MetricsRegistry()
+    metricas.inc("eventos_total", "Eventos aplicados", evento="entrada")
+    metricas.inc("eventos_total", "Eventos aplicados", 2, evento="entrada")
+    metricas.inc("eventos_total", "Eventos aplicados", evento="saida")
+    h = metricas.histogram("duracao_segundos", "Duração", (0.1, 1.0), funcao="tabela")
+    for valor in (0.05, 0.5, 0.7, 3.0):
+        h.observe(valor)
+    metricas.gauge("vagas_livres", "Vagas livres", lambda: 7)
+    linhas = metricas.render().splitlines()
+
+    assert linhas.index("# TYPE parking_duracao_segundos histogram") < linhas.index("# TYPE parking_eventos_total counter")
+    assert "# HELP parking_eventos_total Eventos aplicados" in linhas
+    assert 'parking_eventos_total{evento="entrada"} 3' in linhas
+    assert 'parking_eventos_total{evento="saida"} 1' in linhas
+    # Buckets acumulados, como o Prometheus espera
+    assert 'parking_duracao_segundos_bucket{funcao="tabela",le="0.1"} 1' in linhas
+    assert 'parking_duracao_segundos_bucket{funcao="tabela",le="1.0"} 3' in linhas
+    assert 'parking_duracao_segundos_bucket{funcao="tabela",le="+Inf"} 4' in linhas
+    assert 'parking_duracao_segundos_count{funcao="tabela"} 4' in linhas
+    assert "# TYPE parking_vagas_livres gauge" in linhas
+    assert "parking_vagas_livres 7" in linhas
+
+
+def test_timed_records_calls_and_quantiles():
+    metricas = MetricsRegistry()
+
+    @metricas.timed
+    def tabela():
+        return 1
+
+    @metricas.timed
+    async def grafico():
+        return 2
+
+    assert [tabela() for _ in range(3)] == [1, 1, 1]
+    assert asyncio.run(grafico()) == 2
+    resumo = {linha[0]: linha for linha in metricas.summary()}
+    assert resumo["tabela"][1] == 3 and resumo["grafico"][1] == 1
+    assert 0 <= resumo["tabela"][3] <= resumo["tabela"][5]
+
+
+def test_websocket_meter_measures_sent_messages_by_type():
+    metricas = MetricsRegistry()
+    enviadas = []
+
+    async def app(scope, receive, send):
+        await send({"type": "websocket.accept"})
+        await send({"type": "websocket.send", "text": '{"values": {"placa": "ABC1234"}}'})
+        await send({"type": "websocket.send", "text": '{"custom": {"vagas": [1, 2, 3]}}'})
+        await send({"type": "websocket.send", "text": '{"values": {"nome": "João"}}'})
+        await send({"type": "websocket.send", "bytes": b"\x00\x01\x02"})
+
+    async def send(mensagem):
+        enviadas.append(mensagem)
+
+    asyncio.run(WebSocketMeter(app, metricas)({"type": "websocket"}, None, send))
+    assert len(enviadas) == 5
+    valores = metricas.histogram("ws_mensagem_bytes", "", BUCKETS_BYTES, tipo="values")
+    vagas = metricas.histogram("ws_mensagem_bytes", "", BUCKETS_BYTES, tipo="custom:vagas")
+    binarias = metricas.histogram("ws_mensagem_bytes", "", BUCKETS_BYTES, tipo="binario")
+    # Bytes, não caracteres: o "ã" conta 2
+    assert (valores.total, valores.soma) == (2, len('{"values": {"placa": "ABC1234"}}') + len('{"values": {"nome": "Joao"}}') + 1)
+    assert (binarias.total, binarias.soma) == (1, 3)
+    assert (vagas.total, vagas.soma) == (1, len('{"custom": {"vagas": [1, 2, 3]}}'))
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+import random
+
+import pytest
+
+from occupancy import DuplicatePlateError, LotFullError, OccupancyStore, VehicleNotFoundError
+
+T0 = datetime(2026, 1, 1, 8, 0)
+
+
+def entrar(vagas, placa, minutos=0):
+    return vagas.check_in("Cliente", "Modelo", placa, "Preto", "Carro", T0 + timedelta(minutes=minutos))
+
+
+def test_slots_are_handed_out_in_order():
+    vagas = OccupancyStore(3)
+    assert [entrar(vagas, p).vaga for p in ("A", "B", "C")] == [1, 2, 3]
+    assert vagas.livres == 0
+    with pytest.raises(LotFullError):
+        entrar(vagas, "D")
+    with pytest.raises(DuplicatePlateError):
+        entrar(vagas, "A")
+    with pytest.raises(VehicleNotFoundError):
+        vagas.check_out("Z")
+    assert len(vagas) == 3 and "B" in vagas and "D" not in vagas
+
+
+def test_freed_slots_are_reused_last_in_first_out():
+    vagas = OccupancyStore(6)
+    for p in "ABCDE":
+        entrar(vagas, p)
+    vagas.check_out("C")
+    vagas.check_out("E")
+    assert vagas.at_slot(3) is None and vagas.livres == 3
+    assert entrar(vagas, "F").vaga == 5
+    assert entrar(vagas, "G").vaga == 3
+    # Sem vagas liberadas, segue para a menor vaga ainda não usada
+    assert entrar(vagas, "H").vaga == 6
+    assert vagas.at_slot(3).placa == "G"
+
+
+def test_random_operations_match_a_reference_model():
+    rng = random.Random(1)
+    capacidade = 40
+    vagas = OccupancyStore(capacidade)
+    pilha = list(range(capacidade, 0, -1))
+    ocupadas = {}
+    for k in range(20_000):
+        if ocupadas and (rng.random() < 0.45 or not pilha):
+            placa = rng.choice(sorted(ocupadas))
+            assert vagas.check_out(placa).vaga == ocupadas[placa]
+            pilha.append(ocupadas.pop(placa))
+        elif pilha:
+            placa = f"P{k}"
+            registro = entrar(vagas, placa, k)
+            assert registro.vaga == pilha.pop()
+            ocupadas[placa] = registro.vaga
+        assert vagas.livres == capacidade - len(ocupadas) == len(pilha)
+    for placa, vaga in ocupadas.items():
+        assert vagas.get(placa).vaga == vaga
+        assert vagas.at_slot(vaga).placa == placa
+    assert sorted(vagas.placas()) == sorted(ocupadas)
+
+
+def test_frame_follows_changes():
+    vagas = OccupancyStore(5)
+    entrar(vagas, "A")
+    entrar(vagas, "B", 30)
+    assert list(vagas.to_frame()["Placa"]) == ["A", "B"]
+    vagas.check_out("A")
+    quadro = vagas.to_frame()
+    assert list(quadro["Vaga"]) == [2]
+    assert quadro["Entrada"].iloc[0] == T0 + timedelta(minutes=30)
+
+
+def test_zone_check_ins_mixed_with_free_check_ins():
+    rng = random.Random(2)
+    capacidade = 30
+    zonas = [(1, 10), (11, 25), (26, 30)]
+    vagas = OccupancyStore(capacidade)
+    ocupadas = {}
+    for k in range(50_000):
+        if ocupadas and rng.random() < 0.45:
+            placa = rng.choice(list(ocupadas))
+            vagas.check_out(placa)
+            del ocupadas[placa]
+        else:
+            faixa = rng.choice(zonas + [None])
+            primeira, ultima = faixa or (1, capacidade)
+            livres = [v for v in range(primeira, ultima + 1) if v not in ocupadas.values()]
+            try:
+                registro = vagas.check_in("n", "m", f"P{k}", "Preto", "Carro", T0, faixa)
+            except LotFullError:
+                assert not livres
+                continue
+            assert registro.vaga in livres
+            if faixa is not None:
+                # A menor vaga livre da zona
+                assert registro.vaga == livres[0]
+            ocupadas[registro.placa] = registro.vaga
+        assert vagas.livres == capacidade - len(ocupadas)
+        assert vagas.occupied_between(1, capacidade) == len(ocupadas)
+    # As vagas tomadas por zona ficam na pilha até o topo, mas ela não cresce sem limite
+    assert len(vagas._vagas_livres) <= 2 * capacidade
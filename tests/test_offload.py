@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+
+import pytest
+from shiny import reactive
+
+from offload import OffloadedOutput
+
+
+@pytest.fixture
+def pool():
+    pool = ThreadPoolExecutor(2)
+    yield pool
+    pool.shutdown()
+
+
+def ler(saida):
+    with reactive.isolate():
+        return saida.result()
+
+
+async def esperar(saida, valor):
+    for _ in range(200):
+        with reactive.isolate():
+            if saida._resultado.is_set() and saida._resultado.get()[1] == valor:
+                return
+        await asyncio.sleep(0.005)
+    raise AssertionError(f"{valor!r} não foi publicado")
+
+
+def test_requests_while_running_coalesce_into_one(pool):
+    liberar = threading.Event()
+    chamadas = []
+
+    def calcular(n):
+        chamadas.append(n)
+        if n == 0:
+            liberar.wait(5)
+        return n * 10
+
+    async def rodar():
+        saida = OffloadedOutput("tabela", pool)
+        for n in range(6):
+            saida.request(("pagina", n), calcular, n)
+        await asyncio.sleep(0.02)
+        liberar.set()
+        await esperar(saida, 50)
+        return ler(saida)
+
+    assert asyncio.run(rodar()) == 50
+    # O primeiro já rodava; dos pedidos em espera só o último roda
+    assert chamadas == [0, 5]
+
+
+def test_result_for_an_old_key_is_not_shown(pool):
+    liberar = threading.Event()
+
+    def lento():
+        liberar.wait(5)
+        return "velho"
+
+    async def rodar():
+        saida = OffloadedOutput("tabela", pool)
+        saida.request("a", lento)
+        await asyncio.sleep(0.02)
+        # O usuário muda o filtro, e o pedido novo ocupa a vaga de espera
+        saida.request("b", lambda: "novo")
+        liberar.set()
+        await esperar(saida, "novo")
+        return ler(saida)
+
+    assert asyncio.run(rodar()) == "novo"
+
+
+def test_errors_reach_the_render(pool):
+    def quebrar():
+        raise ValueError("falhou")
+
+    async def rodar():
+        saida = OffloadedOutput("tabela", pool)
+        saida.request("a", quebrar)
+        for _ in range(200):
+            with reactive.isolate():
+                if saida._resultado.is_set():
+                    break
+            await asyncio.sleep(0.005)
+        with pytest.raises(ValueError, match="falhou"):
+            ler(saida)
+
+    asyncio.run(rodar())
+
+
+def test_closed_output_publishes_nothing(pool):
+    liberar = threading.Event()
+    chamadas = []
+
+    def calcular(n):
+        chamadas.append(n)
+        liberar.wait(5)
+        return n
+
+    async def rodar():
+        saida = OffloadedOutput("tabela", pool)
+        saida.request("a", calcular, 1)
+        saida.request("b", calcular, 2)
+        saida.close()
+        liberar.set()
+        await asyncio.sleep(0.1)
+        with reactive.isolate():
+            return saida._resultado.is_set()
+
+    assert asyncio.run(rodar()) is False
+    assert chamadas == [1]
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+from plates import PlateIndex, normalize_plate, plate_key
+
+D1 = datetime(2026, 1, 1, 10)
+D2 = datetime(2026, 1, 5, 18)
+D3 = datetime(2026, 2, 1, 9)
+
+
+def indice():
+    placas = PlateIndex()
+    placas.load([
+        ("ABC1234", D1),
+        ("ABC1D99", D2),
+        ("ABD5678", None),
+        ("XYZ0001", D3),
+    ])
+    placas.check_in("ABC9000")
+    return placas
+
+
+def test_keys_merge_old_and_mercosul_plates():
+    assert normalize_plate("abc-1234") == "ABC1234"
+    assert plate_key("ABC1C34") == plate_key("ABC1234")
+    # Confusões de OCR conforme a posição
+    assert plate_key("A8C1Z34") == plate_key("ABC1234")
+    assert plate_key("abc") == "ABC"
+
+
+def test_prefix_search_lists_the_lot_before_the_history():
+    placas = indice()
+    assert placas.search("AB") == [("ABC9000", None), ("ABD5678", None), ("ABC1234", D1), ("ABC1D99", D2)]
+    assert placas.search("abc-1") == [("ABC1234", D1), ("ABC1D99", D2)]
+    # Mercosul encontra a antiga; ABC1D99 vem depois, a uma edição
+    assert placas.search("ABC1C") == [("ABC1234", D1), ("ABC1D99", D2)]
+    assert len(placas.search("AB", k=2)) == 2
+    assert placas.search("QQQ") == []
+
+
+def test_one_edit_matches_come_after_exact_ones():
+    placas = indice()
+    assert placas.search("XYZ0002") == [("XYZ0001", D3)]
+    assert placas.search("ABC12345") == [("ABC1234", D1)]
+    assert placas.search("ABC124")[0] == ("ABC1234", D1)
+    # Curta demais para a busca aproximada
+    assert placas.search("XYZ1") == []
+
+
+def test_last_exit_is_kept_per_plate():
+    placas = indice()
+    placas.check_out("ABD5678", D2)
+    placas.seen("ABD5678", D1)
+    assert placas.search("ABD5678") == [("ABD5678", D2)]
+    placas.seen("ABD5678", D3)
+    assert placas.search("ABD5678") == [("ABD5678", D3)]
+    # Registro histórico não tira do pátio quem está nele
+    placas.check_in("ABD5678")
+    placas.seen("ABD5678", D3)
+    assert placas.search("ABD5678") == [("ABD5678", None)]
+
+
+
+def test_bulk_history_matches_one_by_one():
+    uma_a_uma, em_bloco = indice(), indice()
+    registros = [("ABD5678", D3), ("ABC1234", D2), ("ABC1234", D3), ("ABC1C34", D2), ("AAA0001", D1), ("ZZZ9999", D1)]
+    for placa, saida in registros:
+        uma_a_uma.seen(placa, saida)
+    em_bloco.seen_many(registros)
+    assert em_bloco._chaves == uma_a_uma._chaves == sorted(em_bloco._placas)
+    assert em_bloco._placas == uma_a_uma._placas
+    assert em_bloco.search("ABD5678") == [("ABD5678", None)]
+
+def test_empty_query_lists_parked_plates():
+    placas = indice()
+    placas.check_in("AAA0000")
+    placas.check_out("ABC9000", D3)
+    assert placas.search("") == [("AAA0000", None), ("ABD5678", None)]
+    assert placas.search("", k=1) == [("AAA0000", None)]
+    assert len(placas) == 6
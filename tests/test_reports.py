@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import asyncio
+
+import pandas as pd
+import pytest
+
+from lot import LotState
+from reports import ReportError, ReportService, report_period, split_days
+from storage import SQLiteStorage
+from tariff import TariffRule, TariffTable
+
+ONTEM = datetime.combine(date.today() - timedelta(days=1), datetime.min.time())
+
+
+class PoolLocal:
+    # Threads no lugar do pool de processos: mesmo caminho de código, sem spawn
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(2)
+
+    def executor(self):
+        return self._executor
+
+
+@pytest.fixture
+def servico(tmp_path):
+    caminho = str(tmp_path / "parking.db")
+    storage = SQLiteStorage(caminho)
+    lot = LotState(20, TariffTable(TariffRule(5, 5)), storage)
+    pool = PoolLocal()
+    yield lot, ReportService(lot, caminho, pool)
+    pool._executor.shutdown()
+    storage.close()
+
+
+def estadia(lot, placa, entrada, saida):
+    lot.check_in("Cliente", "Modelo", placa, "Preto", "Carro", entrada)
+    return lot.check_out(placa, saida)
+
+
+def diario(servico, dia):
+    return asyncio.run(servico.build("diario", *report_period("diario", dia)))
+
+
+def test_periods_split_at_midnight():
+    assert report_period("turno", date(2026, 3, 1), "Noite") == (datetime(2026, 3, 1, 22), datetime(2026, 3, 2, 6))
+    assert report_period("mensal", date(2026, 2, 14)) == (datetime(2026, 2, 1), datetime(2026, 3, 1))
+    with pytest.raises(ReportError):
+        report_period("turno", date(2026, 3, 1), "Madrugada")
+    assert split_days(datetime(2026, 3, 1, 22), datetime(2026, 3, 2, 6)) == [
+        (datetime(2026, 3, 1, 22), datetime(2026, 3, 2)),
+        (datetime(2026, 3, 2), datetime(2026, 3, 2, 6)),
+    ]
+
+
+def test_closed_days_are_cached_until_a_late_exit(servico):
+    lot, servico = servico
+    for k in range(3):
+        estadia(lot, f"P{k}", ONTEM + timedelta(hours=8 + k), ONTEM + timedelta(hours=10 + k))
+    primeiro = diario(servico, ONTEM.date())
+    assert (primeiro.totais["saidas"], primeiro.em_cache) == (3, 0)
+    assert primeiro.totais["receita"] == 30.0
+
+    repetido = diario(servico, ONTEM.date())
+    assert (repetido.totais, repetido.em_cache) == (primeiro.totais, 1)
+
+    # Saída ao vivo (hoje) não mexe no dia encerrado
+    estadia(lot, "HOJE", datetime.now() - timedelta(minutes=30), datetime.now())
+    assert diario(servico, ONTEM.date()).em_cache == 1
+
+    # Saída atrasada dentro de ontem: o trecho é recalculado
+    estadia(lot, "TARDIA", ONTEM + timedelta(hours=20), ONTEM + timedelta(hours=21))
+    atualizado = diario(servico, ONTEM.date())
+    assert (atualizado.totais["saidas"], atualizado.em_cache) == (4, 0)
+
+
+def test_import_drops_every_cached_day(servico):
+    lot, servico = servico
+    estadia(lot, "P1", ONTEM + timedelta(hours=8), ONTEM + timedelta(hours=9))
+    assert diario(servico, ONTEM.date()).totais["saidas"] == 1
+    lot.import_history(pd.DataFrame({
+        "Nome": ["Cliente"], "Modelo": ["Modelo"], "Placa": ["IMP0001"], "Cor": ["Preto"], "Tipo": ["Moto"],
+        "Entrada": [ONTEM + timedelta(hours=1)], "Saida": [ONTEM + timedelta(hours=2)], "Valor": [7.0], "Tempo": [1.0],
+    }))
+    lot.history_imported()
+    relatorio = diario(servico, ONTEM.date())
+    assert (relatorio.totais["saidas"], relatorio.em_cache) == (2, 0)
+    assert relatorio.totais["por_tipo"]["Moto"] == [1, 7.0]
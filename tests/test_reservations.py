@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+import random
+
+from lot import LotState
+from reservations import CommitmentTree
+from storage import SQLiteStorage
+from tariff import TariffRule, TariffTable
+
+
+def test_commitment_tree_matches_brute_force():
+    rng = random.Random(0)
+    tamanho = 200
+    arvore = CommitmentTree(tamanho)
+    contagens = [0] * tamanho
+    ativas = []
+    for _ in range(3000):
+        if ativas and rng.random() < 0.4:
+            # Remoção = somar -1 na mesma faixa
+            inicio, fim = ativas.pop(rng.randrange(len(ativas)))
+            valor = -1
+        else:
+            inicio = rng.randrange(tamanho)
+            fim = rng.randrange(inicio, tamanho + 1)
+            ativas.append((inicio, fim))
+            valor = 1
+        arvore.add(inicio, fim, valor)
+        for i in range(inicio, fim):
+            contagens[i] += valor
+
+        a = rng.randrange(tamanho)
+        b = rng.randrange(a, tamanho + 1)
+        assert arvore.peak(a, b) == max(contagens[a:b], default=0)
+
+
+def test_commitment_tree_empty_range():
+    arvore = CommitmentTree(10)
+    arvore.add(2, 5, 3)
+    assert arvore.peak(4, 4) == 0
+    assert arvore.peak(5, 10) == 0
+    assert arvore.peak(0, 10) == 3
+    arvore.add(2, 5, -3)
+    assert arvore.peak(0, 10) == 0
+
+
+def test_reservations_of_a_removed_zone_are_cancelled(tmp_path):
+    caminho = str(tmp_path / "parking.db")
+    tarifa = TariffTable(TariffRule(5, 5))
+    agora = datetime.now().replace(microsecond=0)
+    storage = SQLiteStorage(caminho)
+    lot = LotState(5, tarifa, storage, [("A", 3), ("B", 2)])
+    fica = lot.reserve("Cliente", "AAA1111", "A", agora + timedelta(hours=1), agora + timedelta(hours=2), agora)
+    sai = lot.reserve("Cliente", "BBB2222", "B", agora + timedelta(hours=1), agora + timedelta(hours=2), agora)
+    storage.close()
+
+    # A zona B saiu da configuração
+    storage = SQLiteStorage(caminho)
+    lot = LotState(3, tarifa, storage, [("A", 3)])
+    assert [r.codigo for r in lot.reservas] == [fica.codigo]
+    storage.flush()
+    situacoes = dict(storage._leitura.execute("SELECT codigo, situacao FROM reservas"))
+    storage.close()
+    assert situacoes == {fica.codigo: "ativa", sai.codigo: "cancelada"}
@@ -0,0 +1,64 @@
+from datetime import datetime
+import json
+
+import pytest
+
+from shards import ConfigError, ShardRegistry, load_lots_config
+from tariff import TariffRule, TariffTable
+
+UNIDADES = [
+    {"id": "centro", "nome": "Centro", "zonas": [["Térreo", 3], ["G1", 2]], "tarifa": {"primeira_hora": 8, "hora": 4}},
+    {"id": "norte", "zonas": [["Geral", 4]], "tarifa": {"primeira_hora": 5, "hora": 5, "por_tipo": {"Moto": {"primeira_hora": 2, "hora": 1}}}},
+]
+
+
+@pytest.fixture
+def registro():
+    tarifa = TariffTable(TariffRule(5, 5))
+    shards = ShardRegistry([
+        {"id": "centro", "nome": "Centro", "zonas": [("Térreo", 3)], "tarifa": tarifa},
+        {"id": "norte", "nome": "Norte", "zonas": [("Geral", 2)], "tarifa": tarifa},
+    ])
+    yield shards
+    for shard in shards:
+        shard.close()
+
+
+def test_resolve_by_path_query_or_default(registro):
+    assert registro.resolve("/lotes/norte/", "").id == "norte"
+    assert registro.resolve("/lotes/centro/session/abc", "?lote=norte").id == "centro"
+    assert registro.resolve("/", "?lote=norte").id == "norte"
+    assert registro.resolve("/", "lote=norte&x=1").id == "norte"
+    assert registro.resolve("/", "") is registro.padrao
+    assert registro.resolve(None, None).id == "centro"
+    assert registro.resolve("/lotes/sul/", "") is None
+    assert registro.resolve("/", "?lote=sul") is None
+
+
+def test_kpis_add_up_every_lot(registro):
+    registro.shards["centro"].lot.check_in("n", "m", "ABC1234", "Preto", "Carro")
+    registro.shards["norte"].lot.check_in("n", "m", "XYZ9876", "Preto", "Carro")
+    registro.shards["norte"].lot.check_in("n", "m", "QWE4567", "Preto", "Carro")
+    kpis = registro.kpis(datetime.now())
+    assert [(lote["id"], lote["ativos"], lote["livres"]) for lote in kpis["lotes"]] == [("centro", 1, 2), ("norte", 2, 0)]
+    assert (kpis["total"]["capacidade"], kpis["total"]["ativos"], kpis["total"]["livres"]) == (5, 3, 2)
+
+
+def test_load_config_with_a_subset(tmp_path):
+    caminho = tmp_path / "lotes.json"
+    caminho.write_text(json.dumps(UNIDADES))
+    configs = load_lots_config(str(caminho))
+    assert [c["id"] for c in configs] == ["centro", "norte"]
+    assert configs[0]["zonas"] == [("Térreo", 3), ("G1", 2)]
+    assert configs[1]["nome"] == "norte" and configs[1]["banco"] is None
+    assert configs[1]["tarifa"].rule("Moto").primeira_hora == 2
+    assert [c["id"] for c in load_lots_config(str(caminho), somente={"norte"})] == ["norte"]
+
+
+def test_config_errors_are_explicit(tmp_path):
+    caminho = tmp_path / "lotes.json"
+    caminho.write_text(json.dumps(UNIDADES))
+    with pytest.raises(ConfigError, match="sul"):
+        load_lots_config(str(caminho), somente={"norte", "sul"})
+    with pytest.raises(ConfigError, match="Nenhuma unidade"):
+        ShardRegistry([])
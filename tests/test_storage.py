@@ -0,0 +1,50 @@
+import threading
+
+from storage import SQL_HISTORICO, SQLiteStorage
+
+
+def linha(placa, valor=5.0):
+    return ("Cliente", "Modelo", placa, "Preto", "Carro", "2026-01-01 10:00:00", "2026-01-01 11:00:00", valor, 1.0, "Caixa")
+
+
+def flush_with_timeout(storage, segundos=10):
+    # flush() pendurado é exatamente o defeito testado: falha em vez de travar
+    fim = threading.Thread(target=storage.flush, daemon=True)
+    fim.start()
+    fim.join(segundos)
+    assert not fim.is_alive(), "flush() travou"
+
+
+def count(storage):
+    return storage._leitura.execute("SELECT COUNT(*) FROM historico").fetchone()[0]
+
+
+def test_failed_write_drops_only_that_item(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "parking.db"))
+    try:
+        for i in range(20):
+            # valor NULL viola o NOT NULL: só esse item deve sumir
+            storage._fila.put(((SQL_HISTORICO, linha(f"P{i}", None if i == 7 else 5.0)),))
+        flush_with_timeout(storage)
+        assert count(storage) == 19
+        assert storage.descartadas == 1
+
+        # A thread continua gravando depois da falha
+        storage._fila.put(((SQL_HISTORICO, linha("DEPOIS")),))
+        flush_with_timeout(storage)
+        assert count(storage) == 20
+        assert storage._escritor.is_alive()
+    finally:
+        storage.close()
+
+
+def test_failed_item_is_atomic(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "parking.db"))
+    try:
+        # Item com duas escritas, a segunda inválida: nenhuma das duas fica
+        storage._fila.put(((SQL_HISTORICO, linha("A")), (SQL_HISTORICO, linha("B", None))))
+        flush_with_timeout(storage)
+        assert count(storage) == 0
+        assert storage.descartadas == 1
+    finally:
+        storage.close()
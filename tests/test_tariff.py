@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+import random
+
+import pytest
+
+from tariff import QuoteCache, TariffRule, TariffTable
+
+
+class Registro:
+    def __init__(self, placa, tipo, entrada):
+        self.placa = placa
+        self.tipo = tipo
+        self.entrada = entrada
+
+
+@pytest.fixture
+def tarifa():
+    return TariffTable(
+        TariffRule(8, 4, carencia_minutos=15, fracao_minutos=15, teto_diario=50, hora_noturna=2),
+        {
+            "Moto": TariffRule(3, 2),
+            "Van": TariffRule(10, 6, carencia_minutos=40, fracao_minutos=30),
+            "Caminhonete": TariffRule(5, 5, fracao_minutos=60),
+        },
+    )
+
+
+def estadias(n, semente=0):
+    rng = random.Random(semente)
+    for _ in range(n):
+        entrada = datetime(2026, 1, 1) + timedelta(seconds=rng.randrange(30 * 86400), microseconds=rng.randrange(10 ** 6))
+        duracao = rng.choice([rng.randrange(80 * 3600), rng.randrange(200) * 60, 15 * 60, 30 * 60])
+        yield entrada, entrada + timedelta(seconds=duracao), rng.choice(["Carro", "Moto", "Van", "Caminhonete", "Bike"])
+
+
+def test_price_matches_price_batch(tarifa):
+    entradas, saidas, tipos = zip(*estadias(5000))
+    valores, horas = tarifa.price_batch(entradas, saidas, tipos)
+    for k, (entrada, saida, tipo) in enumerate(zip(entradas, saidas, tipos)):
+        valor, h = tarifa.price(entrada, saida, tipo)
+        assert valor == valores[k]
+        assert h == pytest.approx(horas[k])
+
+
+def test_quote_matches_price_even_backwards(tarifa):
+    cotacoes = QuoteCache(tarifa)
+    rng = random.Random(1)
+    registros = [Registro(f"P{i}", tipo, entrada) for i, (entrada, _, tipo) in enumerate(estadias(50, 2))]
+    for _ in range(20000):
+        registro = rng.choice(registros)
+        # Momentos em ordem aleatória: a cotação em cache não pode ficar velha
+        agora = registro.entrada + timedelta(seconds=rng.randrange(50 * 3600))
+        assert cotacoes.quote(registro, agora)[0] == tarifa.price(registro.entrada, agora, registro.tipo)[0]
+
+
+def test_quote_recomputes_when_time_goes_back(tarifa):
+    cotacoes = QuoteCache(tarifa)
+    registro = Registro("ABC1D23", "Caminhonete", datetime(2026, 1, 1, 8))
+    assert cotacoes.quote(registro, datetime(2026, 1, 1, 12))[0] == 20.0
+    assert cotacoes.quote(registro, datetime(2026, 1, 1, 10, 20))[0] == 15.0
+
+
+def test_grace_period_is_free(tarifa):
+    entrada = datetime(2026, 1, 1, 12)
+    assert tarifa.price(entrada, entrada + timedelta(minutes=15), "Carro")[0] == 0.0
+    # Passou da carência: cobra 2 frações de 15 min da primeira hora
+    assert tarifa.price(entrada, entrada + timedelta(minutes=16), "Carro")[0] == 4.0
@@ -0,0 +1,68 @@
+"""Agregador de KPIs da rede: soma o /api/kpis de cada worker.
+
+Cada worker serve algumas unidades (PARKING_LOTS_ONLY); este script só faz
+requisições HTTP, sem pandas nem plotly, e pode rodar em qualquer máquina.
+
+Uso:
+    python tools/chain_kpis.py http://worker1:8000 http://worker2:8000 --intervalo 30
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import time
+import urllib.request
+
+CAMPOS = ("capacidade", "ativos", "livres", "receita_dia", "saidas_dia")
+
+
+def fetch(url, timeout=5):
+    with urllib.request.urlopen(url.rstrip("/") + "/api/kpis", timeout=timeout) as resposta:
+        return json.loads(resposta.read())
+
+
+def aggregate(urls):
+    # (unidades, total da rede, [(url, erro)]); workers fora do ar não derrubam o resto
+    unidades, erros = [], []
+    with ThreadPoolExecutor(max_workers=min(len(urls), 16)) as executor:
+        for url, resultado in zip(urls, executor.map(_tentar, urls)):
+            if isinstance(resultado, Exception):
+                erros.append((url, resultado))
+            else:
+                unidades.extend(resultado["lotes"])
+    total = {campo: sum(u[campo] for u in unidades) for campo in CAMPOS}
+    total["ticket_medio"] = total["receita_dia"] / total["saidas_dia"] if total["saidas_dia"] else 0.0
+    return unidades, total, erros
+
+
+def _tentar(url):
+    try:
+        return fetch(url)
+    except Exception as e:
+        return e
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("workers", nargs="+", help="URLs dos workers")
+    parser.add_argument("--intervalo", type=float, default=0, help="repete a cada N segundos (0 = uma vez)")
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    args = parser.parse_args()
+
+    while True:
+        unidades, total, erros = aggregate(args.workers)
+        if args.json:
+            print(json.dumps({"lotes": unidades, "total": total, "erros": [f"{u}: {e}" for u, e in erros]}))
+        else:
+            for u in sorted(unidades, key=lambda u: u["id"]):
+                print(f"{u['nome']:<20} {u['ativos']:>5}/{u['capacidade']:<5} R$ {u['receita_dia']:>10.2f} {u['saidas_dia']:>6} saídas")
+            print(f"{'Rede':<20} {total['ativos']:>5}/{total['capacidade']:<5} R$ {total['receita_dia']:>10.2f} "
+                  f"{total['saidas_dia']:>6} saídas (ticket médio R$ {total['ticket_medio']:.2f})")
+            for url, erro in erros:
+                print(f"Sem resposta de {url}: {erro}")
+        if not args.intervalo:
+            break
+        time.sleep(args.intervalo)
+
+
+if __name__ == "__main__":
+    main()
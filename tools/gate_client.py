@@ -0,0 +1,67 @@
+"""Cliente de teste que simula câmeras LPR enviando eventos para /api/eventos.
+
+Uso:
+    python tools/gate_client.py --url http://localhost:8000 --veiculos 200 --lote 50
+"""
+import argparse
+import json
+import random
+import string
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+TIPOS = ["Carro", "Moto", "SUV", "Caminhonete", "Van"]
+CORES = ["Branco", "Preto", "Prata", "Vermelho", "Azul"]
+
+
+def random_plate():
+    letras = "".join(random.choices(string.ascii_uppercase, k=3))
+    return f"{letras}{random.randint(0, 9)}{random.choice(string.ascii_uppercase)}{random.randint(0, 99):02d}"
+
+
+def post(url, eventos):
+    corpo = json.dumps(eventos).encode()
+    while True:
+        pedido = urllib.request.Request(url, data=corpo, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(pedido) as resposta:
+                return json.loads(resposta.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 413 and len(eventos) > 1:
+                # Lote maior que a fila do servidor: envia em duas metades
+                meio = len(eventos) // 2
+                primeira, segunda = post(url, eventos[:meio]), post(url, eventos[meio:])
+                return {chave: primeira[chave] + segunda[chave] for chave in primeira}
+            if e.code != 503:
+                raise
+            # Fila cheia no servidor: respeita o Retry-After e reenvia o mesmo lote
+            time.sleep(float(e.headers.get("Retry-After", "1")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--veiculos", type=int, default=100, help="quantos veículos entram e saem")
+    parser.add_argument("--lote", type=int, default=20, help="eventos por requisição")
+    args = parser.parse_args()
+
+    placas = [random_plate() for _ in range(args.veiculos)]
+    eventos = [
+        {"id": str(uuid.uuid4()), "evento": "entrada", "placa": p,
+         "tipo": random.choice(TIPOS), "cor": random.choice(CORES)}
+        for p in placas
+    ]
+    eventos += [{"id": str(uuid.uuid4()), "evento": "saida", "placa": p} for p in placas]
+
+    url = args.url.rstrip("/") + "/api/eventos"
+    inicio = time.perf_counter()
+    for i in range(0, len(eventos), args.lote):
+        print(post(url, eventos[i:i + args.lote]))
+    duracao = time.perf_counter() - inicio
+    print(f"{len(eventos)} eventos em {duracao:.2f}s ({len(eventos) / duracao:.0f} eventos/s)")
+
+
+if __name__ == "__main__":
+    main()
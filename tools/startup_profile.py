@@ -0,0 +1,100 @@
+"""Perfil de inicialização do worker: quanto custa `import app` e a primeira página.
+
+Roda `python -X importtime` num processo novo (sem cache de imports do
+processo atual) e agrupa o tempo por pacote de primeiro nível.
+
+Uso (a partir da raiz do repositório):
+    python tools/startup_profile.py
+    python tools/startup_profile.py --top 20 --pagina
+    python tools/startup_profile.py --repeticoes 5 --json perfil.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executado no processo filho; imprime os tempos (s) como JSON na última linha
+SCRIPT = """
+import json, sys, time
+inicio = time.perf_counter()
+import app
+tempos = {"import_app": time.perf_counter() - inicio}
+if PAGINA:
+    from starlette.requests import Request
+    request = Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": []})
+    inicio = time.perf_counter()
+    str(app.app_ui(request))
+    tempos["primeira_pagina"] = time.perf_counter() - inicio
+print(json.dumps(tempos))
+"""
+
+
+def parse_importtime(texto):
+    # [(profundidade, módulo, próprio us, acumulado us)] das linhas do -X importtime
+    modulos = []
+    for linha in texto.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        proprio, acumulado, nome = linha[len("import time:"):].split("|")
+        profundidade = (len(nome) - len(nome.lstrip())) // 2
+        modulos.append((profundidade, nome.strip(), int(proprio), int(acumulado)))
+    return modulos
+
+
+def by_package(modulos):
+    # Soma do tempo próprio dos módulos de cada pacote de primeiro nível: o
+    # acumulado de pandas já inclui numpy, o próprio não, então a soma de todos
+    # os pacotes fecha com o total
+    pacotes = {}
+    for _, nome, proprio, _ in modulos:
+        pacote = nome.split(".")[0]
+        pacotes[pacote] = pacotes.get(pacote, 0) + proprio
+    return sorted(pacotes.items(), key=lambda item: item[1], reverse=True)
+
+
+def profile(pagina=False, banco=False):
+    env = dict(os.environ)
+    if not banco:
+        # Sem banco: mede o código, não o tamanho do histórico em disco
+        env["PARKING_DB"] = ""
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"PAGINA = {pagina!r}\n{SCRIPT}"],
+        cwd=RAIZ, env=env, capture_output=True, text=True, check=True,
+    )
+    tempos = json.loads(resultado.stdout.strip().splitlines()[-1])
+    return tempos, parse_importtime(resultado.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15, help="quantos pacotes listar")
+    parser.add_argument("--pagina", action="store_true", help="mede também a montagem da primeira página")
+    parser.add_argument("--banco", action="store_true", help="usa o PARKING_DB configurado (padrão: sem banco)")
+    parser.add_argument("--repeticoes", type=int, default=3, help="processos medidos (vale a mediana)")
+    parser.add_argument("--json", help="grava o relatório neste arquivo")
+    args = parser.parse_args()
+
+    execucoes = [profile(args.pagina, args.banco) for _ in range(args.repeticoes)]
+    tempos = {chave: statistics.median(t[chave] for t, _ in execucoes) for chave in execucoes[0][0]}
+    # O detalhamento por pacote vem da execução com o import mediano
+    _, modulos = sorted(execucoes, key=lambda e: e[0]["import_app"])[len(execucoes) // 2]
+    pacotes = by_package(modulos)
+
+    print(f"import app: {tempos['import_app'] * 1000:.0f} ms (mediana de {args.repeticoes})")
+    if "primeira_pagina" in tempos:
+        print(f"primeira página: {tempos['primeira_pagina'] * 1000:.0f} ms")
+    print(f"\n{'pacote':<28} {'ms':>8}")
+    for pacote, proprio in pacotes[:args.top]:
+        print(f"{pacote:<28} {proprio / 1000:>8.1f}")
+
+    if args.json:
+        with open(args.json, "w") as arquivo:
+            json.dump({"tempos": tempos, "pacotes": dict(pacotes)}, arquivo, indent=2)
+
+
+if __name__ == "__main__":
+    main()